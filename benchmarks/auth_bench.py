@@ -0,0 +1,172 @@
+"""Microbenchmarks of the authentication hot path.
+
+Times Utils.encrypt_password, Utils.verify_password, create_access_token,
+the JWT decode done in AuthRouter.get_current_user, get_user_by_email and
+the whole get_current_user. With --grid it also measures hash and verify
+for a range of bcrypt rounds and argon2 costs, so the hashing policy
+(PASSWORD_SCHEMES, BCRYPT_ROUNDS, ARGON2_*) can be picked against login
+throughput.
+
+    python -m benchmarks.auth_bench --iterations 20 --grid
+"""
+from typing import Any, Awaitable, Callable
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+
+BENCH_EMAIL: str = "authbench@makarios.org"
+BENCH_PASSWORD: str = "auth-benchmark-password"
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """summarize timings in milliseconds
+
+    Args:
+        samples (list[float]): timings in seconds
+
+    Returns:
+        dict[str, float]: mean, p50, p95 and operations per second
+    """
+    ordered: list[float] = sorted(samples)
+    mean: float = statistics.fmean(ordered)
+
+    return {
+        "mean_ms": round(mean * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "ops_per_second": round(1 / mean, 1) if mean else 0.0
+    }
+
+
+def time_sync(func: Callable[[], Any], iterations: int) -> dict[str, float]:
+    samples: list[float] = []
+
+    for _ in range(iterations):
+        start: float = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    return summarize(samples)
+
+
+def time_async(func: Callable[[], Awaitable[Any]], iterations: int) -> dict[str, float]:
+    async def run() -> list[float]:
+        samples: list[float] = []
+
+        for _ in range(iterations):
+            start: float = time.perf_counter()
+            await func()
+            samples.append(time.perf_counter() - start)
+
+        return samples
+
+    return summarize(asyncio.run(run()))
+
+
+def hot_path(iterations: int) -> dict[str, Any]:
+    from jose import jwt
+    from sqlmodel import Session, select
+    from db import engine
+    from migrations.runner import MigrationRunner
+    from entities.auth_entity.token_Entity import TokenDataExp
+    from entities.user_entity import User
+    from routers.auth_route import AuthRouter
+    from utils.user_utils import Utils
+
+    utils: Utils = Utils()
+    password_hash: str = utils.encrypt_password(BENCH_EMAIL, BENCH_PASSWORD)
+
+    MigrationRunner(engine).upgrade()
+
+    with Session(engine) as session:
+        if not session.exec(select(User).where(User.emailaddress == BENCH_EMAIL)).first():
+            session.add(User(firstname="Auth", middlename="Bench", lastname="User", gender="female",
+                             phoneNumber="0240000001", emailaddress=BENCH_EMAIL, password=password_hash))
+            session.commit()
+
+    token: str = utils.create_access_token({"id": 1, "emailAddress": BENCH_EMAIL})
+    secret_key: str = os.environ["SECRET_KEY"]
+    algorithm: str = os.environ["ALGORITHM"]
+
+    def decode() -> TokenDataExp:
+        return TokenDataExp(**jwt.decode(token=token, key=secret_key, algorithms=[algorithm]))
+
+    return {
+        "policy": {
+            "schemes": os.getenv("PASSWORD_SCHEMES", "bcrypt"),
+            "bcrypt_rounds": os.getenv("BCRYPT_ROUNDS", "12")
+        },
+        "encrypt_password": time_sync(lambda: utils.encrypt_password(BENCH_EMAIL, BENCH_PASSWORD), iterations),
+        "verify_password": time_sync(lambda: utils.verify_password(BENCH_EMAIL, BENCH_PASSWORD, password_hash), iterations),
+        "create_access_token": time_sync(lambda: utils.create_access_token({"id": 1, "emailAddress": BENCH_EMAIL}), iterations * 50),
+        "jwt_decode": time_sync(decode, iterations * 50),
+        "get_user_by_email": time_async(lambda: AuthRouter.get_user_by_email(BENCH_EMAIL), iterations * 10),
+        "get_current_user": time_async(lambda: AuthRouter.get_current_user(token), iterations * 10)
+    }
+
+
+def cost_grid(iterations: int) -> list[dict[str, Any]]:
+    """hash and verify timings for a range of cost factors
+
+    Args:
+        iterations (int): runs per setting
+
+    Returns:
+        list[dict[str, Any]]: timings per scheme and cost
+    """
+    from passlib.context import CryptContext
+
+    settings: list[tuple[str, dict[str, Any]]] = [("bcrypt", {"bcrypt__rounds": rounds}) for rounds in (10, 11, 12, 13, 14)]
+    settings += [("argon2", {"argon2__rounds": time_cost, "argon2__memory_cost": memory, "argon2__parallelism": 2})
+                 for time_cost, memory in ((2, 19456), (3, 65536), (4, 131072))]
+
+    secret: str = BENCH_EMAIL + BENCH_PASSWORD
+    results: list[dict[str, Any]] = []
+
+    for scheme, options in settings:
+        try:
+            context: CryptContext = CryptContext(schemes=[scheme], **options)
+            stored: str = context.hash(secret)
+        except Exception as error:  # argon2 needs the argon2-cffi backend
+            results.append({"scheme": scheme, **options, "error": str(error)})
+            continue
+
+        verify: dict[str, float] = time_sync(lambda: context.verify(secret, stored), iterations)
+
+        results.append({
+            "scheme": scheme,
+            **{name.split("__", 1)[1]: value for name, value in options.items()},
+            "hash": time_sync(lambda: context.hash(secret), iterations),
+            "verify": verify,
+            "logins_per_second_per_core": verify["ops_per_second"]
+        })
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the authentication hot path")
+    parser.add_argument("--db-url", default=os.getenv("DB_URL", "sqlite://"))
+    parser.add_argument("--iterations", type=int, default=20, help="runs of the hashing operations")
+    parser.add_argument("--grid", action="store_true", help="also measure a range of cost factors")
+    args = parser.parse_args()
+
+    os.environ["DB_URL"] = args.db_url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+
+    report: dict[str, Any] = {"hot_path": hot_path(args.iterations)}
+
+    if args.grid:
+        report["cost_grid"] = cost_grid(args.iterations)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""In-process load test of every router.
+
+Drives the FastAPI app through an ASGI client (no network, no server) at a
+configurable concurrency, inside its lifespan like a served app, so the
+pools are warmed and the background jobs run. The lifespan goes through
+asgi-lifespan's LifespanManager when it is installed and reports p50/p95/p99 latency and throughput per
+endpoint as JSON. The run metadata (commit, dataset, settings) is part of
+the report, pass a previous report with --baseline to see the regressions.
+
+    python -m benchmarks.seed --db-url sqlite:///bench.db
+    python -m benchmarks.load_test --db-url sqlite:///bench.db --concurrency 32 --requests 500 --output run.json
+"""
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+
+try:
+    from asgi_lifespan import LifespanManager  # type: ignore
+except ImportError:  # optional, the router's lifespan context is run directly then
+    LifespanManager = None
+
+
+# (name, method, path, query params)
+ENDPOINTS: tuple[tuple[str, str, str, dict[str, Any]], ...] = (
+    ("members.list", "GET", "/api/membersroute/get_members", {}),
+    ("members.list_filtered", "GET", "/api/membersroute/get_members", {"lastname": "Last42"}),
+    ("members.list_sorted", "GET", "/api/membersroute/get_members", {"lastname": "Last4", "sort": "-createdon"}),
+    ("members.list_fields", "GET", "/api/membersroute/get_members", {"fields": "id,firstname,lastname"}),
+    ("members.by_id", "GET", "/api/membersroute/get_member_byId/1", {}),
+    ("members.changes", "GET", "/api/membersroute/changes", {}),
+    ("users.list", "POST", "/api/user/get_users", {}),
+    ("services.list", "GET", "/api/service/getservices", {}),
+    ("services.list_filtered", "GET", "/api/service/getservices", {"servicetypeid": 1}),
+    ("services.list_range", "GET", "/api/service/getservices",
+     {"date_event__gte": "2024-01-01", "date_event__lte": "2024-12-31", "sort": "-date_event"}),
+    ("services.list_fields", "GET", "/api/service/getservices", {"fields": "id,date_event"}),
+    ("services.by_id", "GET", "/api/service/getservicebyid/1", {}),
+    ("services.changes", "GET", "/api/service/changes", {}),
+    ("titles.list", "GET", "/api/titles/getAll", {}),
+    ("titles.by_id", "GET", "/api/titles/getbyId/1", {}),
+    ("titles.changes", "GET", "/api/titles/changes", {}),
+    ("attendancetypes.list", "GET", "/api/attendancetype/getAll", {}),
+    ("attendancetypes.by_id", "GET", "/api/attendancetype/getbyId/1", {"id": 1}),
+    ("attendancetypes.changes", "GET", "/api/attendancetype/changes", {}),
+    ("servicetypes.list", "GET", "/api/servicetype/getservicetypes", {}),
+    ("servicetypes.by_id", "GET", "/api/servicetype/getservicebyid/1", {"id": 1}),
+    ("servicetypes.changes", "GET", "/api/servicetype/changes", {}),
+    ("reports.attendance", "GET", "/api/reports/attendance", {}),
+    ("reports.attendance_year", "GET", "/api/reports/attendance", {"start": "2024-01-01", "end": "2025-01-01"}),
+    ("audit.entries", "GET", "/api/audit/getentries", {}),
+    ("audit.entries_filtered", "GET", "/api/audit/getentries", {"table_name": "member", "limit": 100}),
+    ("metrics", "GET", "/metrics", {}),
+)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """nearest rank percentile of sorted values
+
+    Args:
+        sorted_values (list[float]): values in ascending order
+        fraction (float): percentile between 0 and 1
+
+    Returns:
+        float: the percentile, 0 when there is no value
+    """
+    if not sorted_values:
+        return 0.0
+
+    index: int = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_endpoint(client: Any, method: str, path: str, params: dict[str, Any], headers: dict[str, str],
+                       requests: int, concurrency: int, data: Optional[dict[str, str]] = None) -> dict[str, Any]:
+    """send requests to one endpoint with a fixed number of concurrent workers
+
+    Args:
+        client (Any): httpx AsyncClient bound to the app
+        method (str): http method
+        path (str): path of the endpoint
+        params (dict[str, Any]): query parameters
+        headers (dict[str, str]): headers, with the bearer token
+        requests (int): total requests
+        concurrency (int): concurrent workers
+        data (Optional[dict[str, str]], optional): form body. Defaults to None.
+
+    Returns:
+        dict[str, Any]: latency percentiles, throughput and errors
+    """
+    latencies: list[float] = []
+    errors: int = 0
+    remaining: int = requests
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+
+        while remaining > 0:
+            remaining -= 1
+            start: float = time.perf_counter()
+            response = await client.request(method, path, params=params, headers=headers, data=data)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            if response.status_code >= 400:
+                errors += 1
+
+    started: float = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed: float = time.perf_counter() - started
+
+    latencies.sort()
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0
+    }
+
+
+def dataset_counts() -> dict[str, int]:
+    """rows per table, runs are only comparable on the same dataset
+
+    Returns:
+        dict[str, int]: rows per table
+    """
+    from sqlalchemy import func, select
+    from sqlmodel import SQLModel
+    from db import engine
+
+    with engine.connect() as connection:
+        return {name: connection.execute(select(func.count()).select_from(table)).scalar() or 0
+                for name, table in SQLModel.metadata.tables.items()}
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    from main import app
+
+    # ASGITransport sends no lifespan events, without them the pools are cold and the background jobs never run
+    lifespan: Any = LifespanManager(app) if LifespanManager is not None else app.router.lifespan_context(app)
+
+    async with lifespan:
+        return await run_endpoints(args, app)
+
+
+async def run_endpoints(args: argparse.Namespace, app: Any) -> dict[str, Any]:
+    import httpx
+    from benchmarks.seed import BENCH_EMAIL, BENCH_PASSWORD
+
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        credentials: dict[str, str] = {"username": BENCH_EMAIL, "password": BENCH_PASSWORD}
+        login = await client.post("/token", data=credentials)
+        login.raise_for_status()
+        headers: dict[str, str] = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        selected: set[str] = set(args.endpoints.split(",")) if args.endpoints else set()
+        results: dict[str, Any] = {}
+
+        # logging in is part of the hot path too
+        results["auth.token"] = await run_endpoint(
+            client, "POST", "/token", {}, {}, min(args.requests, args.login_requests), args.concurrency, credentials
+        ) if not selected or "auth.token" in selected else None
+
+        for name, method, path, params in ENDPOINTS:
+            if selected and name not in selected:
+                continue
+
+            # warm up the pools and caches the same way on every run
+            for _ in range(args.warmup):
+                await client.request(method, path, params=params, headers=headers)
+
+            results[name] = await run_endpoint(client, method, path, params, headers, args.requests, args.concurrency)
+
+    return {name: result for name, result in results.items() if result is not None}
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> dict[str, Any]:
+    """compare the p95 and throughput of two reports
+
+    Args:
+        current (dict[str, Any]): endpoints of this run
+        baseline (dict[str, Any]): endpoints of the baseline run
+        threshold (float): relative change counted as a regression
+
+    Returns:
+        dict[str, Any]: change per endpoint, regressions are flagged
+    """
+    changes: dict[str, Any] = {}
+
+    for name, result in current.items():
+        before: Optional[dict[str, Any]] = baseline.get(name)
+
+        if not before or not before.get("p95_ms") or not before.get("throughput_rps"):
+            continue
+
+        p95_change: float = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        rps_change: float = (result["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"]
+
+        changes[name] = {
+            "p95_change": round(p95_change, 4),
+            "throughput_change": round(rps_change, 4),
+            "regression": p95_change > threshold or rps_change < -threshold
+        }
+
+    return changes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-process load test of every router")
+    parser.add_argument("--db-url", default=os.getenv("DB_URL", "sqlite:///bench.db"))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--login-requests", type=int, default=50, help="bcrypt bound, kept lower")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--endpoints", default="", help="comma separated endpoint names, all by default")
+    parser.add_argument("--no-cache", action="store_true", help="turn the response cache and coalescing off")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    parser.add_argument("--baseline", help="previous JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change flagged as regression")
+    args = parser.parse_args()
+
+    # the app reads its settings at import time
+    os.environ["DB_URL"] = args.db_url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTE", "60")
+
+    if args.no_cache:
+        os.environ["CACHE_BACKEND"] = "none"
+        os.environ["SINGLE_FLIGHT"] = "false"
+
+    endpoints: dict[str, Any] = asyncio.run(run(args))
+
+    report: dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db_dialect": args.db_url.split(":", 1)[0],
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "warmup": args.warmup,
+            "cache": not args.no_cache,
+            "dataset": dataset_counts()
+        },
+        "endpoints": endpoints
+    }
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            report["comparison"] = compare(endpoints, json.load(baseline_file)["endpoints"], args.threshold)
+
+    text: str = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text)
+
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Seed a database with benchmark volumes.
+
+The defaults are the production sized dataset: 100k members, 5 years of
+services and 10M attendance rows. The rows come from the synthetic data
+generator in scripts/generate_data.py, with the benchmark user as admin.
+
+    DB_URL=sqlite:///bench.db python -m benchmarks.seed --members 100000 --years 5 --attendance 10000000
+"""
+from sqlalchemy.engine import Engine
+from scripts.generate_data import DataGenerator, GeneratorConfig
+
+import argparse
+import os
+
+
+BENCH_EMAIL: str = "bench@makarios.org"
+BENCH_PASSWORD: str = "benchmark-password"
+
+
+def seed_database(engine: Engine, members: int = 100_000, years: int = 5, attendance: int = 10_000_000,
+                  seed: int = 42, batch_size: int = 50_000) -> dict[str, int]:
+    """create the tables and fill them with benchmark volumes
+
+    Args:
+        engine (Engine): target engine
+        members (int, optional): number of members. Defaults to 100_000.
+        years (int, optional): years of services. Defaults to 5.
+        attendance (int, optional): number of attendance rows. Defaults to 10_000_000.
+        seed (int, optional): random seed, the same seed gives the same data. Defaults to 42.
+        batch_size (int, optional): rows per batch. Defaults to 50_000.
+
+    Returns:
+        dict[str, int]: rows per table
+    """
+    config: GeneratorConfig = GeneratorConfig(
+        members=members, years=years, attendance=attendance, seed=seed, batch_size=batch_size,
+        admin_email=BENCH_EMAIL, admin_password=BENCH_PASSWORD
+    )
+
+    return DataGenerator(engine, config).generate()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed a database with benchmark volumes")
+    parser.add_argument("--db-url", default=os.getenv("DB_URL", "sqlite:///bench.db"))
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--attendance", type=int, default=10_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    os.environ["DB_URL"] = args.db_url
+
+    from db import engine
+
+    print(seed_database(engine, args.members, args.years, args.attendance, args.seed, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Serialization benchmark for the list endpoints.
+
+Compares the pydantic path (build MemberOutput objects, wrap them in Response
+and validate against the response model, the way FastAPI did it) with the
+orjson fast path from dto.fast_response.
+
+Run from the repository root:
+
+    python -m benchmarks.serialization_bench --rows 10000 --repeat 5
+"""
+from datetime import date
+from typing import Any, Callable
+from dto.response import Response
+from dto.fast_response import dumps, rows_to_dicts
+from entities.members_entity import MemberOutput
+
+import argparse
+import json
+import time
+
+
+def make_rows(count: int) -> list[tuple[Any, ...]]:
+    """build rows shaped like the get_members select
+
+    Args:
+        count (int): number of rows
+
+    Returns:
+        list[tuple[Any, ...]]: the rows
+    """
+    return [(
+        f"First{i}", f"Last{i}", f"Middle{i}", "male" if i % 2 else "female",
+        f"member{i}@makarios.org", f"02441{i % 100000:05d}", date(1990, 1 + i % 12, 1 + i % 28),
+        None, f"GA-{i:06d}-0000", 1 + i % 5, i
+    ) for i in range(count)]
+
+
+def pydantic_path(columns: list[str], rows: list[tuple[Any, ...]]) -> bytes:
+    members: list[MemberOutput] = [MemberOutput(**dict(zip(columns, row))) for row in rows]
+    response: Response[MemberOutput] = Response(success=True, message="Operation Successful", data=members)
+
+    # FastAPI validates the returned object against response_model before encoding
+    return Response[MemberOutput].model_validate(response.model_dump()).model_dump_json().encode()
+
+
+def fast_path(columns: list[str], rows: list[tuple[Any, ...]]) -> bytes:
+    return dumps({"success": True, "message": "Operation Successful", "data": rows_to_dicts(columns, rows)})
+
+
+def measure(func: Callable[..., bytes], repeat: int, *args: Any) -> float:
+    """best wall time of repeated runs
+
+    Args:
+        func (Callable[..., bytes]): function to time
+        repeat (int): number of runs
+
+    Returns:
+        float: best time in seconds
+    """
+    best: float = float("inf")
+
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serialization time per 10k rows")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    columns: list[str] = list(MemberOutput.model_fields)
+    rows: list[tuple[Any, ...]] = make_rows(args.rows)
+    scale: float = 10_000 / args.rows
+
+    results: dict[str, float] = {
+        "pydantic_ms_per_10k": measure(pydantic_path, args.repeat, columns, rows) * 1000 * scale,
+        "orjson_ms_per_10k": measure(fast_path, args.repeat, columns, rows) * 1000 * scale,
+    }
+    results["speedup"] = results["pydantic_ms_per_10k"] / results["orjson_ms_per_10k"]
+
+    print(json.dumps({"rows": args.rows, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,162 @@
 from sqlmodel import create_engine, Session
-from typing import Optional, AsyncGenerator
+from sqlalchemy import event, insert, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from typing import Optional, AsyncGenerator, Any, Callable, TypeVar
+from datetime import datetime, timedelta
 from exceptions.env_exceptions import EnvironmentNotFound
+from utils.table_versions import after_fork as reset_table_versions, share_versions, track_table_versions
+from utils.query_instrumentation import instrument_engine
+from utils.sqlite_writer import SQLiteWriter
+from utils.replicas import ReplicaSet, request_user_id, write_window
+from utils.audit import AUDIT_ENABLED, AuditRow, audit_buffer, collect
+from entities.audit_entity import AuditLog
+from entities.deletion_entity import DeletionLog
+from entities.members_entity import Member
+from entities.service_entity import Service
+from entities.service_type_enity import ServiceType
+from entities.attendance_type_entity import AttendanceType
+from entities.title_entity import Title
+from entities.user_entity import User
+from utils.soft_delete import PURGE_BATCH_SIZE, PURGE_HOURS, PURGE_INTERVAL_SECONDS, PURGE_RETENTION_DAYS, \
+    Purger, exclude_deleted, is_soft_deleted, parse_hours
+from utils.partitions import ATTENDANCE_PARTITIONS_AHEAD, ATTENDANCE_PARTITION_INTERVAL_SECONDS, \
+    ATTENDANCE_PARTITION_RETENTION_MONTHS, PartitionManager
+from utils.archive import ARCHIVE_AFTER_DAYS
+from utils.metrics import instrument_pool, registry
+from utils.workers import WORKERS, shared_state
+import asyncio
+import logging
 import os
 
+T = TypeVar("T")
+
+logger: logging.Logger = logging.getLogger("makarios.db")
+
 url: Optional[str] = os.getenv("DB_URL")
 
+# statements are timed per request, echo only when debugging locally
+echo: bool = os.getenv("DB_ECHO", "false").strip().lower() in ("1", "true", "yes")
+
+
+def _connect_args(database_url: str) -> dict[str, Any]:
+    # only the sqlite driver knows check_same_thread, psycopg rejects it
+    return {"check_same_thread": False} if database_url.startswith("sqlite") else {}
+
+
 # check if there is an environment variable as this
 if url:
     # create the engine
     engine = create_engine(
         url=url,
-        connect_args={"check_same_thread": False},
-        echo=True
+        connect_args=_connect_args(url),
+        echo=echo
     )
 else:
     raise EnvironmentNotFound("DB_URL")
 
+# comma separated urls of read replicas, the get_* handlers read from them
+replica_urls: list[str] = [replica.strip() for replica in os.getenv("DB_REPLICA_URLS", "").split(",") if replica.strip()]
+
+# pre ping so a replica that went away is noticed at checkout, not mid query
+replicas: ReplicaSet = ReplicaSet(
+    [create_engine(url=replica, connect_args=_connect_args(replica), echo=echo, pool_pre_ping=True) for replica in replica_urls],
+    retry_after=float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+)
+
+# WAL, tuned pragmas and one writer thread for sqlite files in production
+sqlite_production: bool = url.startswith("sqlite") and ":memory:" not in url and url.rstrip("/") != "sqlite:" \
+    and os.getenv("SQLITE_PRODUCTION", "false").strip().lower() in ("1", "true", "yes")
+
+SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").strip().upper()
+SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negative is KiB, 64MB
+SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT: int = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+
+if SQLITE_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"SQLITE_SYNCHRONOUS must be OFF, NORMAL, FULL or EXTRA, not {SQLITE_SYNCHRONOUS}")
+
+
+def _sqlite_on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+    # let sqlalchemy emit BEGIN itself, pysqlite's own handling breaks SAVEPOINT
+    dbapi_connection.isolation_level = None
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.close()
+
+
+def _sqlite_begin(conn: Any) -> None:
+    conn.exec_driver_sql("BEGIN")
+
+
+def _sqlite_begin_immediate(conn: Any) -> None:
+    # take the write lock up front instead of upgrading a read transaction
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+writer: Optional[SQLiteWriter] = None
+writer_engine: Optional[Engine] = None
+
+if sqlite_production:
+    event.listen(engine, "connect", _sqlite_on_connect)
+    event.listen(engine, "begin", _sqlite_begin)
+
+    writer_engine = create_engine(url=url, connect_args=_connect_args(url), echo=echo,
+                                  pool_size=1, max_overflow=0)
+    event.listen(writer_engine, "connect", _sqlite_on_connect)
+    event.listen(writer_engine, "begin", _sqlite_begin_immediate)
+    instrument_engine(writer_engine)
+
+    writer = SQLiteWriter(writer_engine, max_batch=int(os.getenv("SQLITE_GROUP_COMMIT_SIZE", "64")),
+                          max_wait_ms=float(os.getenv("SQLITE_GROUP_COMMIT_MS", "0")))
+    writer.start()
+
+# record query count, time and slow statements of every request
+instrument_engine(engine)
+
+for replica_engine in replicas.engines:
+    instrument_engine(replica_engine)
+
+# expose the pool checkouts and overflow on /metrics
+instrument_pool(engine)
+
+# bump the table versions used for the ETags after every commit
+track_table_versions()
+
+# with several workers the versions and the writes of every worker are in Redis
+if shared_state is not None:
+    share_versions(shared_state)
+
+    if replicas:
+        write_window.share(shared_state)
+
+# without Redis a worker would not know the writes of the others and send their users to a lagging replica
+read_replicas: bool = bool(replicas) and (WORKERS <= 1 or shared_state is not None)
+
+# the deleted rows only keep a deletedon, the selects leave them out
+exclude_deleted(Member, Service, ServiceType, AttendanceType, Title, User)
+
+# services and members point to the lookups and the users, they go first
+purger: Purger = Purger(
+    [entity.__table__ for entity in (Service, Member, Title, ServiceType, AttendanceType, User)],  # type: ignore
+    retention_days=PURGE_RETENTION_DAYS, batch_size=PURGE_BATCH_SIZE, hours=parse_hours(PURGE_HOURS),
+    interval_seconds=PURGE_INTERVAL_SECONDS
+)
+
+# monthly partitions of attendance on postgres, sqlite keeps the single table
+partitions: Optional[PartitionManager] = None
+
+if engine.dialect.name == "postgresql":
+    partitions = PartitionManager(
+        ahead=ATTENDANCE_PARTITIONS_AHEAD, retention_months=ATTENDANCE_PARTITION_RETENTION_MONTHS,
+        archive_after=timedelta(days=ARCHIVE_AFTER_DAYS), interval_seconds=ATTENDANCE_PARTITION_INTERVAL_SECONDS
+    )
+
 # create the get session to connect to the database
 async def get_session() -> AsyncGenerator:
     """Creates the session which will be use throughout the entire database
@@ -29,4 +170,203 @@ async def get_session() -> AsyncGenerator:
 
 def get_session_funct() -> Session:
     """Creates and returns a new session."""
-    return Session(engine)
\ No newline at end of file
+    return Session(engine)
+
+
+def read_session(user_id: Optional[int] = None) -> Session:
+    """open a session for reading, on a healthy replica when there is one
+
+    Args:
+        user_id (Optional[int], optional): user reading, used for read-your-writes. Defaults to None.
+
+    Returns:
+        Session: session bound to a replica, or to the primary as a fallback
+    """
+    if not read_replicas or write_window.active(user_id):
+        return Session(engine)
+
+    for replica in replicas.candidates():
+        session: Session = Session(replica)
+
+        try:
+            # check out the connection now, a dead replica fails here and not in the handler
+            session.connection()
+        except DBAPIError:
+            session.close()
+            replicas.mark_down(replica)
+            logger.warning("replica %s is down, retrying in %ss", replica.url.render_as_string(), replicas.retry_after)
+            continue
+
+        return session
+
+    return Session(engine)
+
+
+async def _commit(work: Callable[[Session], T]) -> T:
+    if writer is not None:
+        return await asyncio.wrap_future(writer.submit(work))
+
+    with Session(engine, expire_on_commit=False) as session:
+        result: T = work(session)
+        session.commit()
+
+    return result
+
+
+async def run_write(work: Callable[[Session], T]) -> T:
+    """run write work and commit it, through the sqlite writer when there is one
+
+    The changes are described for the audit log inside the transaction and
+    queued once it committed.
+
+    Args:
+        work (Callable[[Session], T]): function receiving the session, it must not commit
+
+    Returns:
+        T: the return value of work once committed
+    """
+    user_id: Optional[int] = request_user_id.get()
+    result: T
+
+    if AUDIT_ENABLED:
+        result, rows = await _commit(lambda session: (work(session), collect(session, user_id)))
+        audit_buffer.record(rows)
+    else:
+        result = await _commit(work)
+
+    # without replicas every read already sees the write
+    if replicas:
+        write_window.record(user_id)
+
+    return result
+
+
+async def run_maintenance(work: Callable[[Session], T]) -> T:
+    """run write work of a background job and commit it, it is neither audited nor a write of the current user
+
+    Args:
+        work (Callable[[Session], T]): function receiving the session, it must not commit
+
+    Returns:
+        T: the return value of work once committed
+    """
+    return await _commit(work)
+
+
+async def write_audit(rows: list[AuditRow]) -> None:
+    """insert a batch of audit rows, the flush of the audit buffer
+
+    Args:
+        rows (list[AuditRow]): rows built by utils.audit.collect
+    """
+    await run_maintenance(lambda session: session.execute(insert(AuditLog), rows))
+
+
+async def save(entity: T) -> T:
+    """insert or update an entity and return the stored copy
+
+    Args:
+        entity (T): new or changed entity, it may belong to the request session
+
+    Returns:
+        T: the committed entity
+    """
+    return await run_write(lambda session: session.merge(entity))
+
+
+async def delete(entity: Any) -> None:
+    """delete an entity and leave a tombstone for the change feeds, only mark it when it has a deletedon
+
+    Args:
+        entity (Any): entity to delete, it may belong to the request session
+    """
+    def work(session: Session) -> None:
+        stored: Any = session.merge(entity)
+
+        if is_soft_deleted(stored):
+            stored.deletedon = datetime.utcnow()
+        else:
+            session.delete(stored)
+
+        session.add(DeletionLog(table_name=stored.__table__.name, row_id=stored.id))
+
+    await run_write(work)
+
+
+def after_fork() -> None:
+    """drop the connections and the writer thread inherited from the parent, called in every new worker"""
+    for pool_engine in (engine, writer_engine, *replicas.engines):
+        if pool_engine is not None:
+            # close=False leaves the parent's connections alone, only this process forgets them
+            pool_engine.dispose(close=False)
+
+    if writer is not None:
+        writer.after_fork()
+
+    # the master's numbers would be summed once per worker
+    registry.reset()
+    reset_table_versions()
+
+
+def warm_up(connections: int) -> None:
+    """open pool connections ahead of the first requests
+
+    Args:
+        connections (int): connections to open per engine, capped by the pool size
+    """
+    for pool_engine in (engine, *replicas.engines):
+        size: Optional[Callable[[], int]] = getattr(pool_engine.pool, "size", None)
+        opened: list[Any] = []
+
+        try:
+            for _ in range(min(connections, size()) if size else connections):
+                opened.append(pool_engine.raw_connection())
+        except DBAPIError:
+            if pool_engine is engine:
+                raise
+
+            replicas.mark_down(pool_engine)
+        finally:
+            # back to the pool, open
+            for connection in opened:
+                connection.close()
+
+
+def ping() -> None:
+    """run SELECT 1 on a pooled connection of the primary, raises if the database does not answer"""
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def pool_status() -> dict[str, Any]:
+    """state of the primary pool
+
+    Returns:
+        dict[str, Any]: checked out connections, size, overflow and saturation (checked out over capacity)
+    """
+    pool = engine.pool
+    size: Optional[Callable[[], int]] = getattr(pool, "size", None)
+    checkedout: Optional[Callable[[], int]] = getattr(pool, "checkedout", None)
+
+    # the sqlite memory pools keep no numbers
+    if size is None or checkedout is None:
+        return {"pool": type(pool).__name__}
+
+    # -1 is an unlimited overflow, the pool can then only be compared to its size
+    max_overflow: int = max(getattr(pool, "_max_overflow", 0), 0)
+    capacity: int = size() + max_overflow
+
+    return {
+        "pool": type(pool).__name__,
+        "checked_out": checkedout(),
+        "size": size(),
+        "overflow": pool.overflow() if hasattr(pool, "overflow") else 0,
+        "max_overflow": max_overflow,
+        "saturation": round(checkedout() / capacity, 3) if capacity else 0.0
+    }
+
+
+def close_writer() -> None:
+    """finish the queued writes, called when the app shuts down"""
+    if writer is not None:
+        writer.stop()
\ No newline at end of file
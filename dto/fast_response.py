@@ -0,0 +1,128 @@
+from typing import Any, Optional, Sequence, Type
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from enums.enums import SuccessMessage, ErrorMessage
+
+import orjson
+import os
+
+
+# validate the fast path against the response model only while debugging
+DEBUG: bool = os.getenv("DEBUG", "false").strip().lower() in ("1", "true", "yes")
+
+
+def _default(value: Any) -> Any:
+    """encode the types orjson does not know about
+
+    Args:
+        value (Any): value orjson could not serialize
+
+    Raises:
+        TypeError: raise if the type is still not supported
+
+    Returns:
+        Any: a json friendly value
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # like the response models, pydantic serializes bytes as utf-8 (ser_json_bytes="utf8")
+        return bytes(value).decode("utf-8")
+
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+
+    raise TypeError(f"Type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """serialize content to json bytes with orjson
+
+    Args:
+        content (Any): content to serialize
+
+    Returns:
+        bytes: the json document
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastResponse(JSONResponse):
+    """A json response rendered with orjson. FastAPI returns Response instances
+    as they are, so the payload skips the response_model validation.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_to_dicts(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> list[dict[str, Any]]:
+    """zip plain rows with their column names
+
+    Args:
+        columns (Sequence[str]): names of the columns in the row order
+        rows (Sequence[Sequence[Any]]): rows returned by the query
+
+    Returns:
+        list[dict[str, Any]]: a dict per row
+    """
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def fast_response(rows: Sequence[Any], columns: Optional[Sequence[str]] = None,
+                  response_model: Optional[Type[BaseModel]] = None,
+                  message: str = SuccessMessage.OperationSuccessful.value,
+                  empty_message: str = ErrorMessage.NoEntry.value) -> FastResponse:
+    """build the standard Response envelope from plain rows
+
+    Args:
+        rows (Sequence[Any]): dicts, or tuples when columns is given
+        columns (Optional[Sequence[str]], optional): column names of tuple rows. Defaults to None.
+        response_model (Optional[Type[BaseModel]], optional): model validated in debug mode. Defaults to None.
+        message (str, optional): message when rows are found. Defaults to SuccessMessage.OperationSuccessful.value.
+        empty_message (str, optional): message when no row is found. Defaults to ErrorMessage.NoEntry.value.
+
+    Returns:
+        FastResponse: the encoded response
+    """
+    data: Sequence[Any] = rows_to_dicts(columns, rows) if columns is not None else rows
+
+    content: dict[str, Any]
+
+    if data:
+        content = {"success": True, "message": message, "data": data}
+    else:
+        content = {"success": False, "message": empty_message, "data": None}
+
+    if DEBUG and response_model is not None:
+        response_model.model_validate(content)
+
+    return FastResponse(content)
+
+
+def fast_item(row: Optional[Sequence[Any]], columns: Sequence[str],
+              response_model: Optional[Type[BaseModel]] = None,
+              message: str = SuccessMessage.OperationSuccessful.value,
+              empty_message: str = ErrorMessage.NoEntry.value) -> FastResponse:
+    """build the standard Response envelope from one plain row
+
+    Args:
+        row (Optional[Sequence[Any]]): the row, None when nothing was found
+        columns (Sequence[str]): column names in the row order
+        response_model (Optional[Type[BaseModel]], optional): model validated in debug mode. Defaults to None.
+        message (str, optional): message when the row is found. Defaults to SuccessMessage.OperationSuccessful.value.
+        empty_message (str, optional): message when no row is found. Defaults to ErrorMessage.NoEntry.value.
+
+    Returns:
+        FastResponse: the encoded response
+    """
+    content: dict[str, Any]
+
+    if row is not None:
+        content = {"success": True, "message": message, "data": dict(zip(columns, row))}
+    else:
+        content = {"success": False, "message": empty_message, "data": None}
+
+    if DEBUG and response_model is not None:
+        response_model.model_validate(content)
+
+    return FastResponse(content)
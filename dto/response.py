@@ -1,4 +1,5 @@
-from typing import Generic, TypeVar
+from datetime import datetime
+from typing import Generic, Optional, TypeVar
 from pydantic import BaseModel
 
 T = TypeVar("T")
@@ -12,4 +13,28 @@ class Response(BaseModel, Generic[T]):
 class SingleResponse(BaseModel, Generic[T]):
     success: bool
     message: str
-    data: T | None
\ No newline at end of file
+    data: T | None
+
+class Page(BaseModel, Generic[T]):
+    success: bool
+    message: str
+    data: list[T] | None
+    # pass it back as ?before= for the next page, None on the last page
+    next_cursor: Optional[int] = None
+
+
+class Change(BaseModel, Generic[T]):
+    # upsert or delete, data is None for a delete
+    op: str
+    id: int
+    changedon: datetime
+    data: T | None = None
+
+
+class Changes(BaseModel, Generic[T]):
+    success: bool
+    message: str
+    data: list[Change[T]]
+    # pass it back as ?since= for the next page
+    watermark: str
+    has_more: bool
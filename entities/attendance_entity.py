@@ -26,8 +26,16 @@ class AttendanceOutput(AttendanceInput):
 
 class Attendance(AttendanceInput, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # the partition key on Postgres, see migration 0007, bound it in queries so the months are pruned
     createdon: datetime = Field(
         default_factory=datetime.utcnow, sa_column=Column("createdon", DateTime))
     modifiedon: Optional[datetime] = Field(
         default=None, sa_column=Column("modifiedon", DateTime))
     member: "Member" = Relationship(back_populates="attendances")
+
+
+class AttendanceCount(SQLModel):
+    year: int
+    servicetypeid: int
+    attendancestatusid: int
+    count: int
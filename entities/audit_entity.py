@@ -0,0 +1,31 @@
+from sqlmodel import SQLModel, Field, Column, DateTime, VARCHAR
+from sqlalchemy import JSON
+from typing import Any, Optional
+from datetime import datetime
+
+
+class AuditLogOutput(SQLModel):
+    id: int
+    occurredon: datetime
+    actor_id: Optional[int] = None
+    action: str
+    table_name: str
+    row_id: Optional[int] = None
+    before: Optional[dict[str, Any]] = None
+    after: Optional[dict[str, Any]] = None
+
+
+class AuditLog(SQLModel, table=True):
+    """One insert, update or delete. The table is append-only, migration 0004 rejects updates and deletes of it"""
+    __tablename__ = "audit_log"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    occurredon: datetime = Field(sa_column=Column("occurredon", DateTime, nullable=False))
+    # the logged in user, None for writes outside of a request
+    actor_id: Optional[int] = Field(default=None)
+    action: str = Field(sa_column=Column("action", VARCHAR(6), nullable=False))
+    table_name: str = Field(sa_column=Column("table_name", VARCHAR, nullable=False))
+    row_id: Optional[int] = Field(default=None)
+    # the changed fields only for an update, the whole row for an insert (after) or a delete (before)
+    before: Optional[dict[str, Any]] = Field(default=None, sa_column=Column("before", JSON))
+    after: Optional[dict[str, Any]] = Field(default=None, sa_column=Column("after", JSON))
@@ -0,0 +1,14 @@
+from sqlmodel import SQLModel, Field, Column, DateTime, VARCHAR
+from typing import Optional
+from datetime import datetime
+
+
+class DeletionLog(SQLModel, table=True):
+    """A tombstone, written in the transaction of the delete so the change feeds can report it"""
+    __tablename__ = "deletion_log"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    table_name: str = Field(sa_column=Column("table_name", VARCHAR, nullable=False))
+    row_id: int
+    deletedon: datetime = Field(
+        default_factory=datetime.utcnow, sa_column=Column("deletedon", DateTime, nullable=False))
@@ -1,10 +1,9 @@
 from sqlmodel import Field, Column, VARCHAR, DateTime, SQLModel, Date, LargeBinary, Relationship, CheckConstraint
-from typing import Optional, TYPE_CHECKING, AnyStr
+from typing import ClassVar, Optional, TYPE_CHECKING, AnyStr
 from datetime import date, datetime
 from entities.attendance_entity import Attendance
 from pydantic import BaseModel, EmailStr, field_validator
 from re import Pattern
-from PIL import Image
 from io import BytesIO
 
 import re
@@ -72,6 +71,9 @@ class MemberInputData(BaseModel):
         if not value:
             return value
         
+        # Pillow is only needed for uploads, importing it here keeps it off the startup path
+        from PIL import Image
+        
         try:
             image = Image.open(BytesIO(value))
             
@@ -105,15 +107,18 @@ class Member(MemberInput, table=True, ):
         default_factory=datetime.utcnow, sa_column=Column("createdon", DateTime))
     modifiedon: Optional[datetime] = Field(
         default=None, sa_column=Column("modifiedon", DateTime))
+    # set by a delete, the row stays until the purge, see utils/soft_delete.py
+    deletedon: Optional[datetime] = Field(
+        default=None, sa_column=Column("deletedon", DateTime))
     user: "User" = Relationship(back_populates="members")  
     attendances: list["Attendance"] = Relationship(back_populates="member")  
     
 
-    # Adding a constraint to limit the size of the image_data column
+    # You may specify the maximum image size in bytes, a class variable and not a column
+    profile_picture_size: ClassVar[int] = 5 * 1024 * 1024  # 5 MB
+
+    # Adding a constraint to limit the size of the image_data column, the one of migration 0001
     __table_args__ = (
-        CheckConstraint('LENGTH(profile_picture) <= :profile_picture_size',
+        CheckConstraint(f'LENGTH(profile_picture) <= {profile_picture_size}',
                         name='profile_picture_length_check'),
     )
-
-    # You may specify the maximum image size in bytes
-    profile_picture_size: int = 5 * 1024 * 1024  # 5 MB
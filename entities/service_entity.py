@@ -48,5 +48,8 @@ class Service(ServiceInput, table=True):
         default_factory=datetime.utcnow, sa_column=Column("createdon", DateTime))
     modifiedon: Optional[datetime] = Field(
         default=None, sa_column=Column("modifiedon", DateTime))
+    # set by a delete, the row stays until the purge, see utils/soft_delete.py
+    deletedon: Optional[datetime] = Field(
+        default=None, sa_column=Column("deletedon", DateTime))
     modifiedby: Optional[int] = Field(default=None)
     user: "User" = Relationship(back_populates="services")  # noqa: F821
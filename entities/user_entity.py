@@ -91,6 +91,9 @@ class User(UserInput, table=True):
         default_factory=datetime.utcnow, sa_column=Column("createdon", DateTime))
     modifiedon: Optional[datetime] = Field(
         default=None, sa_column=Column("modifiedon", DateTime))
+    # set by a delete, the row stays until the purge, see utils/soft_delete.py
+    deletedon: Optional[datetime] = Field(
+        default=None, sa_column=Column("deletedon", DateTime))
     members: list["Member"] = Relationship(back_populates="user")
     servicetypes: list["ServiceType"] = Relationship(back_populates="user")
     attendancetypes: list["AttendanceType"] = Relationship(
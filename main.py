@@ -1,46 +1,130 @@
 from fastapi import FastAPI
-from sqlmodel import SQLModel
 from dotenv import load_dotenv
 import uvicorn
-from db import engine
+import asyncio
+import logging
+import os
 from contextlib import asynccontextmanager
-from routers.tittle_route import TitleRouter
-from routers.user_route import UserRouter
-from routers.attendancetype_route import AttendancetypeRouter
-from routers.servicetype_route import ServiceTypeRouter
-from routers.service_route import ServiceRoute
-from routers.auth_route import AuthRouter
-from routers.members_route import MembersRoute
+from migrations.runner import MigrationRunner
+from middlewares.compression_middleware import CompressionMiddleware
+from middlewares.etag_middleware import ETagMiddleware
+from middlewares.query_timing_middleware import QueryTimingMiddleware
+from middlewares.metrics_middleware import MetricsMiddleware
+from middlewares.profiling_middleware import ProfilingMiddleware
+from utils.startup import startup_timer
+from utils.openapi_cache import OPENAPI_CACHE_PATH, install_openapi_cache
+from utils.readiness import mark_not_ready, mark_ready
+from utils.audit import AUDIT_ENABLED, audit_buffer
+
+# creates the engines, the pools and the writer thread
+with startup_timer.phase("import", "db"):
+    from db import engine, close_writer, warm_up, write_audit, run_maintenance, purger, partitions
 
 
 # load environment variables
 load_dotenv(".env")
 
+logger: logging.Logger = logging.getLogger("makarios")
+
+# pool connections opened before /readyz reports ready
+WARM_CONNECTIONS: int = int(os.getenv("WARM_CONNECTIONS", "5"))
+
+
+def warm() -> None:
+    """open the pool and load the OpenAPI schema, /readyz answers not ready until done"""
+    try:
+        warm_up(WARM_CONNECTIONS)
+
+        if OPENAPI_CACHE_PATH:
+            app.openapi()
+    except Exception:
+        logger.exception("warm up failed, /readyz checks the database itself")
+    finally:
+        mark_ready("warmup")
+
+
 # create a lifespan which will be called before the apps run and it will
 # be used throughout the application cycle
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    SQLModel.metadata.create_all(engine)
+    # the schema is migrated ahead of deploy with scripts/migrate.py, never by the workers
+    pending = MigrationRunner(engine).pending()
+
+    if pending:
+        logger.warning("%d schema migration(s) pending, run python -m scripts.migrate upgrade", len(pending))
+        # /readyz looks again until the deploy applied them
+        mark_not_ready("migrations")
+
+    # warm in the background so /healthz answers right away
+    mark_not_ready("warmup")
+    warming = asyncio.get_running_loop().run_in_executor(None, warm)
+
+    # the audit entries of the writes are inserted in batches in the background
+    if AUDIT_ENABLED:
+        audit_buffer.start(write_audit)
+
+    # removes the expired soft deleted rows within PURGE_HOURS
+    purger.start(run_maintenance)
+
+    # creates the coming months of attendance on postgres
+    if partitions is not None:
+        partitions.start(run_maintenance)
+
     yield
 
-title_router = TitleRouter()
-user_router = UserRouter()
-attendancetype_router = AttendancetypeRouter()
-servicetype_router = ServiceTypeRouter()
-service_router = ServiceRoute()
-auth_route = AuthRouter()
-member_route = MembersRoute()
+    await warming
+    await purger.stop()
+
+    if partitions is not None:
+        await partitions.stop()
+
+    # write the buffered audit entries while the sqlite writer still runs
+    await audit_buffer.stop()
+    # commit whatever the sqlite writer still has queued
+    close_writer()
+
+# (module, router class), imported and instantiated one by one so startup reports the cost of each
+ROUTERS: tuple[tuple[str, str], ...] = (
+    ("routers.tittle_route", "TitleRouter"),
+    ("routers.user_route", "UserRouter"),
+    ("routers.attendancetype_route", "AttendancetypeRouter"),
+    ("routers.servicetype_route", "ServiceTypeRouter"),
+    ("routers.service_route", "ServiceRoute"),
+    ("routers.auth_route", "AuthRouter"),
+    ("routers.members_route", "MembersRoute"),
+    ("routers.cache_route", "CacheRouter"),
+    ("routers.audit_route", "AuditRouter"),
+    ("routers.report_route", "ReportRouter"),
+    ("routers.backup_route", "BackupRouter"),
+    ("routers.metrics_route", "MetricsRouter"),
+    ("routers.health_route", "HealthRouter"),
+)
 
 # instantiate the fast api
 app = FastAPI(lifespan=lifespan)
 
-app.include_router(title_router)
-app.include_router(user_router)
-app.include_router(attendancetype_router)
-app.include_router(servicetype_router)
-app.include_router(service_router)
-app.include_router(auth_route)
-app.include_router(member_route)
+# time the queries of every request
+app.add_middleware(QueryTimingMiddleware)
+# attach the table version ETags, inside the compression so it can key on them
+app.add_middleware(ETagMiddleware)
+# negotiate brotli/gzip for larger responses
+app.add_middleware(CompressionMiddleware)
+# latency, in flight and sizes per route as sent on the wire
+app.add_middleware(MetricsMiddleware)
+
+# on demand profiling of single requests, only installed when an admin token is set
+if (profiling_token := os.getenv("PROFILING_TOKEN")):
+    app.add_middleware(ProfilingMiddleware, token=profiling_token)
+
+for module_name, router_name in ROUTERS:
+    app.include_router(startup_timer.load(module_name, router_name))
+
+# the schema of the generic Response[T] models is slow to build, keep it on disk between starts
+if OPENAPI_CACHE_PATH:
+    install_openapi_cache(app, OPENAPI_CACHE_PATH)
+
+startup_timer.report()
 
+# development server, production runs serve.py
 if __name__ == "__main__":
-    uvicorn.run("main:app", reload=True)
+    uvicorn.run("main:app", reload=os.getenv("DEBUG", "false").strip().lower() in ("1", "true", "yes"))
@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from typing import Optional, Callable, Awaitable, Any, MutableMapping
+from starlette.datastructures import Headers, MutableHeaders
+
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+# reference data is cheap to keep compressed between hits
+DEFAULT_CACHE_PATHS: tuple[str, ...] = ("/api/titles", "/api/attendancetype", "/api/servicetype")
+
+
+def parse_accept_encoding(value: str) -> dict[str, float]:
+    """parse an Accept-Encoding header into encodings and their q-values
+
+    Args:
+        value (str): the header value
+
+    Returns:
+        dict[str, float]: encoding and its weight
+    """
+    encodings: dict[str, float] = {}
+
+    for part in value.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+
+        weight: float = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+
+        encodings[name.strip().lower()] = weight
+
+    return encodings
+
+
+class CompressionMiddleware:
+    """Negotiate brotli or gzip for responses above a minimum size. Responses
+    of cacheable paths keep their compressed bytes in a small LRU so the same
+    body is not compressed again on every hit.
+    """
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None, gzip_level: Optional[int] = None,
+                 brotli_quality: Optional[int] = None, cache_paths: Optional[tuple[str, ...]] = None,
+                 cache_size: int = 256) -> None:
+        self.app = app
+        self.minimum_size: int = minimum_size if minimum_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+        self.gzip_level: int = gzip_level if gzip_level is not None else int(os.getenv("COMPRESSION_LEVEL", "6"))
+        self.brotli_quality: int = brotli_quality if brotli_quality is not None else int(os.getenv("BROTLI_QUALITY", "4"))
+
+        env_paths: Optional[str] = os.getenv("COMPRESSION_CACHE_PATHS")
+        if cache_paths is not None:
+            self.cache_paths = cache_paths
+        elif env_paths is not None:
+            self.cache_paths = tuple(path.strip() for path in env_paths.split(",") if path.strip())
+        else:
+            self.cache_paths = DEFAULT_CACHE_PATHS
+
+        self.cache_size: int = cache_size
+        self.__cache: OrderedDict[tuple[str, bytes], bytes] = OrderedDict()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding: Optional[str] = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, scope["path"].startswith(self.cache_paths), send)
+        await self.app(scope, receive, responder.send)
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        """pick the best encoding the client accepts
+
+        Args:
+            accept_encoding (str): Accept-Encoding header of the request
+
+        Returns:
+            Optional[str]: "br", "gzip" or None
+        """
+        if not accept_encoding:
+            return None
+
+        accepted: dict[str, float] = parse_accept_encoding(accept_encoding)
+        wildcard: float = accepted.get("*", 0.0)
+
+        if brotli is not None and accepted.get("br", wildcard) > 0:
+            return "br"
+
+        if accepted.get("gzip", wildcard) > 0:
+            return "gzip"
+
+        return None
+
+    def compress(self, encoding: str, body: bytes, cacheable: bool, etag: Optional[str] = None) -> bytes:
+        """compress a body, reusing the cached bytes for cacheable responses
+
+        Args:
+            encoding (str): "br" or "gzip"
+            body (bytes): uncompressed body
+            cacheable (bool): keep the compressed bytes for the next hit
+            etag (Optional[str], optional): ETag of the body, used as cache key. Defaults to None.
+
+        Returns:
+            bytes: the compressed body
+        """
+        if not cacheable:
+            return self.__encode(encoding, body)
+
+        # hashing is much cheaper than compressing again
+        key: tuple[str, bytes] = (encoding, etag.encode() if etag else hashlib.blake2b(body, digest_size=16).digest())
+
+        cached: Optional[bytes] = self.__cache.get(key)
+        if cached is not None:
+            self.__cache.move_to_end(key)
+            return cached
+
+        compressed: bytes = self.__encode(encoding, body)
+        self.__cache[key] = compressed
+
+        if len(self.__cache) > self.cache_size:
+            self.__cache.popitem(last=False)
+
+        return compressed
+
+    def __encode(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+
+class _CompressionResponder:
+    """Buffers a single-message response and compresses it. Streaming
+    responses and already encoded bodies are passed through untouched.
+    """
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, cacheable: bool, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.cacheable = cacheable
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.passthrough: bool = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.start_message is None:
+            await self.downstream(message)
+            return
+
+        if self.passthrough:
+            await self.downstream(message)
+            return
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        body: bytes = message.get("body", b"")
+
+        if message.get("more_body", False) or "content-encoding" in headers or len(body) < self.middleware.minimum_size:
+            self.passthrough = True
+            await self.downstream(self.start_message)
+            await self.downstream(message)
+            return
+
+        cacheable: bool = self.cacheable or "public" in headers.get("cache-control", "")
+        compressed: bytes = self.middleware.compress(self.encoding, body, cacheable, headers.get("etag"))
+
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(compressed))
+        headers.add_vary_header("Accept-Encoding")
+
+        await self.downstream(self.start_message)
+        await self.downstream({"type": "http.response.body", "body": compressed, "more_body": False})
@@ -0,0 +1,27 @@
+from starlette.datastructures import MutableHeaders
+from middlewares.compression_middleware import ASGIApp, Scope, Receive, Send, Message
+
+
+class ETagMiddleware:
+    """Adds the ETag computed by routers.dependencies.etag_guard to successful
+    responses. Handlers returning a Response directly bypass the headers of
+    FastAPI's sub response, so the tag travels through the request state.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        state: dict = scope.setdefault("state", {})
+
+        async def send_with_etag(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200 and "etag" in state:
+                headers = MutableHeaders(scope=message)
+                headers.setdefault("ETag", state["etag"])
+
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,42 @@
+from middlewares.compression_middleware import ASGIApp, Scope, Receive, Send, Message
+from utils.metrics import request_duration, requests_in_flight, response_size
+
+import time
+
+
+class MetricsMiddleware:
+    """Records latency, in flight requests and response size per route"""
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start: float = time.perf_counter()
+        status_code: int = 500
+        size: int = 0
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status_code, size
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            requests_in_flight.dec()
+
+            # label by the route template so ids in the path do not explode the series
+            route = scope.get("route")
+            route_path: str = getattr(route, "path", "unmatched")
+
+            request_duration.observe(time.perf_counter() - start, scope["method"], route_path, str(status_code))
+            response_size.observe(size, scope["method"], route_path)
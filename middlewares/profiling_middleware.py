@@ -0,0 +1,79 @@
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from middlewares.compression_middleware import ASGIApp, Scope, Receive, Send, Message
+from utils.profiler import SamplingProfiler
+
+import hmac
+import os
+import time
+
+
+PROFILE_HEADER: str = "x-profile"
+
+
+class ProfilingMiddleware:
+    """Runs a single request under the sampling profiler when it carries the
+    admin PROFILING_TOKEN in the X-Profile header. The query string is not
+    read, it ends up in the access logs, the request log and the cache keys.
+    main.py only installs it when the token is configured, so normal
+    traffic does not pay anything.
+
+    With X-Profile-Output: inline the folded profile replaces the response,
+    otherwise it is written to PROFILE_DIR and named in X-Profile-File.
+    """
+    def __init__(self, app: ASGIApp, token: str, directory: Optional[str] = None, interval_ms: Optional[float] = None) -> None:
+        self.app = app
+        self.token: bytes = token.encode()
+        self.directory: str = directory or os.getenv("PROFILE_DIR", "profiles")
+        self.interval: float = (interval_ms if interval_ms is not None else float(os.getenv("PROFILE_INTERVAL_MS", "1"))) / 1000
+
+    def requested_token(self, scope: Scope) -> Optional[str]:
+        return Headers(scope=scope).get(PROFILE_HEADER)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token: Optional[str] = self.requested_token(scope)
+
+        if token is None or not hmac.compare_digest(token.encode(), self.token):
+            await self.app(scope, receive, send)
+            return
+
+        inline: bool = Headers(scope=scope).get("x-profile-output", "").lower() == "inline"
+        file_name: str = f"{time.time_ns() // 1_000_000}-{scope['path'].strip('/').replace('/', '_') or 'root'}.folded"
+
+        profiler: SamplingProfiler = SamplingProfiler(interval=self.interval)
+
+        async def send_profiled(message: Message) -> None:
+            if inline:
+                # the profile is sent once the request is done
+                return
+
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-Profile-File"] = os.path.join(self.directory, file_name)
+
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            profiler.stop()
+
+        profile: bytes = profiler.folded().encode()
+
+        if inline:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(profile)).encode()),
+                (b"x-profile-duration-ms", f"{profiler.elapsed * 1000:.2f}".encode())
+            ]})
+            await send({"type": "http.response.body", "body": profile})
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+
+            with open(os.path.join(self.directory, file_name), "wb") as profile_file:
+                profile_file.write(profile)
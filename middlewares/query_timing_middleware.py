@@ -0,0 +1,65 @@
+from starlette.datastructures import MutableHeaders
+from middlewares.compression_middleware import ASGIApp, Scope, Receive, Send, Message
+from utils.query_instrumentation import QueryStats, current_stats, logger
+
+import time
+
+
+class QueryTimingMiddleware:
+    """Collects the query count, total database time and slowest statement
+    of every request. The numbers go out as a Server-Timing header and as
+    fields of a structured log record.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats: QueryStats = QueryStats()
+        token = current_stats.set(stats)
+        start: float = time.perf_counter()
+        status_code: int = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", self.server_timing(stats, (time.perf_counter() - start) * 1000))
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_stats.reset(token)
+
+            logger.info("request", extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "total_ms": round((time.perf_counter() - start) * 1000, 2),
+                "db_queries": stats.count,
+                "db_ms": round(stats.total_ms, 2),
+                "db_slowest_ms": round(stats.slowest_ms, 2),
+                "db_slowest_sql": stats.slowest_sql,
+                "db_slow_queries": stats.slow_queries
+            })
+
+    @staticmethod
+    def server_timing(stats: QueryStats, total_ms: float) -> str:
+        """format the stats as a Server-Timing header
+
+        Args:
+            stats (QueryStats): stats of the request
+            total_ms (float): time spent in the app so far
+
+        Returns:
+            str: the header value
+        """
+        return (f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries", '
+                f'db-slowest;dur={stats.slowest_ms:.2f}, app;dur={total_ms:.2f}')
@@ -0,0 +1,268 @@
+"""Versioned schema migrations.
+
+Every module in migrations/versions named <version>_<name>.py is one
+migration. It defines upgrade(op), a description and, when it cannot run
+inside a transaction (CREATE INDEX CONCURRENTLY), transactional = False.
+The applied versions are recorded in the schema_migrations table.
+
+Migrations are applied ahead of deploy with scripts/migrate.py, the app
+itself never runs DDL when it starts.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from utils.readiness import not_ready
+
+import importlib.util
+import logging
+import re
+import time
+
+
+logger: logging.Logger = logging.getLogger("makarios.migrations")
+
+VERSIONS_DIR: Path = Path(__file__).parent / "versions"
+
+# any constant works, it only has to be the same for every migrator
+_ADVISORY_LOCK_ID: int = 7_210_391
+
+_metadata: MetaData = MetaData()
+
+schema_migrations: Table = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String, nullable=False),
+    Column("applied_on", DateTime, nullable=False),
+    Column("duration_ms", Float, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """One versioned change of the schema"""
+    version: int
+    name: str
+    description: str
+    upgrade: Callable[["Operations"], None]
+    transactional: bool = True
+
+
+class Operations:
+    """The DDL helpers handed to a migration"""
+    def __init__(self, connection: Connection, transactional: bool) -> None:
+        self.connection: Connection = connection
+        self.transactional: bool = transactional
+        self.dialect: str = connection.dialect.name
+        self.__quote: Callable[[str], str] = connection.dialect.identifier_preparer.quote
+
+    def execute(self, sql: str, **params: Any) -> None:
+        self.connection.execute(text(sql), params)
+
+    def create_tables(self, metadata: MetaData) -> None:
+        """create the tables of a metadata that do not exist yet
+
+        Args:
+            metadata (MetaData): tables to create
+        """
+        metadata.create_all(self.connection, checkfirst=True)
+
+    def has_column(self, table: str, column: str) -> bool:
+        return column in {info["name"] for info in inspect(self.connection).get_columns(table)}
+
+    def add_column(self, table: str, column: Column) -> None:
+        """add a nullable column if it does not exist, instant on Postgres and SQLite as no row is rewritten
+
+        Args:
+            table (str): table to change
+            column (Column): the column, its name and type are used
+        """
+        if self.has_column(table, column.name):
+            return
+
+        self.connection.execute(text("ALTER TABLE {table} ADD COLUMN {name} {type}".format(
+            table=self.__quote(table),
+            name=self.__quote(column.name),
+            type=column.type.compile(dialect=self.connection.dialect)
+        )))
+
+    def create_index(self, name: str, table: str, columns: Sequence[str], unique: bool = False,
+                     where: Optional[str] = None, postgresql_ops: Optional[str] = None,
+                     sqlite_collation: Optional[str] = None, expressions: bool = False) -> None:
+        """create an index if it does not exist, without blocking writes on Postgres
+
+        Args:
+            name (str): name of the index
+            table (str): table to index
+            columns (Sequence[str]): indexed columns, in order
+            unique (bool, optional): unique index. Defaults to False.
+            where (Optional[str], optional): predicate of a partial index. Defaults to None.
+            postgresql_ops (Optional[str], optional): operator class of the columns on Postgres. Defaults to None.
+            sqlite_collation (Optional[str], optional): collation of the columns on SQLite. Defaults to None.
+            expressions (bool, optional): columns are SQL expressions, written as they are. Defaults to False.
+        """
+        suffix: str = ""
+
+        if postgresql_ops and self.dialect == "postgresql":
+            suffix = f" {postgresql_ops}"
+        elif sqlite_collation and self.dialect == "sqlite":
+            suffix = f" COLLATE {sqlite_collation}"
+
+        concurrently: bool = self.dialect == "postgresql" and not self.transactional
+
+        if concurrently:
+            # a failed concurrent build leaves an invalid index behind that IF NOT EXISTS would keep
+            invalid = self.connection.execute(text(
+                "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {"name": name}).first()
+
+            if invalid:
+                self.connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.__quote(name)}"))
+
+        sql: str = "CREATE {unique}INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})".format(
+            unique="UNIQUE " if unique else "",
+            concurrently="CONCURRENTLY " if concurrently else "",
+            name=self.__quote(name),
+            table=self.__quote(table),
+            columns=", ".join((column if expressions else self.__quote(column)) + suffix for column in columns)
+        )
+
+        if where:
+            sql += f" WHERE {where}"
+
+        self.connection.execute(text(sql))
+
+    def drop_index(self, name: str) -> None:
+        concurrently: str = "CONCURRENTLY " if self.dialect == "postgresql" and not self.transactional else ""
+        self.connection.execute(text(f"DROP INDEX {concurrently}IF EXISTS {self.__quote(name)}"))
+
+
+def discover(directory: Path = VERSIONS_DIR) -> list[Migration]:
+    """load the migrations of a directory
+
+    Args:
+        directory (Path, optional): directory of the migration modules. Defaults to VERSIONS_DIR.
+
+    Raises:
+        ValueError: raise if two migrations share a version
+
+    Returns:
+        list[Migration]: migrations ordered by version
+    """
+    migrations: dict[int, Migration] = {}
+
+    for path in sorted(directory.glob("*.py")):
+        match: Optional[re.Match[str]] = re.match(r"^(\d+)_(\w+)\.py$", path.name)
+
+        if not match:
+            continue
+
+        spec = importlib.util.spec_from_file_location(f"migrations.versions.{path.stem}", path)
+        if spec is None or spec.loader is None:
+            continue
+
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        version: int = int(match.group(1))
+
+        if version in migrations:
+            raise ValueError(f"Two migrations have the version {version}")
+
+        migrations[version] = Migration(
+            version=version,
+            name=match.group(2),
+            description=getattr(module, "description", match.group(2)),
+            upgrade=module.upgrade,
+            transactional=getattr(module, "transactional", True)
+        )
+
+    return [migrations[version] for version in sorted(migrations)]
+
+
+class MigrationRunner:
+    """Applies the pending migrations of an engine in order"""
+    def __init__(self, engine: Engine, migrations: Optional[list[Migration]] = None) -> None:
+        self.engine: Engine = engine
+        self.migrations: list[Migration] = migrations if migrations is not None else discover()
+
+    def applied(self) -> dict[int, datetime]:
+        """versions already applied
+
+        Returns:
+            dict[int, datetime]: when each version was applied
+        """
+        with self.engine.connect() as connection:
+            if not inspect(connection).has_table(schema_migrations.name):
+                return {}
+
+            rows = connection.execute(select(schema_migrations.c.version, schema_migrations.c.applied_on)).all()
+
+        return {version: applied_on for version, applied_on in rows}
+
+    def pending(self) -> list[Migration]:
+        applied: dict[int, datetime] = self.applied()
+        return [migration for migration in self.migrations if migration.version not in applied]
+
+    def upgrade(self, target: Optional[int] = None) -> list[Migration]:
+        """apply the pending migrations up to a version
+
+        Args:
+            target (Optional[int], optional): last version to apply, all when None. Defaults to None.
+
+        Returns:
+            list[Migration]: the migrations applied
+        """
+        with not_ready("migrations"), self.engine.connect() as lock_connection:
+            postgres: bool = lock_connection.dialect.name == "postgresql"
+
+            # one migrator at a time when several deploy jobs race
+            if postgres:
+                lock_connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _ADVISORY_LOCK_ID})
+                lock_connection.commit()
+
+            try:
+                _metadata.create_all(self.engine, checkfirst=True)
+
+                done: list[Migration] = []
+
+                for migration in self.pending():
+                    if target is not None and migration.version > target:
+                        break
+
+                    self.__apply(migration, postgres)
+                    done.append(migration)
+
+                return done
+            finally:
+                if postgres:
+                    lock_connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _ADVISORY_LOCK_ID})
+                    lock_connection.commit()
+
+    def __apply(self, migration: Migration, postgres: bool) -> None:
+        logger.info("applying migration %04d %s", migration.version, migration.name)
+        started: float = time.perf_counter()
+
+        if migration.transactional or not postgres:
+            with self.engine.begin() as connection:
+                migration.upgrade(Operations(connection, transactional=True))
+                self.__record(connection, migration, started)
+        else:
+            # CONCURRENTLY refuses to run inside a transaction block, the operations must be idempotent
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                migration.upgrade(Operations(connection, transactional=False))
+
+            with self.engine.begin() as connection:
+                self.__record(connection, migration, started)
+
+    @staticmethod
+    def __record(connection: Connection, migration: Migration, started: float) -> None:
+        connection.execute(schema_migrations.insert().values(
+            version=migration.version,
+            name=migration.name,
+            applied_on=datetime.utcnow(),
+            duration_ms=round((time.perf_counter() - started) * 1000, 3)
+        ))
@@ -0,0 +1,96 @@
+"""The tables as create_all made them before migrations existed.
+
+The definitions are frozen here instead of taken from the entities, so
+later migrations change the schema from a known state. Databases created
+by create_all already have these tables and are left as they are.
+"""
+from sqlalchemy import (Boolean, CheckConstraint, Column, Date, DateTime, ForeignKey, Integer, LargeBinary,
+                        MetaData, String, Table, Time)
+from migrations.runner import Operations
+
+
+description: str = "user, title, servicetype, attendancetype, member, service and attendance tables"
+
+metadata: MetaData = MetaData()
+
+Table(
+    "user", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("firstname", String, nullable=False),
+    Column("middlename", String, nullable=False),
+    Column("lastname", String, nullable=False),
+    Column("gender", String, nullable=False),
+    Column("phoneNumber", String, nullable=False),
+    Column("emailaddress", String, unique=True, index=True),
+    Column("password", String, nullable=False),
+    Column("disabled", Boolean, nullable=False),
+    Column("createdon", DateTime),
+    Column("modifiedon", DateTime),
+)
+
+Table(
+    "title", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("title_name", String, unique=True, index=True),
+    Column("createdon", DateTime),
+    Column("modifiedon", DateTime),
+)
+
+for lookup in ("servicetype", "attendancetype"):
+    Table(
+        lookup, metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String, index=True),
+        Column("createdby", Integer, ForeignKey("user.id"), nullable=False),
+        Column("createdon", DateTime),
+        Column("modifiedon", DateTime),
+        Column("modifiedby", Integer),
+    )
+
+Table(
+    "member", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("firstname", String, nullable=False),
+    Column("lastname", String, nullable=False),
+    Column("middlename", String, nullable=False),
+    Column("gender", String, nullable=False),
+    Column("emailaddress", String, unique=True, index=True),
+    Column("phonenumber", String, nullable=False),
+    Column("dob", Date),
+    Column("profile_picture", LargeBinary),
+    Column("house_address", String, nullable=False),
+    Column("title_id", Integer, ForeignKey("title.id"), nullable=False),
+    Column("createdby", Integer, ForeignKey("user.id"), nullable=False),
+    Column("modifiedby", Integer),
+    Column("createdon", DateTime),
+    Column("modifiedon", DateTime),
+    # the entity binds the 5MB limit as a parameter, which DDL cannot take
+    CheckConstraint(f"LENGTH(profile_picture) <= {5 * 1024 * 1024}", name="profile_picture_length_check"),
+)
+
+Table(
+    "service", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("servicetypeId", Integer, ForeignKey("servicetype.id"), nullable=False),
+    Column("date", Date),
+    Column("createdby", Integer, ForeignKey("user.id"), nullable=False),
+    Column("time_start", Time, nullable=False),
+    Column("location", String, nullable=False),
+    Column("createdon", DateTime),
+    Column("modifiedon", DateTime),
+    Column("modifiedby", Integer),
+)
+
+Table(
+    "attendance", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("memberid", Integer, ForeignKey("member.id"), nullable=False),
+    Column("serviceid", Integer, ForeignKey("service.id"), nullable=False),
+    Column("attendancestatusid", Integer, ForeignKey("attendancetype.id"), nullable=False),
+    Column("createdon", DateTime),
+    Column("modifiedon", DateTime),
+)
+
+
+def upgrade(op: Operations) -> None:
+    op.create_tables(metadata)
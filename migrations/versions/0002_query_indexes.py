@@ -0,0 +1,33 @@
+"""Indexes for the joins and filters of the routers.
+
+Neither Postgres nor SQLite index foreign keys by themselves, every join
+of attendance to member and service was a scan. Built CONCURRENTLY on
+Postgres so a live database keeps taking writes.
+"""
+from migrations.runner import Operations
+
+
+description: str = "foreign key, date and createdon indexes"
+
+transactional: bool = False
+
+INDEXES: tuple[tuple[str, str, tuple[str, ...]], ...] = (
+    ("ix_attendance_serviceid", "attendance", ("serviceid",)),
+    ("ix_attendance_memberid", "attendance", ("memberid",)),
+    ("ix_attendance_attendancestatusid", "attendance", ("attendancestatusid",)),
+    ("ix_attendance_createdon", "attendance", ("createdon",)),
+    ("ix_service_servicetypeId", "service", ("servicetypeId",)),
+    ("ix_service_createdby", "service", ("createdby",)),
+    ("ix_service_date", "service", ("date",)),
+    ("ix_service_createdon", "service", ("createdon",)),
+    ("ix_member_title_id", "member", ("title_id",)),
+    ("ix_member_createdby", "member", ("createdby",)),
+    ("ix_member_createdon", "member", ("createdon",)),
+    ("ix_servicetype_createdby", "servicetype", ("createdby",)),
+    ("ix_attendancetype_createdby", "attendancetype", ("createdby",)),
+)
+
+
+def upgrade(op: Operations) -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
@@ -0,0 +1,35 @@
+"""Pattern indexes for the prefix filters of validators/filters.
+
+LIKE 'value%' only uses an index built for pattern matching: COLLATE
+NOCASE on SQLite, where LIKE is case insensitive, and text_pattern_ops on
+Postgres. dob gets a plain index for its range filter.
+"""
+from migrations.runner import Operations
+
+
+description: str = "prefix filter and dob indexes"
+
+transactional: bool = False
+
+PREFIX_INDEXES: tuple[tuple[str, str], ...] = (
+    ("member", "firstname"),
+    ("member", "lastname"),
+    ("member", "middlename"),
+    ("member", "emailaddress"),
+    ("member", "phonenumber"),
+    ("user", "firstname"),
+    ("user", "middlename"),
+    ("user", "lastname"),
+    ("service", "location"),
+    ("title", "title_name"),
+    ("servicetype", "name"),
+    ("attendancetype", "name"),
+)
+
+
+def upgrade(op: Operations) -> None:
+    for table, column in PREFIX_INDEXES:
+        op.create_index(f"ix_{table}_{column}_prefix", table, (column,),
+                        postgresql_ops="text_pattern_ops", sqlite_collation="NOCASE")
+
+    op.create_index("ix_member_dob", "member", ("dob",))
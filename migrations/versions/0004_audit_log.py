@@ -0,0 +1,55 @@
+"""The append-only audit_log table.
+
+Rows are only ever inserted, by the audit buffer. Triggers reject UPDATE
+and DELETE so neither a bug nor a hand written statement can rewrite the
+history. The entries are read by table and row, by user and newest first.
+"""
+from sqlalchemy import JSON, Column, DateTime, Integer, MetaData, String, Table
+from migrations.runner import Operations
+
+
+description: str = "audit_log table, append-only"
+
+metadata: MetaData = MetaData()
+
+Table(
+    "audit_log", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("occurredon", DateTime, nullable=False),
+    Column("actor_id", Integer),
+    Column("action", String(6), nullable=False),
+    Column("table_name", String, nullable=False),
+    Column("row_id", Integer),
+    Column("before", JSON),
+    Column("after", JSON),
+)
+
+INDEXES: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("ix_audit_log_table_name_row_id", ("table_name", "row_id")),
+    ("ix_audit_log_actor_id", ("actor_id",)),
+    ("ix_audit_log_occurredon", ("occurredon",)),
+)
+
+
+def upgrade(op: Operations) -> None:
+    op.create_tables(metadata)
+
+    for name, columns in INDEXES:
+        op.create_index(name, "audit_log", columns)
+
+    if op.dialect == "postgresql":
+        op.execute(
+            "CREATE OR REPLACE FUNCTION audit_log_append_only() RETURNS trigger AS $$ "
+            "BEGIN RAISE EXCEPTION 'audit_log is append-only'; END; $$ LANGUAGE plpgsql"
+        )
+        op.execute("DROP TRIGGER IF EXISTS audit_log_append_only ON audit_log")
+        op.execute(
+            "CREATE TRIGGER audit_log_append_only BEFORE UPDATE OR DELETE ON audit_log "
+            "FOR EACH ROW EXECUTE FUNCTION audit_log_append_only()"
+        )
+    elif op.dialect == "sqlite":
+        for statement in ("UPDATE", "DELETE"):
+            op.execute(
+                f"CREATE TRIGGER IF NOT EXISTS audit_log_no_{statement.lower()} BEFORE {statement} ON audit_log "
+                "BEGIN SELECT RAISE(ABORT, 'audit_log is append-only'); END"
+            )
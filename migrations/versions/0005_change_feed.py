@@ -0,0 +1,35 @@
+"""Indexes and tombstones for the change feeds.
+
+A feed reads the rows changed after a watermark in the order of
+COALESCE(modifiedon, createdon), id. The expression index serves both the
+condition and the order, so a sync costs the number of changes and not
+the size of the table. Deletes leave a row in deletion_log, read in the
+order of deletedon, id per table.
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table
+from migrations.runner import Operations
+
+
+description: str = "change feed indexes and the deletion_log table"
+
+transactional: bool = False
+
+FEED_TABLES: tuple[str, ...] = ("member", "service", "title", "servicetype", "attendancetype")
+
+metadata: MetaData = MetaData()
+
+Table(
+    "deletion_log", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("table_name", String, nullable=False),
+    Column("row_id", Integer, nullable=False),
+    Column("deletedon", DateTime, nullable=False),
+)
+
+
+def upgrade(op: Operations) -> None:
+    op.create_tables(metadata)
+    op.create_index("ix_deletion_log_table_name_deletedon", "deletion_log", ("table_name", "deletedon", "id"))
+
+    for table in FEED_TABLES:
+        op.create_index(f"ix_{table}_changedon", table, ("COALESCE(modifiedon, createdon)", "id"), expressions=True)
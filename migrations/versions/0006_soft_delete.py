@@ -0,0 +1,47 @@
+"""Soft delete: a deletedon column and the indexes of the live rows.
+
+The selects of the entities only read rows where deletedon IS NULL. The
+partial indexes hold those rows only, so the lists do not grow slower as
+deleted rows pile up, and the unique emails and titles only apply to the
+live rows, a deleted member can be added again. The purge finds its rows
+through the partial index of the deleted ones.
+"""
+from sqlalchemy import Column, DateTime
+from migrations.runner import Operations
+
+
+description: str = "deletedon column, live and deleted partial indexes"
+
+transactional: bool = False
+
+SOFT_DELETE_TABLES: tuple[str, ...] = ("member", "user", "service", "title", "servicetype", "attendancetype")
+
+LIVE: str = "deletedon IS NULL"
+
+# the lists ordered by createdon read the live rows in index order
+LIVE_INDEXES: tuple[tuple[str, str, tuple[str, ...]], ...] = (
+    ("ix_member_live_createdon", "member", ("createdon",)),
+    ("ix_service_live_createdon", "service", ("createdon",)),
+    ("ix_user_live_createdon", "user", ("createdon",)),
+)
+
+# (new partial unique index, table, column, unique index it replaces)
+UNIQUE_INDEXES: tuple[tuple[str, str, str, str], ...] = (
+    ("ux_member_live_emailaddress", "member", "emailaddress", "ix_member_emailaddress"),
+    ("ux_user_live_emailaddress", "user", "emailaddress", "ix_user_emailaddress"),
+    ("ux_title_live_title_name", "title", "title_name", "ix_title_title_name"),
+)
+
+
+def upgrade(op: Operations) -> None:
+    for table in SOFT_DELETE_TABLES:
+        op.add_column(table, Column("deletedon", DateTime))
+        op.create_index(f"ix_{table}_deletedon", table, ("deletedon",), where="deletedon IS NOT NULL")
+
+    for name, table, columns in LIVE_INDEXES:
+        op.create_index(name, table, columns, where=LIVE)
+
+    for name, table, column, replaced in UNIQUE_INDEXES:
+        # the new one first, the column is never left without a unique index
+        op.create_index(name, table, (column,), unique=True, where=LIVE)
+        op.drop_index(replaced)
@@ -0,0 +1,107 @@
+"""Attendance partitioned by createdon month on Postgres.
+
+Postgres cannot partition a table in place. The existing table becomes the
+first partition, holding everything before the next month, so no row is
+copied:
+
+* a CHECK constraint on its range is validated first, without blocking
+  writes, so attaching it does not scan the table again
+* the (id, createdon) primary key is built concurrently, a partitioned
+  table needs the partition key in its primary key
+* one DO block, a single transaction, renames it, creates the partitioned
+  attendance, attaches it, adds a DEFAULT partition and the months ahead
+
+The indexes of 0002 are then created on the partitioned table, Postgres
+adopts the ones the old table has and builds them on the empty months.
+utils/partitions.py creates the next months and drops the expired ones
+from then on. SQLite keeps the single table.
+"""
+from datetime import datetime
+from sqlalchemy import text
+from migrations.runner import Operations
+
+
+description: str = "attendance range partitioned by createdon month on postgres"
+
+transactional: bool = False
+
+# months created ahead by the migration, the app keeps it going
+MONTHS_AHEAD: int = 3
+
+FOREIGN_KEYS: tuple[tuple[str, str], ...] = (
+    ("memberid", "member"),
+    ("serviceid", "service"),
+    ("attendancestatusid", "attendancetype"),
+)
+
+# (partitioned index, column), the indexes of 0002
+INDEXES: tuple[tuple[str, str], ...] = (
+    ("ix_attendance_serviceid", "serviceid"),
+    ("ix_attendance_memberid", "memberid"),
+    ("ix_attendance_attendancestatusid", "attendancestatusid"),
+    ("ix_attendance_createdon", "createdon"),
+)
+
+
+def _next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def upgrade(op: Operations) -> None:
+    if op.dialect != "postgresql":
+        return
+
+    partitioned = op.connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'attendance'"
+    )).first()
+
+    if partitioned:
+        return
+
+    # rows from before createdon was always set, the partition key cannot be NULL
+    op.execute("UPDATE attendance SET createdon = COALESCE(modifiedon, now() AT TIME ZONE 'utc') WHERE createdon IS NULL")
+
+    boundary: datetime = op.connection.execute(text(
+        "SELECT date_trunc('month', GREATEST(MAX(createdon), now() AT TIME ZONE 'utc')) + interval '1 month' FROM attendance"
+    )).scalar()
+
+    # NOT VALID only locks for a moment, the validation reads the table while the writes go on
+    op.execute("ALTER TABLE attendance DROP CONSTRAINT IF EXISTS attendance_legacy_range")
+    op.execute(f"ALTER TABLE attendance ADD CONSTRAINT attendance_legacy_range "
+               f"CHECK (createdon IS NOT NULL AND createdon < '{boundary:%Y-%m-%d}') NOT VALID")
+    op.execute("ALTER TABLE attendance VALIDATE CONSTRAINT attendance_legacy_range")
+
+    op.create_index("ux_attendance_legacy_id_createdon", "attendance", ("id", "createdon"), unique=True)
+
+    months: list[datetime] = [boundary]
+
+    for _ in range(MONTHS_AHEAD - 1):
+        months.append(_next_month(months[-1]))
+
+    statements: list[str] = [
+        "ALTER TABLE attendance RENAME TO attendance_legacy",
+        # the validated check proves it, no scan
+        "ALTER TABLE attendance_legacy ALTER COLUMN createdon SET NOT NULL",
+        "ALTER TABLE attendance_legacy DROP CONSTRAINT attendance_pkey",
+        "ALTER TABLE attendance_legacy ADD CONSTRAINT attendance_legacy_pkey PRIMARY KEY USING INDEX ux_attendance_legacy_id_createdon",
+        *[f"ALTER INDEX IF EXISTS {name} RENAME TO {name.replace('attendance', 'attendance_legacy', 1)}" for name, _ in INDEXES],
+        "CREATE TABLE attendance (LIKE attendance_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (createdon)",
+        "ALTER TABLE attendance ADD CONSTRAINT attendance_pkey PRIMARY KEY (id, createdon)",
+        *[f"ALTER TABLE attendance ADD CONSTRAINT attendance_{column}_fkey FOREIGN KEY ({column}) REFERENCES {table} (id)"
+          for column, table in FOREIGN_KEYS],
+        # the ids keep coming from the same sequence, owned by the new table so dropping the old partition keeps it
+        "EXECUTE 'ALTER SEQUENCE ' || pg_get_serial_sequence('attendance_legacy', 'id') || ' OWNED BY attendance.id'",
+        f"ALTER TABLE attendance ATTACH PARTITION attendance_legacy FOR VALUES FROM (MINVALUE) TO ('{boundary:%Y-%m-%d}')",
+        "ALTER TABLE attendance_legacy DROP CONSTRAINT attendance_legacy_range",
+        # catches what no month takes, the app creates the months before they are needed
+        "CREATE TABLE attendance_default PARTITION OF attendance DEFAULT",
+        *[f"CREATE TABLE attendance_p{month:%Y%m} PARTITION OF attendance "
+          f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')" for month in months],
+    ]
+
+    # one statement, one transaction, attendance is never missing for a check-in
+    op.execute("DO $$ BEGIN " + " ".join(f"{statement};" for statement in statements) + " END $$")
+
+    for name, column in INDEXES:
+        # a partitioned index cannot be built concurrently, it adopts the legacy index and builds the empty months
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON attendance ({column})")
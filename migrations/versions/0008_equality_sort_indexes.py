@@ -0,0 +1,36 @@
+"""Plain indexes for the equality filters and the sorts on text columns.
+
+The pattern indexes of 0003 only serve LIKE 'value%': on SQLite their
+NOCASE collation does not match the = and ORDER BY of the column, and on
+Postgres text_pattern_ops does not give the order of the collation. The
+fields of validators/filters that declare eq or sort on these columns get
+an index in the default collation. The lists only read the live rows, so
+the indexes are partial like the ones of 0006. title_name already has its
+unique index.
+"""
+from migrations.runner import Operations
+
+
+description: str = "equality and sort indexes of the filtered text columns"
+
+transactional: bool = False
+
+LIVE: str = "deletedon IS NULL"
+
+INDEXES: tuple[tuple[str, str], ...] = (
+    ("member", "firstname"),
+    ("member", "lastname"),
+    ("member", "middlename"),
+    ("member", "phonenumber"),
+    ("user", "firstname"),
+    ("user", "middlename"),
+    ("user", "lastname"),
+    ("service", "location"),
+    ("servicetype", "name"),
+    ("attendancetype", "name"),
+)
+
+
+def upgrade(op: Operations) -> None:
+    for table, column in INDEXES:
+        op.create_index(f"ix_{table}_live_{column}", table, (column,), where=LIVE)
@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from entities.attendance_type_entity import AttendanceType, AttendanceTypeInput, AttendanceTypeOutput, AttendanceTypeUser
-from entities.user_entity import User
 from entities.auth_entity.token_Entity import TokenData
-from db import get_session
-from sqlmodel import Session, select, cast, String, column
-from dto.response import Response, SingleResponse
-from typing import Optional, Sequence, Annotated
+from db import get_session, save, delete
+from sqlmodel import Session, select
+from dto.response import Response, SingleResponse, Changes
+from dto.fast_response import FastResponse, fast_response, fast_item
+from typing import Optional, Sequence, Annotated, Any
 from enums.enums import SuccessMessage, ErrorMessage
 from datetime import datetime
+from routers.dependencies import etag_guard, get_read_session
+from validators.filters.filter import FilterQuery
+from validators.lookup_validator import attendancetype_filters, attendancetype_projection, attendancetype_detail_projection, attendancetype_feed
+from utils.change_feed import CHANGES_PAGE_MAX, Watermark
+from utils.response_cache import cached
+from utils.single_flight import coalesced
 from routers.auth_route import  get_current_active_user
 
+import asyncio
+
 
 class AttendancetypeRouter(APIRouter):
     def __init__(self):
@@ -18,75 +26,63 @@ class AttendancetypeRouter(APIRouter):
 
     def setup_routes(self) -> None:
         self.add_api_route(path="/getAll", endpoint=self.get_attendancetypes,
-                           methods=["GET"], response_model=Response[AttendanceTypeUser])
+                           methods=["GET"], response_model=Response[AttendanceTypeUser],
+                           dependencies=[Depends(etag_guard("attendancetype", "user"))])
         self.add_api_route(path="/getbyId/{title_id}", endpoint=self.get_attendanceType_id,
-                           methods=["GET"], response_model=Response[AttendanceType])
+                           methods=["GET"], response_model=Response[AttendanceType],
+                           dependencies=[Depends(etag_guard("attendancetype"))])
         self.add_api_route(path="/addattendacetype", endpoint=self.add_attendanceType,
                            methods=["POST"], response_model=Response[AttendanceType])
         self.add_api_route(path="/updateattendancetype/{id}", methods=[
                            "PUT"], endpoint=self.change_attendancetype, response_model=Response[AttendanceType])
         self.add_api_route(path="/deleteattendancetype/{id}", methods=[
                            "DELETE"], endpoint=self.remove_attendacetype, response_model=Response[AttendanceTypeOutput])
+        self.add_api_route("/changes", self.get_changes, methods=["GET"], response_model=Changes[AttendanceTypeUser])
 
+    @cached(tables=("attendancetype", "user"))
+    @coalesced()
     async def get_attendancetypes(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
-                                  name: Optional[str] = None, 
-                                  session: Session = Depends(get_session),
-                                  ) -> Response[AttendanceTypeUser]:
+                                  session: Session = Depends(get_read_session),
+                                  filters: FilterQuery = Depends(attendancetype_filters.dependency)
+                                  ) -> FastResponse:
         """Get All attendance type in the church
 
         Args:
-            name (Optional[str], optional): if name is specified. Defaults to None.
-            session (Session, optional): dependency. Defaults to Depends(get_session).
+            session (Session, optional): dependency. Defaults to Depends(get_read_session).
+            filters (FilterQuery, optional): ?name= filters by the start of the name, ?fields= picks the fields. Defaults to Depends(attendancetype_filters.dependency).
 
         Returns:
-            Reponse[AttendanceTypeOutPut]: Return a response of the AttendaceType Output Model
+            FastResponse: Return a response of the AttendaceType User Model encoded with orjson
         """
-        query = select(AttendanceType, User).join(User)
-        response: Response[AttendanceTypeUser]
-
-        if name:
-            query = query.where(column("name").like(f"%{name}%"))
-            
-        result_db: Sequence[tuple[AttendanceType, User]] = session.exec(query.order_by(
-            cast(AttendanceType.createdon, String))).all()
-
-        attendanceOutputList: list[AttendanceTypeUser] = []
-
-        for attendance, user in result_db:
-            at_user: AttendanceTypeUser = AttendanceTypeUser(
-                id=attendance.id,
-                name=attendance.name,
-                email_createdby=user.emailaddress,
-                email_modifiedby=user.emailaddress if attendance.modifiedby else attendance.modifiedby,
-                createdon=attendance.createdon,
-                modifiedon=attendance.modifiedon
-            )
-
-            attendanceOutputList.append(at_user)
-
-        if attendanceOutputList:
-            response = Response(
-                success=True,
-                message=SuccessMessage.OperationSuccessful.value,
-                data=attendanceOutputList
-            )
-        else:
-            return Response(success=False, message=ErrorMessage.NoAttendanceFound.value, data=None)
+        # off the event loop, identical requests arriving meanwhile join this flight
+        result_db: Sequence[Any] = await asyncio.to_thread(
+            lambda: session.exec(attendancetype_filters.statement(filters), params=filters.params).all())
 
-        return response
+        return fast_response(result_db, columns=filters.fields,
+                             response_model=attendancetype_projection.response_model(filters.fields),
+                             empty_message=ErrorMessage.NoAttendanceFound.value)
 
     async def get_attendanceType_id(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
                                     id: int, 
-                                    session: Session = Depends(get_session)) -> Response[AttendanceType]:
+                                    session: Session = Depends(get_read_session),
+                                    fields: Optional[tuple[str, ...]] = Depends(attendancetype_detail_projection.requested)
+                                    ) -> Response[AttendanceType] | FastResponse:
         """get attendace by ID
 
         Args:
             id (int): Title ID
-            session (Session, optional): Dependency. Defaults to Depends(get_session).
+            session (Session, optional): Dependency. Defaults to Depends(get_read_session).
+            fields (Optional[tuple[str, ...]], optional): ?fields= to read only some fields. Defaults to Depends(attendancetype_detail_projection.requested).
 
         Returns:
-            Response[AttendanceType]: Return a reponse of AttendanceType
+            Response[AttendanceType] | FastResponse: Return a reponse of AttendanceType, encoded with orjson when fields are given
         """
+        if fields:
+            row: Optional[Any] = session.exec(attendancetype_detail_projection.select(fields).where(AttendanceType.id == id)).first()
+
+            return fast_item(row, columns=fields, response_model=attendancetype_detail_projection.response_model(fields),
+                             empty_message=ErrorMessage.NoAttendanceFound.value)
+
         title: Optional[AttendanceType] = session.get(AttendanceType, id)
 
         response = None
@@ -106,6 +102,25 @@ class AttendancetypeRouter(APIRouter):
             )
         return response
 
+    async def get_changes(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
+                          session: Session = Depends(get_session),
+                          since: Watermark = Depends(attendancetype_feed.since),
+                          fields: Optional[tuple[str, ...]] = Depends(attendancetype_projection.requested),
+                          limit: int = Query(default=100, ge=1, le=CHANGES_PAGE_MAX)) -> FastResponse:
+        """get the attendance types inserted, updated or deleted after a watermark, oldest first
+
+        Args:
+            current_user (Annotated[SingleResponse[TokenData], Depends): current user
+            session (Session, optional): session on the primary, a replica may be behind the watermark. Defaults to Depends(get_session).
+            since (Watermark, optional): ?since= watermark of the previous page. Defaults to the start of the feed.
+            fields (Optional[tuple[str, ...]], optional): ?fields= of the upserts. Defaults to all of them.
+            limit (int, optional): changes per page. Defaults to 100.
+
+        Returns:
+            FastResponse: Changes of AttendanceTypeUser with the watermark of the next page, encoded with orjson
+        """
+        return FastResponse(attendancetype_feed.read(session, since, fields or attendancetype_projection.default, limit))
+
     async def add_attendanceType(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
                                  attendancetype: AttendanceTypeInput, 
                                  session: Session = Depends(get_session)) -> Response[AttendanceType]:
@@ -137,9 +152,7 @@ class AttendancetypeRouter(APIRouter):
         if current_user.success and current_user.data and current_user.data.id:
             new_attendanceType.createdby = current_user.data.id
             
-        session.add(new_attendanceType)
-        session.commit()
-        session.refresh(new_attendanceType)
+        new_attendanceType = await save(new_attendanceType)
         if new_attendanceType:
             response = Response(
                 success=True,
@@ -187,8 +200,7 @@ class AttendancetypeRouter(APIRouter):
                 old_attendanceType.name = new_attendanceType.name
                 old_attendanceType.modifiedby = current_user.data.id
                 old_attendanceType.modifiedon = datetime.utcnow()
-                session.commit()
-                session.refresh(old_attendanceType)
+                old_attendanceType = await save(old_attendanceType)
 
                 response = Response(
                     success=True,
@@ -221,8 +233,7 @@ class AttendancetypeRouter(APIRouter):
         attendanceType_del: Optional[AttendanceType] = session.get(AttendanceType, id)
 
         if attendanceType_del:
-            session.delete(attendanceType_del)
-            session.commit()
+            await delete(attendanceType_del)
 
             response = Response(
                 success=True,
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Annotated, Any, Optional, Sequence
+from sqlmodel import Session
+from dto.response import Page, SingleResponse
+from dto.fast_response import FastResponse, rows_to_dicts
+from entities.audit_entity import AuditLog, AuditLogOutput
+from entities.auth_entity.token_Entity import TokenData
+from enums.enums import SuccessMessage, ErrorMessage
+from routers.dependencies import get_read_session
+from validators.filters.filter import FilterQuery
+from validators.audit_validator import audit_filters
+from routers.auth_route import get_current_active_user
+
+import os
+
+
+# largest page a caller can ask for
+AUDIT_PAGE_MAX: int = int(os.getenv("AUDIT_PAGE_MAX", "500"))
+
+
+class AuditRouter(APIRouter):
+    def __init__(self) -> None:
+        super().__init__(prefix="/api/audit")
+        self.setup_routes()
+
+    def setup_routes(self) -> None:
+        self.add_api_route("/getentries", self.get_entries, methods=["GET"], response_model=Page[AuditLogOutput])
+
+    async def get_entries(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
+                          session: Session = Depends(get_read_session),
+                          filters: FilterQuery = Depends(audit_filters.dependency),
+                          before: Optional[int] = Query(default=None, description="next_cursor of the previous page"),
+                          limit: int = Query(default=50, ge=1, le=AUDIT_PAGE_MAX)) -> FastResponse:
+        """get the audit entries, newest first, one page at a time
+
+        Filters are read from the query string as declared in validators/audit_validator.py,
+        e.g. ?table_name=member&row_id=12 or ?actor_id=3&occurredon__gte=2024-01-01.
+        The entries are written in batches, the last second of writes may not be in yet.
+
+        Args:
+            current_user (Annotated[SingleResponse[TokenData], Depends): current user
+            session (Session, optional): session. Defaults to Depends(get_read_session).
+            filters (FilterQuery, optional): parsed filters and fields. Defaults to Depends(audit_filters.dependency).
+            before (Optional[int], optional): only entries older than this cursor. Defaults to None.
+            limit (int, optional): entries per page. Defaults to 50.
+
+        Returns:
+            FastResponse: Page of the audit entries encoded with orjson
+        """
+        statement = audit_filters.statement(filters)
+
+        # keyset pagination, the id index serves every page as fast as the first
+        if before is not None:
+            statement = statement.where(AuditLog.id < before)  # type: ignore
+
+        # one more row tells if there is a next page
+        rows: Sequence[Any] = session.exec(statement.limit(limit + 1), params=filters.params).all()
+        page: Sequence[Any] = rows[:limit]
+
+        if not page:
+            return FastResponse({"success": False, "message": ErrorMessage.NoEntry.value, "data": None, "next_cursor": None})
+
+        return FastResponse({
+            "success": True,
+            "message": SuccessMessage.OperationSuccessful.value,
+            "data": rows_to_dicts(filters.fields, page),
+            "next_cursor": page[-1][filters.fields.index("id")] if len(rows) > limit else None
+        })
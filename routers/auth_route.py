@@ -10,7 +10,9 @@ from utils.user_utils import Utils
 from exceptions.env_exceptions import EnvironmentNotFound
 from enums.enums import SuccessMessage, ErrorMessage
 from sqlmodel import Session, select
-from db import get_session_funct
+from db import get_session_funct, run_write
+from utils.metrics import jwt_decode_failures
+from utils.replicas import request_user_id
 
 import os
 
@@ -49,13 +51,34 @@ class AuthRouter(APIRouter):
         
         if user.data:
             
-            if not self.__utils.verify_password(email=email, password=password, hash_pass = user.data.password):
+            verified, new_hash = self.__utils.verify_and_update_password(email=email, password=password, hash_pass = user.data.password)
+            
+            if not verified:
                 return False
             
+            # the hashing policy changed since this hash was made, upgrade it while we have the password
+            if new_hash and user.data.id:
+                await self.__rehash_user(user.data.id, new_hash)
+            
             res = user.data
         
         return res
     
+    async def __rehash_user(self, user_id: int, new_hash: str) -> None:
+        """store the upgraded hash of a user
+
+        Args:
+            user_id (int): id of the user
+            new_hash (str): hash made with the current policy
+        """
+        def work(session: Session) -> None:
+            stored: Optional[User] = session.get(User, user_id)
+            
+            if stored:
+                stored.password = new_hash
+        
+        await run_write(work)
+    
     @classmethod
     async def get_current_user(cls, token: Annotated[str, Depends(oauth2_scheme)]) -> SingleResponse[User]:
         """get current user
@@ -98,6 +121,7 @@ class AuthRouter(APIRouter):
             else:
                 raise EnvironmentNotFound("SECRET_KEY and ALGORITHM")
         except JWTError:
+            jwt_decode_failures.inc()
             raise credentials_exception
         
         email: Optional[str] = token_data.emailAddress
@@ -107,6 +131,8 @@ class AuthRouter(APIRouter):
             
         if user.success and user.data:
             res = user
+            # lets the writes of this request open the user's read-your-writes window
+            request_user_id.set(user.data.id)
             
         return res
     
@@ -174,7 +200,7 @@ class AuthRouter(APIRouter):
                 
                 return response
             
-            user: Optional[User] =  session.exec(select(User).where(User.emailaddress == email)).one()
+            user: Optional[User] =  session.exec(select(User).where(User.emailaddress == email)).first()
             
             if user: 
             
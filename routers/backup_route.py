@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Iterator, Optional
+from dto.response import SingleResponse
+from entities.auth_entity.token_Entity import TokenData
+from routers.auth_route import get_current_active_user
+from utils.backup import BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP_MS, Backup
+from db import url
+
+import asyncio
+import hmac
+import os
+
+
+# a backup holds the whole database, a logged in user also needs this admin token
+BACKUP_TOKEN: Optional[str] = os.getenv("BACKUP_TOKEN") or None
+
+
+class BackupRouter(APIRouter):
+    def __init__(self) -> None:
+        super().__init__(prefix="/api/backup")
+        self.setup_routes()
+
+    def setup_routes(self) -> None:
+        self.add_api_route("/snapshot", self.get_snapshot, methods=["GET"], response_class=StreamingResponse)
+
+    async def get_snapshot(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
+                           x_backup_token: Annotated[Optional[str], Header()] = None,
+                           pages_per_step: int = Query(default=BACKUP_PAGES_PER_STEP, ge=1),
+                           step_sleep_ms: float = Query(default=BACKUP_STEP_SLEEP_MS, ge=0, le=1000)) -> StreamingResponse:
+        """stream a compressed snapshot of the database, the writes carry on meanwhile
+
+        SQLite answers once the copy is made, a gzip of the database file. Postgres
+        streams a pg_dump custom format archive, restore it with pg_restore.
+
+        Args:
+            current_user (Annotated[SingleResponse[TokenData], Depends): current user
+            x_backup_token (Annotated[Optional[str], Header): the BACKUP_TOKEN. Defaults to None.
+            pages_per_step (int, optional): SQLite pages copied per step. Defaults to BACKUP_PAGES_PER_STEP.
+            step_sleep_ms (float, optional): pause between the steps. Defaults to BACKUP_STEP_SLEEP_MS.
+
+        Raises:
+            HTTPException: raise a 403 without the token, a 500 when the snapshot cannot be taken
+
+        Returns:
+            StreamingResponse: the snapshot as an attachment
+        """
+        if BACKUP_TOKEN is None or x_backup_token is None \
+                or not hmac.compare_digest(x_backup_token.encode(), BACKUP_TOKEN.encode()):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="A valid X-Backup-Token is required")
+
+        try:
+            backup: Backup = Backup(url, pages_per_step=pages_per_step, step_sleep_ms=step_sleep_ms)  # type: ignore
+            # the sqlite copy is made here, off the event loop
+            chunks: Iterator[bytes] = await asyncio.to_thread(backup.open)
+        except (ValueError, RuntimeError, OSError) as error:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(error)) from error
+
+        return StreamingResponse(chunks, media_type=backup.media_type,
+                                 headers={"Content-Disposition": f'attachment; filename="{backup.file_name}"'})
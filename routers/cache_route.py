@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from typing import Annotated
+from dto.response import SingleResponse
+from entities.auth_entity.token_Entity import TokenData
+from enums.enums import SuccessMessage
+from routers.auth_route import get_current_active_user
+from utils.response_cache import response_cache
+from utils.single_flight import single_flight
+
+
+class CacheRouter(APIRouter):
+    def __init__(self) -> None:
+        super().__init__(prefix="/api/cache")
+        self.setup_routes()
+
+    def setup_routes(self) -> None:
+        self.add_api_route("/stats", self.get_stats, methods=["GET"], response_model=SingleResponse[dict])
+
+    async def get_stats(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)]) -> SingleResponse[dict]:
+        """get the hit and miss counters of the response cache and the request coalescing
+
+        Args:
+            current_user (Annotated[SingleResponse[TokenData], Depends): current user
+
+        Returns:
+            SingleResponse[dict]: backend name, cache and coalescing counters
+        """
+        backend: str = response_cache.backend.name if response_cache.backend else "none"
+
+        return SingleResponse(
+            success=True,
+            message=SuccessMessage.OperationSuccessful.value,
+            data={
+                "backend": backend,
+                **response_cache.stats.as_dict(),
+                "single_flight": {
+                    "calls": single_flight.calls,
+                    "coalesced": single_flight.coalesced,
+                    "in_flight": single_flight.in_flight
+                }
+            }
+        )
@@ -0,0 +1,78 @@
+from fastapi import Depends, HTTPException, Request, status
+from typing import Annotated, Callable, Awaitable, Optional, Iterator
+from sqlmodel import Session
+from db import read_session
+from dto.response import SingleResponse
+from entities.auth_entity.token_Entity import TokenData
+from routers.auth_route import get_current_active_user
+from utils.table_versions import make_etag
+from utils.replicas import write_window
+from utils.workers import consistent
+
+
+def _strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """check an If-None-Match header against an ETag using the weak comparison
+
+    Args:
+        if_none_match (Optional[str]): If-None-Match header of the request
+        etag (str): current ETag
+
+    Returns:
+        bool: True if the client already has this version
+    """
+    if not if_none_match:
+        return False
+
+    tags: list[str] = [tag.strip() for tag in if_none_match.split(",")]
+
+    return "*" in tags or _strip_weak(etag) in {_strip_weak(tag) for tag in tags}
+
+
+def etag_guard(*tables: str) -> Callable[..., Awaitable[str]]:
+    """create a dependency answering 304 when the tables read by a GET did not change
+
+    Args:
+        tables (str): names of the tables the route reads
+
+    Returns:
+        Callable[..., Awaitable[str]]: the dependency, it returns the ETag
+    """
+    async def guard(request: Request,
+                    current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)]) -> str:
+        # the user is part of the tag as some lists exclude the logged in user
+        user_id: Optional[int] = current_user.data.id if current_user.data else None
+
+        # a replica may not have replayed a write yet, do not tag what it serves,
+        # nor without versions shared by the workers, another one may have changed the tables
+        if write_window.any_active() or not consistent():
+            return ""
+
+        etag: str = make_etag(tables, request.url.path, sorted(request.query_params.multi_items()), user_id)
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        request.state.etag = etag
+
+        return etag
+
+    return guard
+
+
+def get_read_session(current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)]) -> Iterator[Session]:
+    """session for the read only handlers, bound to a read replica when there is one
+
+    Args:
+        current_user (Annotated[SingleResponse[TokenData], Depends): current user, whose own writes are read from the primary
+
+    Yields:
+        Session: the read session
+    """
+    user_id: Optional[int] = current_user.data.id if current_user.data else None
+
+    with read_session(user_id) as session:
+        yield session
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, status
+from typing import Any, Optional
+from dto.fast_response import FastResponse
+from db import engine, ping, pool_status, replicas
+from migrations.runner import MigrationRunner
+from utils import readiness
+
+import asyncio
+import os
+import time
+
+
+READY_TIMEOUT: float = float(os.getenv("READY_TIMEOUT", "2"))
+
+
+class HealthRouter(APIRouter):
+    """Probes for the load balancer, without authentication and out of the schema"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.__migrations: Optional[MigrationRunner] = None
+        self.setup_routes()
+
+    def setup_routes(self) -> None:
+        self.add_api_route("/healthz", self.get_health, methods=["GET"], response_class=FastResponse,
+                           include_in_schema=False)
+        self.add_api_route("/readyz", self.get_ready, methods=["GET"], response_class=FastResponse,
+                           include_in_schema=False)
+
+    async def get_health(self) -> FastResponse:
+        """liveness, the process answers requests
+
+        Returns:
+            FastResponse: always ok
+        """
+        return FastResponse({"status": "ok"})
+
+    async def get_ready(self) -> FastResponse:
+        """readiness, the database answers and the worker finished starting
+
+        Returns:
+            FastResponse: 200 when ready, 503 with the reasons otherwise
+        """
+        reasons: list[str] = readiness.reasons()
+
+        if "migrations" in reasons and await asyncio.to_thread(self.__migrations_applied):
+            readiness.mark_ready("migrations")
+            reasons.remove("migrations")
+
+        checks: dict[str, Any] = {}
+        started: float = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(asyncio.to_thread(ping), timeout=READY_TIMEOUT)
+            checks["database"] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 3)}
+        except asyncio.TimeoutError:
+            checks["database"] = {"ok": False, "error": f"no answer within {READY_TIMEOUT}s"}
+            reasons.append("database")
+        except Exception as error:
+            checks["database"] = {"ok": False, "error": type(error).__name__}
+            reasons.append("database")
+
+        checks["pool"] = pool_status()
+
+        if replicas:
+            checks["replicas"] = {"healthy": replicas.healthy(), "total": len(replicas)}
+
+        ready: bool = not reasons
+
+        return FastResponse(
+            {"status": "ready" if ready else "not ready", "reasons": reasons, "checks": checks},
+            status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    def __migrations_applied(self) -> bool:
+        # the deploy applies them from another process, look again until they are in
+        if self.__migrations is None:
+            self.__migrations = MigrationRunner(engine)
+
+        try:
+            return not self.__migrations.pending()
+        except Exception:
+            return False
@@ -1,15 +1,24 @@
-from sqlmodel import Session, select, column, cast, String
-from db import get_session
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Annotated, Sequence, Optional, List
-from dto.response import Response, SingleResponse
+from sqlmodel import Session
+from db import get_session, save, delete
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import Annotated, Sequence, Optional, Any
+from dto.response import Response, SingleResponse, Changes
+from dto.fast_response import FastResponse, fast_response, fast_item
 from entities.auth_entity.token_Entity import TokenData
 from entities.members_entity import Member, MemberOutput, MemberInput, MemberInputData
 from enums.enums import SuccessMessage, ErrorMessage
+from routers.dependencies import etag_guard, get_read_session
+from validators.filters.filter import FilterQuery
+from validators.member_validator import member_filters, member_projection, member_detail_projection, member_feed
+from utils.change_feed import CHANGES_PAGE_MAX, Watermark
+from utils.response_cache import cached
+from utils.single_flight import coalesced
 from routers.auth_route import get_current_active_user
 from utils.user_utils import Utils
 from datetime import datetime
 
+import asyncio
+
 
 class MembersRoute(APIRouter):
     def __init__(self) -> None:
@@ -18,98 +27,61 @@ class MembersRoute(APIRouter):
         self.setup_routes()
 
     def setup_routes(self) -> None:
-        self.add_api_route("/get_members", self.get_members, response_model=Response[MemberOutput], methods=["GET"])
-        self.add_api_route("/get_member_byId/{memberId}", self.get_member_byId, response_model=Response[Member], methods=["GET"])
+        self.add_api_route("/get_members", self.get_members, response_model=Response[MemberOutput], methods=["GET"],
+                           dependencies=[Depends(etag_guard("member"))])
+        self.add_api_route("/get_member_byId/{memberId}", self.get_member_byId, response_model=Response[Member], methods=["GET"],
+                           dependencies=[Depends(etag_guard("member"))])
         self.add_api_route("/add_member", self.add_member, response_model=Response[Member], methods=["POST"])
         self.add_api_route("/update_member/{id}", self.update_member, response_model=Response[MemberOutput],methods=["PUT"])
         self.add_api_route("/delete_member/{id}", self.delete_member, response_model=Response[Member], methods=["DELETE"])
+        self.add_api_route("/changes", self.get_changes, methods=["GET"], response_model=Changes[MemberOutput])
 
+    @cached(tables=("member",))
+    @coalesced()
     async def get_members(self, current_users: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
-                    session: Session = Depends(get_session),
-                    firstname: Optional[str] = None, lastname: Optional[str] = None, middlename: Optional[str] = None,
-                    gender: Optional[str] = None, emailaddress: Optional[str] = None, phonenumber: Optional[str] = None) -> Response[MemberOutput]:
+                    session: Session = Depends(get_read_session),
+                    filters: FilterQuery = Depends(member_filters.dependency)) -> FastResponse:
         """get all members
 
+        Filters and sort are read from the query string as declared in validators/member_validator.py,
+        e.g. ?lastname=Men&title_id__in=1,2&dob__gte=1990-01-01&sort=-createdon,
+        ?fields=firstname,lastname only reads and returns these fields and the id
+
         Args:
             current_users (Annotated[SingleResponse[TokenData], Depends): _current_user_
-            firstname (Optional[str], optional): firstname. Defaults to None.
-            lastname (Optional[str], optional): lastname. Defaults to None.
-            middlename (Optional[str], optional): middlename. Defaults to None.
-            gender (Optional[str], optional): gender(Male/Female). Defaults to None.
-            emailaddress (Optional[str], optional): emailAddress. Defaults to None.
-            phonenumber (Optional[str], optional): phonenumber. Defaults to None.
+            session (Session, optional): session. Defaults to Depends(get_read_session).
+            filters (FilterQuery, optional): parsed filters and sort. Defaults to Depends(member_filters.dependency).
 
         Returns:
-            Response[MemberOutput]: Response of the Member Output class
+            FastResponse: Response of the Member Output class encoded with orjson
         """
-        response: Response[MemberOutput]
-
-        query = select(Member)
-
-        if firstname:
-            query = query.where(column("firstname").like(f'%{firstname}%'))
-
-        if lastname:
-            query = query.where(column("lastname").like(f"%{lastname}%"))
-
-        if middlename:
-            query = query.where(column("middlename").like(f"%{middlename}%"))
-
-        if gender:
-            query = query.where(column("gender").like(f"%{gender}%"))
-
-        if emailaddress:
-            query = query.where(
-                column("emailaddress").like(f"%{emailaddress}%"))
-            
-        if phonenumber:
-            query = query.where(column("phonenumber").like(f"%{phonenumber}%"))
-        
-        results_list: Sequence[Member] = session.exec(query.order_by(cast(Member.createdon, String))).all()
+        # off the event loop, identical requests arriving meanwhile join this flight
+        results_list: Sequence[Any] = await asyncio.to_thread(
+            lambda: session.exec(member_filters.statement(filters), params=filters.params).all())
         
-        if results_list:
-            results: List[MemberOutput] = [ MemberOutput(
-                id = member.id,
-                firstname = member.firstname,
-                lastname = member.lastname,
-                middlename= member.middlename,
-                gender = member.gender,
-                phonenumber = member.phonenumber,
-                emailaddress = member.emailaddress,
-                dob = member.dob,
-                profile_picture = member.profile_picture,
-                house_address = member.house_address,
-                title_id = member.title_id
-                ) for member in results_list]
-            
-            response = Response(
-                success = True,
-                message = SuccessMessage.OperationSuccessful.value,
-                data = results
-            )
-        else:
-            response = Response(
-                success = False,
-                message = ErrorMessage.NoEntry.value,
-                data = None
-            )
-            
-        return response
+        return fast_response(results_list, columns=filters.fields, response_model=member_projection.response_model(filters.fields))
     
     async def get_member_byId(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
-                        memberId: int, session: Session = Depends(get_session)) -> Response[Member]:
+                        memberId: int, session: Session = Depends(get_read_session),
+                        fields: Optional[tuple[str, ...]] = Depends(member_detail_projection.requested)) -> Response[Member] | FastResponse:
         """get member by id
 
         Args:
             current_user (Annotated[SingleResponse[TokenData], Depends): current user
             memberId (int): member ID
-            session (Session, optional): session. Defaults to Depends(get_session).
+            session (Session, optional): session. Defaults to Depends(get_read_session).
+            fields (Optional[tuple[str, ...]], optional): ?fields= to read only some fields. Defaults to Depends(member_detail_projection.requested).
 
         Returns:
-            Response[Member]: Response of member
+            Response[Member] | FastResponse: Response of member, encoded with orjson when fields are given
         """  
         response: Response[Member]
         
+        if fields:
+            row: Optional[Any] = session.exec(member_detail_projection.select(fields).where(Member.id == memberId)).first()
+            
+            return fast_item(row, columns=fields, response_model=member_detail_projection.response_model(fields))
+        
         result: Optional[Member] = session.get(Member, memberId)   
         
         if result:
@@ -127,6 +99,25 @@ class MembersRoute(APIRouter):
               
         return response
     
+    async def get_changes(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
+                          session: Session = Depends(get_session),
+                          since: Watermark = Depends(member_feed.since),
+                          fields: Optional[tuple[str, ...]] = Depends(member_projection.requested),
+                          limit: int = Query(default=100, ge=1, le=CHANGES_PAGE_MAX)) -> FastResponse:
+        """get the members inserted, updated or deleted after a watermark, oldest first
+
+        Args:
+            current_user (Annotated[SingleResponse[TokenData], Depends): current user
+            session (Session, optional): session on the primary, a replica may be behind the watermark. Defaults to Depends(get_session).
+            since (Watermark, optional): ?since= watermark of the previous page. Defaults to the start of the feed.
+            fields (Optional[tuple[str, ...]], optional): ?fields= of the upserts. Defaults to all of them.
+            limit (int, optional): changes per page. Defaults to 100.
+
+        Returns:
+            FastResponse: Changes of MemberOutput with the watermark of the next page, encoded with orjson
+        """
+        return FastResponse(member_feed.read(session, since, fields or member_projection.default, limit))
+
     async def add_member(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)], 
                          member: MemberInput, session: Session = Depends(get_session)) -> Response[Member]:
         """add a member
@@ -169,9 +160,7 @@ class MembersRoute(APIRouter):
         
         if new_member:
 
-            session.add(new_member)
-            session.commit()
-            session.refresh(new_member)
+            new_member = await save(new_member)
         
             response = Response(
                 success = True,
@@ -246,8 +235,7 @@ class MembersRoute(APIRouter):
                 )
             old_member.modifiedon = datetime.utcnow()
             
-            session.commit()
-            session.refresh(old_member)
+            old_member = await save(old_member)
             
             result: MemberOutput = MemberOutput(
                 id = old_member.id,
@@ -295,8 +283,7 @@ class MembersRoute(APIRouter):
         member: Optional[Member] = session.get(Member, id)
         
         if member:
-            session.delete(member)
-            session.commit()
+            await delete(member)
             
             response = Response(
                 success = True,
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from utils.metrics import registry
+
+
+class MetricsRouter(APIRouter):
+    def __init__(self) -> None:
+        super().__init__()
+        self.setup_routes()
+
+    def setup_routes(self) -> None:
+        self.add_api_route("/metrics", self.get_metrics, methods=["GET"], response_class=PlainTextResponse,
+                           include_in_schema=False)
+
+    async def get_metrics(self) -> PlainTextResponse:
+        """expose the metrics in the Prometheus text format
+
+        Returns:
+            PlainTextResponse: the exposition text
+        """
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Annotated, Any, Optional, Sequence
+from datetime import date, datetime, time
+from sqlalchemy import extract, func, select
+from sqlmodel import Session
+from dto.response import Response, SingleResponse
+from entities.attendance_entity import Attendance, AttendanceCount
+from entities.auth_entity.token_Entity import TokenData
+from entities.service_entity import Service
+from enums.enums import SuccessMessage, ErrorMessage
+from routers.auth_route import get_current_active_user
+from routers.dependencies import get_read_session
+from utils.archive import CountKey, attendance_archive
+from utils.partitions import created_between
+
+import asyncio
+
+
+class ReportRouter(APIRouter):
+    def __init__(self) -> None:
+        super().__init__(prefix="/api/reports")
+        self.setup_routes()
+
+    def setup_routes(self) -> None:
+        self.add_api_route("/attendance", self.get_attendance, methods=["GET"], response_model=Response[AttendanceCount])
+
+    async def get_attendance(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
+                             session: Session = Depends(get_read_session),
+                             start: Optional[date] = Query(default=None, description="created on or after"),
+                             end: Optional[date] = Query(default=None, description="created before"),
+                             servicetypeid: Optional[int] = Query(default=None)) -> Response[AttendanceCount]:
+        """count the attendance per year, service type and attendance status
+
+        The live table and the cold archive are added up, see utils/archive.py.
+
+        Args:
+            current_user (Annotated[SingleResponse[TokenData], Depends): current user
+            session (Session, optional): session. Defaults to Depends(get_read_session).
+            start (Optional[date], optional): first day. Defaults to None.
+            end (Optional[date], optional): day after the last. Defaults to None.
+            servicetypeid (Optional[int], optional): only this service type. Defaults to None.
+
+        Returns:
+            Response[AttendanceCount]: the counts, ordered by year, service type and status
+        """
+        since: Optional[datetime] = datetime.combine(start, time.min) if start else None
+        until: Optional[datetime] = datetime.combine(end, time.min) if end else None
+
+        # the archive is read off the event loop while the table is counted
+        archived: asyncio.Future = asyncio.ensure_future(asyncio.to_thread(attendance_archive.counts, since, until, servicetypeid))
+
+        year: Any = extract("year", Attendance.createdon)
+        statement = (
+            select(year, Service.servicetypeId, Attendance.attendancestatusid, func.count(Attendance.id))
+            .join(Service, Service.id == Attendance.serviceid)  # type: ignore
+            .group_by(year, Service.servicetypeId, Attendance.attendancestatusid)
+            # like the archive, the attendance of a deleted service is still history
+            .execution_options(include_deleted=True)
+        )
+
+        # on Postgres only the months in range are read
+        statement = statement.where(*created_between(Attendance.createdon, since, until))
+
+        if servicetypeid is not None:
+            statement = statement.where(Service.servicetypeId == servicetypeid)
+
+        rows: Sequence[Any] = session.exec(statement).all()  # type: ignore
+        counts: dict[CountKey, int] = dict(await archived)
+
+        for row_year, row_servicetypeid, status, count in rows:
+            key: CountKey = (int(row_year), row_servicetypeid, status)
+            counts[key] = counts.get(key, 0) + count
+
+        if not counts:
+            return Response(success=False, message=ErrorMessage.NoEntry.value, data=None)
+
+        return Response(
+            success=True,
+            message=SuccessMessage.OperationSuccessful.value,
+            data=[AttendanceCount(year=key[0], servicetypeid=key[1], attendancestatusid=key[2], count=count)
+                  for key, count in sorted(counts.items())]
+        )
@@ -1,16 +1,24 @@
-from fastapi import APIRouter, Depends
-from typing import List, Tuple, Optional, Sequence, Annotated
-from sqlmodel import Session, select, cast, String, column, join
-from db import get_session
-from dto.response import Response, SingleResponse
-from datetime import date, time, datetime
+from fastapi import APIRouter, Depends, Query
+from typing import Tuple, Optional, Sequence, Annotated, Any
+from sqlmodel import Session, select, join
+from db import get_session, save, delete
+from dto.response import Response, SingleResponse, Changes
+from dto.fast_response import FastResponse, fast_response, fast_item
+from datetime import datetime
 from entities.service_entity import Service, ServiceAndServiceTypeAndUserOutput, ServiceInput, ServiceOutput
 from entities.service_type_enity import ServiceType
 from entities.user_entity import User
 from entities.auth_entity.token_Entity import TokenData
 from enums.enums import SuccessMessage, ErrorMessage
+from routers.dependencies import etag_guard, get_read_session
+from validators.filters.filter import FilterQuery
+from validators.service_validator import service_filters, service_projection, service_from, service_feed
+from utils.change_feed import CHANGES_PAGE_MAX, Watermark
+from utils.response_cache import cached
+from utils.single_flight import coalesced
 from routers.auth_route import get_current_active_user
 
+import asyncio
 
 
 class ServiceRoute(APIRouter):
@@ -19,98 +27,67 @@ class ServiceRoute(APIRouter):
         self.setup_routes()
         
     def setup_routes(self) -> None:
-        self.add_api_route(path="/getservices", endpoint=self.get_services, methods=["GET"], response_model=Response[ServiceAndServiceTypeAndUserOutput])
-        self.add_api_route(path="/getservicebyid/{id}", endpoint=self.get_service_byId, methods=["GET"], response_model=Response[ServiceAndServiceTypeAndUserOutput])
+        self.add_api_route(path="/getservices", endpoint=self.get_services, methods=["GET"], response_model=Response[ServiceAndServiceTypeAndUserOutput],
+                           dependencies=[Depends(etag_guard("service", "servicetype", "user"))])
+        self.add_api_route(path="/getservicebyid/{id}", endpoint=self.get_service_byId, methods=["GET"], response_model=Response[ServiceAndServiceTypeAndUserOutput],
+                           dependencies=[Depends(etag_guard("service", "servicetype", "user"))])
         self.add_api_route(path="/addservice", endpoint=self.add_service, methods=["POST"], response_model=Response[ServiceOutput])
         self.add_api_route(path="/updateservice/{id}", endpoint=self.update_service,methods=["PUT"], response_model=Response[ServiceOutput])
         self.add_api_route(path="/deleteservice/{id}", endpoint=self.delete_service, methods=["DELETE"], response_model=Response[Service])
+        self.add_api_route("/changes", self.get_changes, methods=["GET"], response_model=Changes[ServiceAndServiceTypeAndUserOutput])
         
+    @cached(tables=("service", "servicetype", "user"))
+    @coalesced()
     async def get_services(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
-                           servicetypeid: Optional[int] = None, location: Optional[str] = None, date_event: Optional[date] = None,
-                           time_start: Optional[time] = None, session: Session = Depends(get_session)) -> Response[ServiceAndServiceTypeAndUserOutput]:
-        """_summary_
+                           session: Session = Depends(get_read_session),
+                           filters: FilterQuery = Depends(service_filters.dependency)) -> FastResponse:
+        """get all services with their service type and user
+
+        Filters and sort are read from the query string as declared in validators/service_validator.py,
+        e.g. ?servicetypeid=1&date_event__gte=2024-01-01&location=Makarios&sort=-date_event,
+        ?fields=servicename,date_event only reads and returns these fields and the id
 
         Args:
-            serviceid (Optional[id], optional): servicetypeid. Defaults to None.
-            location (Optional[str], optional): location of the service. Defaults to None.
-            date_event (Optional[date], optional): date of the service. Defaults to None.
-            time_start (Optional[time], optional): time of the service. Defaults to None.
-            session (Session, optional): _description_. Defaults to Depends(get_session).
+            session (Session, optional): _description_. Defaults to Depends(get_read_session).
+            filters (FilterQuery, optional): parsed filters and sort. Defaults to Depends(service_filters.dependency).
 
         Returns:
-            Response[ServiceAndServiceTypeAndUserOutput]: _description_
+            FastResponse: services with their service type and user encoded with orjson
         """        
-        
-        response: Response[ServiceAndServiceTypeAndUserOutput] 
-        
-
-        # Assuming Service, ServiceType, and User are table objects
-        query = (
-                select(Service, ServiceType, User).select_from(join(Service, ServiceType, Service.servicetypeId == ServiceType.id).join(User, User.id == Service.createdby) # type: ignore # this conditonal clause cannot be defined
-                )
-            )
-        
-        # filter the query
-        if servicetypeid:
-            query = query.where(ServiceType.id == servicetypeid) 
-        
-        if location:
-            query = query.where(column("location").like(f"%{location}%"))
-        
-        if date_event:
-            query = query.where(Service.date_event == date_event)
-        
-        if time_start:
-            query = query.where(Service.time_start == time_start)
-        
-        # get the result from the query and order by 
-        result_db: Sequence[Tuple[Service, ServiceType, User]] = session.exec(query.order_by(cast(Service.createdon, String))).all()
-        
-        if result_db:
-            
-            outputlist: List[ServiceAndServiceTypeAndUserOutput] = [ServiceAndServiceTypeAndUserOutput(
-                id=service.id,
-                servicename=servicetype.name,
-                date_event=service.date_event,
-                time_start=service.time_start,
-                location=service.location,
-                createdby=user.emailaddress,
-                modifiedby= user.emailaddress if service.modifiedon is not None else service.modifiedon,
-                createdon=service.createdon,
-                modifiedon= service.modifiedon
-            ) for service, servicetype, user in result_db ]
+        # off the event loop, identical requests arriving meanwhile join this flight
+        result_db: Sequence[Tuple[Any, ...]] = await asyncio.to_thread(
+            lambda: session.exec(service_filters.statement(filters), params=filters.params).all())
 
-            response = Response(
-                success = True,
-                message = SuccessMessage.OperationSuccessful.value,
-                data = outputlist
-            )
-            
-        else:
-            return Response(success = False, message = ErrorMessage.NoEntry.value, data = None)
-            
-        return response
+        return fast_response(result_db, columns=filters.fields, response_model=service_projection.response_model(filters.fields))
     
     async def get_service_byId(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
                                id: int, 
-                               session: Session = Depends(get_session)) -> Response[ServiceAndServiceTypeAndUserOutput]:
+                               session: Session = Depends(get_read_session),
+                               fields: Optional[tuple[str, ...]] = Depends(service_projection.requested)
+                               ) -> Response[ServiceAndServiceTypeAndUserOutput] | FastResponse:
         """get service by id
 
         Args:
             id (int): id of the service
-            session (Session, optional): dependency. Defaults to Depends(get_session).
+            session (Session, optional): dependency. Defaults to Depends(get_read_session).
+            fields (Optional[tuple[str, ...]], optional): ?fields= to read only some fields. Defaults to Depends(service_projection.requested).
 
         Returns:
-            Response[ServiceAndServiceTypeAndUserOutput]: return the service.
+            Response[ServiceAndServiceTypeAndUserOutput] | FastResponse: return the service, encoded with orjson when fields are given
         
         """        
+        if fields:
+            row: Optional[Any] = session.exec(service_projection.select(fields).select_from(service_from()).where(Service.id == id)).first()
+
+            return fast_item(row, columns=fields, response_model=service_projection.response_model(fields))
+
         
         serviceUser: ServiceAndServiceTypeAndUserOutput 
         
         response: Response[ServiceAndServiceTypeAndUserOutput] 
         
         result: Optional[Tuple[Service, ServiceType, User]] = session.exec(select(Service, ServiceType, User).select_from(join(Service, ServiceType, Service.servicetypeId == ServiceType.id).join(User, User.id == Service.createdby) # type: ignore # this conditonal clause cannot be defined
-                )).first()
+                ).where(Service.id == id)).first()
         
         if result:
             
@@ -142,6 +119,25 @@ class ServiceRoute(APIRouter):
         
         return response
     
+    async def get_changes(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
+                          session: Session = Depends(get_session),
+                          since: Watermark = Depends(service_feed.since),
+                          fields: Optional[tuple[str, ...]] = Depends(service_projection.requested),
+                          limit: int = Query(default=100, ge=1, le=CHANGES_PAGE_MAX)) -> FastResponse:
+        """get the services inserted, updated or deleted after a watermark, oldest first
+
+        Args:
+            current_user (Annotated[SingleResponse[TokenData], Depends): current user
+            session (Session, optional): session on the primary, a replica may be behind the watermark. Defaults to Depends(get_session).
+            since (Watermark, optional): ?since= watermark of the previous page. Defaults to the start of the feed.
+            fields (Optional[tuple[str, ...]], optional): ?fields= of the upserts. Defaults to all of them.
+            limit (int, optional): changes per page. Defaults to 100.
+
+        Returns:
+            FastResponse: Changes of ServiceAndServiceTypeAndUserOutput with the watermark of the next page, encoded with orjson
+        """
+        return FastResponse(service_feed.read(session, since, fields or service_projection.default, limit))
+
     async def add_service(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
                           service: ServiceInput, 
                           session: Session = Depends(get_session)) -> Response[Service]:
@@ -165,9 +161,7 @@ class ServiceRoute(APIRouter):
             if current_user.success and current_user.data and current_user.data.id:
                 added_service.createdby = current_user.data.id
                 
-            session.add(added_service)
-            session.commit()
-            session.refresh(added_service)
+            added_service = await save(added_service)
             
             response = Response(
                 success = True,
@@ -220,9 +214,7 @@ class ServiceRoute(APIRouter):
                 old_service.modifiedby = current_user.data.id
                 old_service.modifiedon = datetime.utcnow()
                 
-                session.add(old_service)
-                session.commit()
-                session.refresh(old_service)
+                old_service = await save(old_service)
                 
                 response = Response(
                     success = True,
@@ -255,8 +247,7 @@ class ServiceRoute(APIRouter):
         del_item: Optional[Service] = session.get(Service, id)
         
         if del_item:
-            session.delete(del_item)
-            session.commit()
+            await delete(del_item)
             
             response = Response(
                 success = True,
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, Depends
-from typing import Sequence, Tuple, Annotated
-from sqlmodel import Session, select, cast, String, column
-from db import get_session
+from fastapi import APIRouter, Depends, Query
+from typing import Sequence, Tuple, Annotated, Any
+from sqlmodel import Session, select
+from db import get_session, save, delete
 from typing import Optional
 from enums.enums import SuccessMessage, ErrorMessage
-from dto.response import Response, SingleResponse
+from dto.response import Response, SingleResponse, Changes
+from dto.fast_response import FastResponse, fast_response, fast_item
 from entities.service_type_enity import ServiceType, ServiceTypeInput, ServiceTypeUser
 from entities.user_entity import User
 from entities.auth_entity.token_Entity import TokenData
+from routers.dependencies import etag_guard, get_read_session
+from validators.filters.filter import FilterQuery
+from validators.lookup_validator import servicetype_filters, servicetype_projection, servicetype_feed, servicetype_from
+from utils.change_feed import CHANGES_PAGE_MAX, Watermark
+from utils.response_cache import cached
+from utils.single_flight import coalesced
 from routers.auth_route import get_current_active_user
 from datetime import datetime
 
+import asyncio
+
 
 class ServiceTypeRouter(APIRouter):
     def __init__(self):
@@ -19,77 +28,59 @@ class ServiceTypeRouter(APIRouter):
 
     def setup_routes(self) -> None:
         self.add_api_route("/getservicetypes", endpoint=self.get_serivcetypes,
-                           methods=["GET"])
+                           methods=["GET"], response_model=Response[ServiceTypeUser], dependencies=[Depends(etag_guard("servicetype", "user"))])
         self.add_api_route("/getservicebyid/{id}", endpoint=self.get_servicetypeby_id, methods=[
-                           "GET"], response_model=Response[ServiceTypeUser])
+                           "GET"], response_model=Response[ServiceTypeUser],
+                           dependencies=[Depends(etag_guard("servicetype", "user"))])
         self.add_api_route("/addservicetype", endpoint=self.add_servicetype,
                            methods=["POST"], response_model=Response[ServiceType])
         self.add_api_route("/updateservicetype", methods=[
                            "PUT"], endpoint=self.change_servicetype, response_model=Response[ServiceType])
         self.add_api_route("/deleteservicetype", methods=[
                            "DELETE"], endpoint=self.remove_servicetype, response_model=Response[ServiceType])
+        self.add_api_route("/changes", self.get_changes, methods=["GET"], response_model=Changes[ServiceTypeUser])
 
+    @cached(tables=("servicetype", "user"))
+    @coalesced()
     async def get_serivcetypes(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
-                               name: Optional[str] = None, 
-                               session: Session = Depends(get_session)) -> Response[ServiceTypeUser]:
+                               session: Session = Depends(get_read_session),
+                               filters: FilterQuery = Depends(servicetype_filters.dependency)) -> FastResponse:
         """get all services
 
         Args:
-            name (Optional[str], optional): filter by name Defaults to None.
-            session (Session, optional): dependency. Defaults to Depends(get_session).
+            session (Session, optional): dependency. Defaults to Depends(get_read_session).
+            filters (FilterQuery, optional): ?name= filters by the start of the name, ?fields= picks the fields. Defaults to Depends(servicetype_filters.dependency).
 
         Returns:
-            Response[ServiceTypeUser]: get all service type with it's corresponding user
+            FastResponse: get all service type with it's corresponding user encoded with orjson
         """
-        
-        response: Response[ServiceTypeUser] 
-
-        query = select(ServiceType, User).join(User)
-
-        if name:
-            query = query.where(column("name").like(f"%{name}%"))
-
-        result_db: Sequence[Tuple[ServiceType, User]] = session.exec(query.order_by(cast(ServiceType.createdon, String))).all()
-        
-        if result_db:
+        # off the event loop, identical requests arriving meanwhile join this flight
+        result_db: Sequence[Any] = await asyncio.to_thread(
+            lambda: session.exec(servicetype_filters.statement(filters), params=filters.params).all())
 
-            servicetypeuserslist: list[ServiceTypeUser] = [ServiceTypeUser(
-                id=servicetype.id,
-                name=servicetype.name,
-                createdby=user.emailaddress,
-                modifiedby=user.emailaddress if servicetype.modifiedon is not None else servicetype.modifiedon,
-                createdon=servicetype.createdon,
-                modifiedon=servicetype.modifiedon
-            ) for servicetype, user in result_db]
-
-            response = Response(
-                success = True,
-                message = SuccessMessage.OperationSuccessful.value,
-                data = servicetypeuserslist
-            )
-            
-
-        else:
-            response = Response(
-                success=False, 
-                message=ErrorMessage.NoEntry.value, 
-                data=None
-            )
-
-        return response
+        return fast_response(result_db, columns=filters.fields, response_model=servicetype_projection.response_model(filters.fields))
 
     async def get_servicetypeby_id(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
                                    id: int, 
-                                   session: Session = Depends(get_session)) -> Response[ServiceTypeUser]:
+                                   session: Session = Depends(get_read_session),
+                                   fields: Optional[tuple[str, ...]] = Depends(servicetype_projection.requested)
+                                   ) -> Response[ServiceTypeUser] | FastResponse:
         """get service type by id
 
         Args:
             id (int): id of the of the service type
-            session (Session, optional): dependency. Defaults to Depends(get_session).
+            session (Session, optional): dependency. Defaults to Depends(get_read_session).
+            fields (Optional[tuple[str, ...]], optional): ?fields= to read only some fields. Defaults to Depends(servicetype_projection.requested).
 
         Returns:
-            Response[ServiceTypeUser]: Return a respone of ServiceTypeUser
+            Response[ServiceTypeUser] | FastResponse: Return a respone of ServiceTypeUser, encoded with orjson when fields are given
         """
+        if fields:
+            row: Optional[Any] = session.exec(servicetype_projection.select(fields).select_from(servicetype_from())
+                                              .where(ServiceType.id == id)).first()
+
+            return fast_item(row, columns=fields, response_model=servicetype_projection.response_model(fields))
+
         servicetypeUser: ServiceTypeUser
         response: Response[ServiceTypeUser]
 
@@ -124,6 +115,25 @@ class ServiceTypeRouter(APIRouter):
 
         return response
 
+    async def get_changes(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
+                          session: Session = Depends(get_session),
+                          since: Watermark = Depends(servicetype_feed.since),
+                          fields: Optional[tuple[str, ...]] = Depends(servicetype_projection.requested),
+                          limit: int = Query(default=100, ge=1, le=CHANGES_PAGE_MAX)) -> FastResponse:
+        """get the service types inserted, updated or deleted after a watermark, oldest first
+
+        Args:
+            current_user (Annotated[SingleResponse[TokenData], Depends): current user
+            session (Session, optional): session on the primary, a replica may be behind the watermark. Defaults to Depends(get_session).
+            since (Watermark, optional): ?since= watermark of the previous page. Defaults to the start of the feed.
+            fields (Optional[tuple[str, ...]], optional): ?fields= of the upserts. Defaults to all of them.
+            limit (int, optional): changes per page. Defaults to 100.
+
+        Returns:
+            FastResponse: Changes of ServiceTypeUser with the watermark of the next page, encoded with orjson
+        """
+        return FastResponse(servicetype_feed.read(session, since, fields or servicetype_projection.default, limit))
+
     async def add_servicetype(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
                               serviceData: ServiceTypeInput, 
                               session: Session = Depends(get_session)) -> Response[ServiceType]:
@@ -161,9 +171,7 @@ class ServiceTypeRouter(APIRouter):
             if current_user.success and current_user.data and current_user.data.id:
                 servicetype.createdby = current_user.data.id
                 
-            session.add(servicetype)
-            session.commit()
-            session.refresh(servicetype)
+            servicetype = await save(servicetype)
 
             response = Response(
                 success = True,
@@ -215,9 +223,7 @@ class ServiceTypeRouter(APIRouter):
                 old_data.modifiedby = current_user.data.id
                 old_data.modifiedon = datetime.utcnow()
 
-                sesion.add(old_data)
-                sesion.commit()
-                sesion.refresh(old_data)
+                old_data = await save(old_data)
 
                 response = Response(
                     success = True,
@@ -247,8 +253,7 @@ class ServiceTypeRouter(APIRouter):
         del_item: Optional[ServiceType] = session.get(ServiceType, id)
 
         if del_item:
-            session.delete(del_item)
-            session.commit()
+            await delete(del_item)
 
             response = Response(
                 success = True,
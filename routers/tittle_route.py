@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from entities.title_entity import Title, TitleInput, TitleOutput
 from entities.auth_entity.token_Entity import TokenData
-from db import get_session
-from sqlmodel import Session, select, column
-from dto.response import Response, SingleResponse
-from typing import Optional, Sequence, List, Annotated
+from db import get_session, save, delete
+from sqlmodel import Session
+from dto.response import Response, SingleResponse, Changes
+from dto.fast_response import FastResponse, fast_response, fast_item
+from typing import Sequence, Annotated, Any, Optional
 from enums.enums import SuccessMessage, ErrorMessage
+from routers.dependencies import etag_guard, get_read_session
+from validators.filters.filter import FilterQuery
+from validators.lookup_validator import title_filters, title_projection, title_detail_projection, title_feed
+from utils.change_feed import CHANGES_PAGE_MAX, Watermark
+from utils.response_cache import cached
+from utils.single_flight import coalesced
 from routers.auth_route import get_current_active_user
 from datetime import datetime
 
+import asyncio
+
 
 class TitleRouter(APIRouter):
     def __init__(self):
@@ -17,61 +26,60 @@ class TitleRouter(APIRouter):
 
     def setup_routes(self):
         self.add_api_route(path="/getAll", endpoint=self.get_titles,
-                           methods=["GET"], response_model=Response[TitleOutput])
+                           methods=["GET"], response_model=Response[TitleOutput],
+                           dependencies=[Depends(etag_guard("title"))])
         self.add_api_route(path="/getbyId/{title_id}", endpoint=self.get_title_id,
-                           methods=["GET"], response_model=Response[Title])
+                           methods=["GET"], response_model=Response[Title],
+                           dependencies=[Depends(etag_guard("title"))])
         self.add_api_route(path="/addtitle", endpoint=self.add_title,
                            methods=["POST"], response_model=Response[Title])
         self.add_api_route(path="/updatetitle/{id}", methods=[
                            "PUT"], endpoint=self.change_title, response_model=Response[TitleOutput])
         self.add_api_route(path="/deletetitle/{id}", methods=[
                            "DELETE"], endpoint=self.remove_title, response_model=Response[TitleOutput])
+        self.add_api_route("/changes", self.get_changes, methods=["GET"], response_model=Changes[TitleOutput])
 
+    @cached(tables=("title",))
+    @coalesced()
     async def get_titles(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
-                         name: Optional[str] = None, 
-                         session: Session = Depends(get_session)) -> Response[Title]:
+                         session: Session = Depends(get_read_session),
+                         filters: FilterQuery = Depends(title_filters.dependency)) -> FastResponse:
         """Get All titles in the church
 
         Args:
-            name (Optional[str], optional): if name is specified. Defaults to None.
-            session (Session, optional): dependency. Defaults to Depends(get_session).
+            session (Session, optional): dependency. Defaults to Depends(get_read_session).
+            filters (FilterQuery, optional): ?name= filters by the start of the title, ?fields= picks the fields. Defaults to Depends(title_filters.dependency).
 
         Returns:
-            Reponse[Title]: Return a response of the Title Model
+            FastResponse: Return a response of the Title Output Model encoded with orjson
         """
-        query = select(Title)
-        response: Response[Title]
-
-        if name:
-            query = query.where(column("title_name").like(f"%{name}%"))
-            
-        results: Sequence[Title] = session.exec(query).all()
-
-        if results:
-            result: List[Title] = list(results)
-            
-            response = Response(
-                success=True,
-                message=SuccessMessage.OperationSuccessful.value,
-                data=result
-            )
-        else:
-            return Response(success=False, message=ErrorMessage.NoTitleFound.value, data=None)
+        # off the event loop, identical requests arriving meanwhile join this flight
+        results: Sequence[Any] = await asyncio.to_thread(
+            lambda: session.exec(title_filters.statement(filters), params=filters.params).all())
 
-        return response
+        return fast_response(results, columns=filters.fields, response_model=title_projection.response_model(filters.fields),
+                             empty_message=ErrorMessage.NoTitleFound.value)
 
     async def get_title_id(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
                            title_id: int, 
-                           session: Session = Depends(get_session)) -> Response[Title]:
+                           session: Session = Depends(get_read_session),
+                           fields: Optional[tuple[str, ...]] = Depends(title_detail_projection.requested)) -> Response[Title] | FastResponse:
         """get title by ID
 
         Args:
             title_id (int): Title ID
-            session (Session, optional): Dependency. Defaults to Depends(get_session).
+            session (Session, optional): Dependency. Defaults to Depends(get_read_session).
+            fields (Optional[tuple[str, ...]], optional): ?fields= to read only some fields. Defaults to Depends(title_detail_projection.requested).
 
         Returns:
-            Response[TitleOutput]: Return a reponse of Title
+            Response[TitleOutput] | FastResponse: Return a reponse of Title, encoded with orjson when fields are given
         """
+        if fields:
+            row: Optional[Any] = session.exec(title_detail_projection.select(fields).where(Title.id == title_id)).first()
+
+            return fast_item(row, columns=fields, response_model=title_detail_projection.response_model(fields),
+                             empty_message=ErrorMessage.TitleNotFound.value)
+
         title = session.get(Title, title_id)
 
         response = None
@@ -91,6 +99,25 @@ class TitleRouter(APIRouter):
             )
         return response
 
+    async def get_changes(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
+                          session: Session = Depends(get_session),
+                          since: Watermark = Depends(title_feed.since),
+                          fields: Optional[tuple[str, ...]] = Depends(title_projection.requested),
+                          limit: int = Query(default=100, ge=1, le=CHANGES_PAGE_MAX)) -> FastResponse:
+        """get the titles inserted, updated or deleted after a watermark, oldest first
+
+        Args:
+            current_user (Annotated[SingleResponse[TokenData], Depends): current user
+            session (Session, optional): session on the primary, a replica may be behind the watermark. Defaults to Depends(get_session).
+            since (Watermark, optional): ?since= watermark of the previous page. Defaults to the start of the feed.
+            fields (Optional[tuple[str, ...]], optional): ?fields= of the upserts. Defaults to all of them.
+            limit (int, optional): changes per page. Defaults to 100.
+
+        Returns:
+            FastResponse: Changes of TitleOutput with the watermark of the next page, encoded with orjson
+        """
+        return FastResponse(title_feed.read(session, since, fields or title_projection.default, limit))
+
     async def add_title(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
                         car: TitleInput, 
                         session: Session = Depends(get_session)) -> Response[Title]:
@@ -106,9 +133,7 @@ class TitleRouter(APIRouter):
         response = None
 
         new_title = Title.from_orm(car)
-        session.add(new_title)
-        session.commit()
-        session.refresh(new_title)
+        new_title = await save(new_title)
         if new_title:
             response = Response(
                 success=True,
@@ -140,8 +165,7 @@ class TitleRouter(APIRouter):
         if old_title:
             old_title.title_name = new_title.title_name
             old_title.modifiedon = datetime.utcnow()
-            session.commit()
-            session.refresh(old_title)
+            old_title = await save(old_title)
 
             response = Response(
                 success=True,
@@ -174,8 +198,7 @@ class TitleRouter(APIRouter):
         title_del = session.get(Title, id)
 
         if title_del:
-            session.delete(title_del)
-            session.commit()
+            await delete(title_del)
 
             response = Response(
                 success=True,
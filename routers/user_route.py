@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends
-from sqlmodel import Session, select, cast, String, column
-from db import get_session
+from sqlmodel import Session, select
+from routers.dependencies import get_read_session
+from validators.filters.filter import FilterQuery
+from validators.user_validator import user_filters, user_projection
+from db import get_session, save, delete
 from entities.user_entity import User, UserInput, UserOutput, UserFilter
 from dto.response import Response, SingleResponse
+from dto.fast_response import FastResponse, fast_response
 from datetime import datetime
 from enums.enums import SuccessMessage, ErrorMessage
 from utils.user_utils import Utils
-from typing import Optional, Sequence
+from typing import Optional, Sequence, Any
 from exceptions.env_exceptions import EnvironmentNotFound
 from routers.auth_route import get_current_active_user
 from entities.auth_entity.token_Entity import TokenData
@@ -39,70 +43,27 @@ class UserRouter(APIRouter):
                            response_model=Response[UserOutput])
 
     async def get_users(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
-                        firstname: Optional[str] = None, middlename: Optional[str] = None,
-                        lastname: Optional[str] = None, emailaddress: Optional[str] = None,
-                        phoneNumber: Optional[str] = None, session: Session = Depends(get_session)) -> Response[UserOutput]:
+                        session: Session = Depends(get_read_session),
+                        filters: FilterQuery = Depends(user_filters.dependency)) -> FastResponse:
         """Get all Users
 
+        Filters and sort are read from the query string as declared in validators/user_validator.py,
+        e.g. ?lastname=Asa&disabled=false&sort=lastname, ?fields=firstname,emailaddress returns only these and the id
+
         Args:
-            user (UserFilter): user filter to get what is required
-            session (Session, optional): Dependency. Defaults to Depends(get_session).
+            session (Session, optional): Dependency. Defaults to Depends(get_read_session).
+            filters (FilterQuery, optional): parsed filters and sort. Defaults to Depends(user_filters.dependency).
 
         Returns:
-            Response[UserOutput]: Out a list of Users
+            FastResponse: Out a list of Users encoded with orjson
         """
-        response: Response[UserOutput]
-
-        query = select(User)
-
-        if firstname:
-            query = query.where(column("firstname").like(f"%{firstname}%"))
-        if middlename:
-            query = query.where(column("middlename").like(f"%{middlename}%"))
-        if lastname:
-            query = query.where(column("lastname").like(f"%{lastname}%"))
-        if emailaddress:
-            query = query.where(User.emailaddress == emailaddress)
-        if phoneNumber:
-            query = query.where(User.phoneNumber == phoneNumber)
-        
         # get all user except the one logged in
-        if current_user.success and current_user.data:
-            query = query.where(User.id != current_user.data.id)
-            
-        result: Sequence[User] = session.exec(query.order_by(
-            cast(User.createdon, String))).all()
+        current_user_id: int = current_user.data.id if current_user.success and current_user.data and current_user.data.id else -1
 
-        if result:
-            user_output_list: list[UserOutput] = [
-                UserOutput(
-                    id = user.id,
-                    firstname=user.firstname,
-                    middlename=user.middlename,
-                    lastname=user.lastname,
-                    gender=user.gender,
-                    phoneNumber= user.phoneNumber,
-                    emailaddress=user.emailaddress,
-                    disabled=user.disabled,
-                    createdon=user.createdon,
-                    modifiedon=user.modifiedon
-                )
-                
-                for user in result 
-            ]
-            response = Response(
-                success=True,
-                message=SuccessMessage.OperationSuccessful.value,
-                data=user_output_list
-            )
-        else:
-            response = Response(
-                success=False,
-                message=ErrorMessage.NoEntry.value,
-                data=None
-            )
+        result: Sequence[Any] = session.exec(user_filters.statement(filters),
+                                             params={**filters.params, "current_user_id": current_user_id}).all()
 
-        return response
+        return fast_response(result, columns=filters.fields, response_model=user_projection.response_model(filters.fields))
 
     async def add_user(self, current_user: Annotated[SingleResponse[TokenData], Depends(get_current_active_user)],
                        user: UserInput, sesssion: Session = Depends(get_session)) -> Response[UserInput]:
@@ -136,9 +97,7 @@ class UserRouter(APIRouter):
                 new_user.emailaddress, new_user.password)
             # replace the user password
             new_user.password = hashpass
-            sesssion.add(new_user)
-            sesssion.commit()
-            sesssion.refresh(new_user)
+            new_user = await save(new_user)
 
             response = Response(
                 success=True,
@@ -199,8 +158,7 @@ class UserRouter(APIRouter):
                 
             old_user.modifiedon = datetime.utcnow()
 
-            session.commit()
-            session.refresh(old_user)
+            old_user = await save(old_user)
 
             updated_user: UserOutput = UserOutput(
                 id=old_user.id,
@@ -242,8 +200,7 @@ class UserRouter(APIRouter):
         user: Optional[User] = sesssion.get(User, id)
 
         if user:
-            sesssion.delete(user)
-            sesssion.commit()
+            await delete(user)
 
             user_output: UserOutput = UserOutput(
                 id=user.id,
@@ -294,8 +251,7 @@ class UserRouter(APIRouter):
             user.disabled = not user.disabled
             user.modifiedon = datetime.utcnow()
 
-            session.commit()
-            session.refresh(user)
+            user = await save(user)
             
             user_output: UserOutput = UserOutput(
                 id=user.id,
@@ -346,16 +302,15 @@ class UserRouter(APIRouter):
                 return response
             
 
-        result: User = session.exec(select(User).where(
-            User.emailaddress == email)).one()
+        result: Optional[User] = session.exec(select(User).where(
+            User.emailaddress == email)).first()
 
         if result:
             result.password = self.__utils.encrypt_password(
                 email, new_password)
             result.modifiedon = datetime.utcnow()
 
-            session.commit()
-            session.refresh(result)
+            result = await save(result)
 
             user_output: UserOutput = UserOutput(
                 id=result.id,
@@ -407,8 +362,7 @@ class UserRouter(APIRouter):
                 user.password = self.__utils.encrypt_password(user.emailaddress, password_reset)
                 user.modifiedon = datetime.utcnow()
                 
-                session.commit()
-                session.refresh(user)
+                user = await save(user)
                 
                 user_output: UserOutput = UserOutput(
                     id=user.id,
@@ -0,0 +1,71 @@
+"""Move the old attendance to the Parquet archive, e.g. from cron during off-hours.
+
+    DB_URL=postgresql://... python -m scripts.archive
+    DB_URL=postgresql://... python -m scripts.archive --after-days 1095 --directory /var/lib/makarios/archive
+
+Runs batch after batch until no attendance older than the cutoff is left,
+one run at a time per directory. It first settles the files a failed run
+left behind.
+The API reads the same directory, ARCHIVE_DIR, for its reports. Needs pyarrow.
+"""
+from typing import Optional
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from utils.archive import ARCHIVE_AFTER_DAYS, ArchiveBatch, ARCHIVE_BATCH_SIZE, ARCHIVE_COMPRESSION, ARCHIVE_DIR, AttendanceArchive
+
+import argparse
+import logging
+import os
+
+# the relationships of attendance and service are resolved against these
+import entities.user_entity
+import entities.members_entity
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move the old attendance to the Parquet archive")
+    parser.add_argument("--db-url", default=os.getenv("DB_URL"))
+    parser.add_argument("--directory", default=ARCHIVE_DIR)
+    parser.add_argument("--after-days", type=float, default=ARCHIVE_AFTER_DAYS, help="archive the attendance older than this")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--compression", default=ARCHIVE_COMPRESSION)
+    args = parser.parse_args()
+
+    if not args.db_url:
+        parser.error("pass --db-url or set DB_URL")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    archive: AttendanceArchive = AttendanceArchive(args.directory, args.after_days, args.batch_size, args.compression)
+
+    if not archive.available:
+        parser.error("archiving needs pyarrow, pip install pyarrow")
+
+    # a plain engine, importing db would start the writer thread and the replica pools
+    engine: Engine = create_engine(args.db_url)
+
+    with archive.lock():
+        with Session(engine) as session:
+            if settled := archive.recover(session):
+                logging.getLogger("makarios.archive").info("%d batch(es) of a previous run settled", settled)
+
+        while True:
+            # one transaction per batch, the files of a batch are written before its rows are deleted
+            with Session(engine) as session:
+                batch: Optional[ArchiveBatch] = archive.archive_batch(session)
+
+                if batch is None:
+                    break
+
+                # a failed commit leaves the files out of the manifest, the next run settles them
+                session.commit()
+
+            archive.record(batch)
+            logging.getLogger("makarios.archive").info("%d rows archived", archive.archived)
+
+    print(f"archived {archive.archived} attendance row(s) to {archive.root}")
+
+
+if __name__ == "__main__":
+    main()
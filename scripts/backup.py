@@ -0,0 +1,50 @@
+"""Write a compressed snapshot of the database while the API runs.
+
+    DB_URL=sqlite:///makarios.db python -m scripts.backup backups/
+    DB_URL=postgresql://... python -m scripts.backup backups/ --step-sleep-ms 50
+    DB_URL=postgresql://... python -m scripts.backup - > makarios.dump
+
+SQLite is copied with the online backup API a few pages at a time and
+gzipped, Postgres is dumped with pg_dump in its custom format. Restore the
+first with gunzip, the second with pg_restore.
+"""
+from utils.backup import BACKUP_CHUNK_SIZE, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP_MS, Backup
+
+import argparse
+import logging
+import os
+import sys
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write a compressed snapshot of the database")
+    parser.add_argument("output", help="directory or file to write, - for stdout")
+    parser.add_argument("--db-url", default=os.getenv("DB_URL"))
+    parser.add_argument("--pages-per-step", type=int, default=BACKUP_PAGES_PER_STEP, help="SQLite pages copied per step")
+    parser.add_argument("--step-sleep-ms", type=float, default=BACKUP_STEP_SLEEP_MS, help="pause between the steps")
+    parser.add_argument("--chunk-size", type=int, default=BACKUP_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if not args.db_url:
+        parser.error("pass --db-url or set DB_URL")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s", stream=sys.stderr)
+
+    backup: Backup = Backup(args.db_url, pages_per_step=args.pages_per_step, step_sleep_ms=args.step_sleep_ms,
+                            chunk_size=args.chunk_size)
+
+    if args.output == "-":
+        for chunk in backup.open():
+            sys.stdout.buffer.write(chunk)
+
+        sys.stdout.buffer.flush()
+        return
+
+    path: str = os.path.join(args.output, backup.file_name) if os.path.isdir(args.output) else args.output
+    written: int = backup.write(path)
+
+    print(f"wrote {written} bytes to {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Pre-build the OpenAPI schema cache, e.g. in the image build.
+
+    OPENAPI_CACHE_PATH=openapi.json python -m scripts.build_openapi
+
+The app serves the file as long as the routes and models it was built
+from did not change, otherwise it rebuilds and rewrites it.
+"""
+from utils.openapi_cache import OPENAPI_CACHE_PATH
+
+import sys
+
+
+def main() -> None:
+    if not OPENAPI_CACHE_PATH:
+        sys.exit("set OPENAPI_CACHE_PATH to the file to write")
+
+    from main import app
+
+    schema = app.openapi()
+    print(f"{len(schema.get('paths', {}))} paths cached in {OPENAPI_CACHE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
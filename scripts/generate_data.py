@@ -0,0 +1,431 @@
+"""Synthetic data generator for scale testing.
+
+Produces referentially consistent users, titles, service types, attendance
+types, members, services and attendance with realistic shapes:
+
+* members come in households sharing a surname and an address
+* every member has an attendance habit (regular, occasional or rare)
+* turnout follows the calendar: Easter and Christmas peak, August dips
+* Sunday services draw more people than midweek and prayer meetings
+
+Rows are streamed to the database with COPY on Postgres and executemany
+everywhere else. Every table uses its own random stream derived from the
+seed, the same seed always produces the same data.
+
+    DB_URL=sqlite:///scale.db python -m scripts.generate_data --members 100000 --years 5 --attendance 10000000
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Iterator, Optional, Sequence
+from sqlalchemy import Table, func, select
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel
+from entities.title_entity import Title
+from entities.user_entity import User
+from entities.members_entity import Member
+from entities.service_type_enity import ServiceType
+from entities.service_entity import Service
+from entities.attendance_type_entity import AttendanceType
+from entities.attendance_entity import Attendance
+from utils.user_utils import Utils
+from migrations.runner import MigrationRunner
+
+import argparse
+import csv
+import io
+import os
+import random
+import time as clock
+
+
+TITLES: tuple[str, ...] = ("Brother", "Sister", "Elder", "Deacon", "Deaconess", "Pastor")
+SERVICE_TYPES: tuple[str, ...] = ("Sunday Service", "MidWeek Service", "Prayer Meeting", "Special Service")
+ATTENDANCE_TYPES: tuple[str, ...] = ("Present", "Late", "Excused", "Absent")
+
+MALE_NAMES: tuple[str, ...] = ("Kwame", "Kofi", "Kojo", "Kwaku", "Yaw", "Kwabena", "Kwasi", "Emmanuel", "Daniel",
+                               "Samuel", "Isaac", "Joseph", "Michael", "Prince", "Richard", "Ebenezer", "Felix")
+FEMALE_NAMES: tuple[str, ...] = ("Ama", "Akosua", "Adwoa", "Abena", "Akua", "Yaa", "Afua", "Esi", "Efua", "Grace",
+                                 "Mercy", "Comfort", "Abigail", "Priscilla", "Gifty", "Joyce", "Patience")
+SURNAMES: tuple[str, ...] = ("Mensah", "Owusu", "Asante", "Boateng", "Osei", "Agyeman", "Appiah", "Addo", "Ansah",
+                             "Darko", "Frimpong", "Gyamfi", "Kyei", "Nkrumah", "Opoku", "Quaye", "Sarpong", "Tetteh",
+                             "Yeboah", "Amoah", "Acheampong", "Badu", "Danso", "Ofori", "Wiredu")
+AREAS: tuple[str, ...] = ("GA", "GE", "GW", "AK", "CC", "ER", "WS", "TV")
+
+HOUSEHOLD_SIZES: tuple[tuple[int, float], ...] = ((1, 0.24), (2, 0.20), (3, 0.20), (4, 0.18), (5, 0.11), (6, 0.07))
+
+# share of members and their chance to come to an ordinary Sunday
+HABITS: tuple[tuple[str, float, float], ...] = (("regular", 0.45, 0.80), ("occasional", 0.35, 0.35), ("rare", 0.20, 0.08))
+
+# turnout of each service type compared to a Sunday
+SERVICE_TURNOUT: dict[int, float] = {1: 1.0, 2: 0.35, 3: 0.20, 4: 1.20}
+
+STATUS_WEIGHTS: tuple[float, ...] = (0.85, 0.10, 0.03, 0.02)
+
+
+@dataclass
+class GeneratorConfig:
+    members: int = 100_000
+    years: int = 5
+    attendance: Optional[int] = None
+    users: int = 10
+    seed: int = 42
+    batch_size: int = 50_000
+    admin_email: str = "admin@makarios.org"
+    admin_password: str = "admin-password"
+
+
+def easter(year: int) -> date:
+    """date of Easter Sunday (anonymous Gregorian algorithm)
+
+    Args:
+        year (int): the year
+
+    Returns:
+        date: Easter Sunday
+    """
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    el = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * el) // 451
+    month, day = divmod(h + el - 7 * m + 114, 31)
+
+    return date(year, month, day + 1)
+
+
+def season_factor(day: date) -> float:
+    """relative turnout of a day compared to an ordinary week
+
+    Args:
+        day (date): day of the service
+
+    Returns:
+        float: the factor
+    """
+    easter_day: date = easter(day.year)
+
+    if day == easter_day or (day.month == 12 and day.day in (24, 25)):
+        return 1.6
+
+    if easter_day - timedelta(days=7) <= day < easter_day or (day.month == 12 and day.day >= 18) or (day.month == 1 and day.day <= 7):
+        return 1.2
+
+    if day.month == 8:
+        return 0.8
+
+    return 1.0
+
+
+class BulkWriter:
+    """Streams rows into a table with the fastest path of the dialect: COPY on
+    Postgres, executemany on the raw sqlite3 cursor, Core executemany otherwise.
+    """
+    def __init__(self, engine: Engine, batch_size: int) -> None:
+        self.engine: Engine = engine
+        self.batch_size: int = batch_size
+
+    def write(self, entity: type[SQLModel], columns: Sequence[str], rows: Iterator[tuple[Any, ...]]) -> int:
+        """write rows of tuples in the columns order
+
+        Args:
+            entity (type[SQLModel]): the table entity
+            columns (Sequence[str]): column names
+            rows (Iterator[tuple[Any, ...]]): the rows
+
+        Returns:
+            int: rows written
+        """
+        table: Table = entity.__table__  # type: ignore
+        write_batch: Callable[[Table, Sequence[str], list[tuple[Any, ...]]], None]
+
+        if self.engine.dialect.name == "postgresql":
+            write_batch = self.__copy
+        elif self.engine.dialect.name == "sqlite":
+            write_batch = self.__sqlite_executemany
+        else:
+            write_batch = self.__core_executemany
+
+        count: int = 0
+        batch: list[tuple[Any, ...]] = []
+
+        for row in rows:
+            batch.append(row)
+
+            if len(batch) >= self.batch_size:
+                write_batch(table, columns, batch)
+                count += len(batch)
+                batch = []
+
+        if batch:
+            write_batch(table, columns, batch)
+            count += len(batch)
+
+        return count
+
+    def __quoted(self, table: Table, columns: Sequence[str]) -> tuple[str, str]:
+        quote: Callable[[str], str] = self.engine.dialect.identifier_preparer.quote
+        return quote(table.name), ", ".join(quote(column) for column in columns)
+
+    def __copy(self, table: Table, columns: Sequence[str], batch: list[tuple[Any, ...]]) -> None:
+        buffer: io.StringIO = io.StringIO()
+        writer = csv.writer(buffer)
+
+        for row in batch:
+            writer.writerow(["" if value is None else value for value in row])
+
+        buffer.seek(0)
+        name, column_list = self.__quoted(table, columns)
+        statement: str = f"COPY {name} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            if hasattr(cursor, "copy_expert"):  # psycopg2
+                cursor.copy_expert(statement, buffer)
+            else:  # psycopg 3
+                with cursor.copy(statement) as copy:
+                    copy.write(buffer.getvalue())
+            raw.commit()
+        finally:
+            raw.close()
+
+    @staticmethod
+    def _sqlite_value(value: Any) -> Any:
+        # the storage format of the sqlalchemy sqlite types, sqlite3 cannot bind time at all
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, time):
+            return value.strftime("%H:%M:%S.%f")
+        return value
+
+    def __sqlite_executemany(self, table: Table, columns: Sequence[str], batch: list[tuple[Any, ...]]) -> None:
+        name, column_list = self.__quoted(table, columns)
+        statement: str = f"INSERT INTO {name} ({column_list}) VALUES ({', '.join('?' for _ in columns)})"
+
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.executemany(statement, [tuple(map(self._sqlite_value, row)) for row in batch])
+            raw.commit()
+        finally:
+            raw.close()
+
+    def __core_executemany(self, table: Table, columns: Sequence[str], batch: list[tuple[Any, ...]]) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(table.insert(), [dict(zip(columns, row)) for row in batch])
+
+
+class DataGenerator:
+    def __init__(self, engine: Engine, config: GeneratorConfig) -> None:
+        self.engine: Engine = engine
+        self.config: GeneratorConfig = config
+        self.writer: BulkWriter = BulkWriter(engine, config.batch_size)
+        self.now: datetime = datetime(2024, 1, 1)
+        # tables own their random stream, changing one volume does not reshuffle the others
+        self.rng: Callable[[str], random.Random] = lambda table: random.Random(f"{config.seed}:{table}")
+
+    def generate(self) -> dict[str, int]:
+        """create the schema and generate every table
+
+        Raises:
+            RuntimeError: raise if the database already has members
+
+        Returns:
+            dict[str, int]: rows per table
+        """
+        MigrationRunner(self.engine).upgrade()
+
+        with self.engine.connect() as connection:
+            if connection.execute(select(func.count()).select_from(Member.__table__)).scalar():  # type: ignore
+                raise RuntimeError("The target database already has members")
+
+        counts: dict[str, int] = {}
+        counts["user"] = self.writer.write(User, ("firstname", "middlename", "lastname", "gender", "phoneNumber",
+                                                  "emailaddress", "password", "disabled", "createdon"), self.users())
+        counts["title"] = self.writer.write(Title, ("title_name", "createdon"), ((name, self.now) for name in TITLES))
+        counts["servicetype"] = self.writer.write(ServiceType, ("name", "createdby", "createdon"),
+                                                  ((name, 1, self.now) for name in SERVICE_TYPES))
+        counts["attendancetype"] = self.writer.write(AttendanceType, ("name", "createdby", "createdon"),
+                                                     ((name, 1, self.now) for name in ATTENDANCE_TYPES))
+
+        habits: list[int] = []
+        counts["member"] = self.writer.write(Member, (
+            "firstname", "lastname", "middlename", "gender", "emailaddress", "phonenumber", "dob", "profile_picture",
+            "house_address", "title_id", "createdby", "createdon"), self.members(habits))
+
+        services: list[tuple[int, date, int]] = []
+        counts["service"] = self.writer.write(Service, (
+            "servicetypeId", "date", "createdby", "time_start", "location", "createdon"), self.services(services))
+
+        counts["attendance"] = self.writer.write(Attendance, (
+            "memberid", "serviceid", "attendancestatusid", "createdon"), self.attendance(habits, services))
+
+        return counts
+
+    def users(self) -> Iterator[tuple[Any, ...]]:
+        rng: random.Random = self.rng("user")
+        utils: Utils = Utils()
+
+        yield ("Admin", "Makarios", "Church", "male", "0240000000", self.config.admin_email,
+               utils.encrypt_password(self.config.admin_email, self.config.admin_password), False, self.now)
+
+        # staff share one placeholder hash, bcrypt per row would dominate the run. Log in as the admin
+        staff_hash: str = utils.encrypt_password("staff@makarios.org", self.config.admin_password)
+
+        for i in range(2, self.config.users + 1):
+            female: bool = rng.random() < 0.5
+            first: str = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+            yield (first, rng.choice(MALE_NAMES), rng.choice(SURNAMES), "female" if female else "male",
+                   f"0{rng.choice((20, 24, 26, 27, 50, 54, 55, 59))}{rng.randrange(10**7):07d}",
+                   f"staff{i}@makarios.org", staff_hash, False, self.now)
+
+    def members(self, habits: list[int]) -> Iterator[tuple[Any, ...]]:
+        """members grouped in households, the habit of each member is appended to habits
+
+        Args:
+            habits (list[int]): receives the index of the habit of each member in HABITS
+
+        Yields:
+            Iterator[tuple[Any, ...]]: member rows
+        """
+        rng: random.Random = self.rng("member")
+        sizes: list[int] = [size for size, _ in HOUSEHOLD_SIZES]
+        size_weights: list[float] = [weight for _, weight in HOUSEHOLD_SIZES]
+        habit_weights: list[float] = [share for _, share, _ in HABITS]
+        today: date = self.now.date()
+        member_id: int = 0
+
+        while member_id < self.config.members:
+            size: int = min(rng.choices(sizes, size_weights)[0], self.config.members - member_id)
+            surname: str = rng.choice(SURNAMES)
+            address: str = f"{rng.choice(AREAS)}-{rng.randrange(1000):03d}-{rng.randrange(10000):04d}"
+            # households tend to share the habit of the parents
+            household_habit: int = rng.choices(range(len(HABITS)), habit_weights)[0]
+
+            for position in range(size):
+                member_id += 1
+                female: bool = rng.random() < (0.55 if position == 0 else 0.5)
+                adult: bool = position < 2
+
+                age_days: int = rng.randrange(18 * 365, 80 * 365) if adult else rng.randrange(0, 18 * 365)
+                first: str = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+
+                if adult and rng.random() < 0.06:
+                    title: int = rng.choice((3, 4, 5, 6))
+                else:
+                    title = 2 if female else 1
+
+                habits.append(household_habit if rng.random() < 0.8 else rng.choices(range(len(HABITS)), habit_weights)[0])
+
+                yield (first, surname, rng.choice(MALE_NAMES), "female" if female else "male",
+                       f"{first.lower()}.{surname.lower()}{member_id}@example.org",
+                       f"0{rng.choice((20, 24, 26, 27, 50, 54, 55, 59))}{rng.randrange(10**7):07d}",
+                       today - timedelta(days=age_days), None, address, title, 1, self.now)
+
+    def services(self, services: list[tuple[int, date, int]]) -> Iterator[tuple[Any, ...]]:
+        """weekly Sunday, midweek and prayer services plus Good Friday and Christmas Eve
+
+        Args:
+            services (list[tuple[int, date, int]]): receives (service id, date, service type) of each service
+
+        Yields:
+            Iterator[tuple[Any, ...]]: service rows
+        """
+        end: date = self.now.date()
+        start: date = end - timedelta(days=365 * self.config.years)
+        start -= timedelta(days=(start.weekday() + 1) % 7)  # the Sunday before
+
+        schedule: list[tuple[date, int, time]] = []
+        day: date = start
+
+        while day < end:
+            schedule.append((day, 1, time(9)))
+            schedule.append((day + timedelta(days=3), 2, time(18, 30)))
+            schedule.append((day + timedelta(days=5), 3, time(5, 30)))
+            day += timedelta(weeks=1)
+
+        for year in range(start.year, end.year + 1):
+            for special in (easter(year) - timedelta(days=2), date(year, 12, 24)):
+                if start <= special < end:
+                    schedule.append((special, 4, time(19)))
+
+        schedule.sort()
+
+        for service_id, (day, service_type, start_time) in enumerate(schedule, start=1):
+            services.append((service_id, day, service_type))
+            yield (service_type, day, 1, start_time, "Makarios Center", datetime.combine(day, start_time))
+
+    def attendance(self, habits: list[int], services: list[tuple[int, date, int]]) -> Iterator[tuple[Any, ...]]:
+        """attendance per service, drawn from each habit group with the season and service turnout
+
+        Args:
+            habits (list[int]): habit of each member
+            services (list[tuple[int, date, int]]): (service id, date, service type) of each service
+
+        Yields:
+            Iterator[tuple[Any, ...]]: attendance rows
+        """
+        rng: random.Random = self.rng("attendance")
+        groups: list[list[int]] = [[] for _ in HABITS]
+
+        for member_id, habit in enumerate(habits, start=1):
+            groups[habit].append(member_id)
+
+        factors: list[float] = [season_factor(day) * SERVICE_TURNOUT[service_type] for _, day, service_type in services]
+        expected: float = sum(factors) * sum(len(group) * rate for group, (_, _, rate) in zip(groups, HABITS))
+
+        # scale the turnout so the total lands on the requested attendance
+        scale: float = self.config.attendance / expected if self.config.attendance and expected else 1.0
+        statuses: list[int] = list(range(1, len(ATTENDANCE_TYPES) + 1))
+
+        for (service_id, day, service_type), factor in zip(services, factors):
+            created: datetime = datetime.combine(day, time(12))
+
+            for group, (_, _, rate) in zip(groups, HABITS):
+                if not group:
+                    continue
+
+                count: int = min(len(group), round(len(group) * min(1.0, rate * factor * scale)))
+                chosen: list[int] = rng.sample(group, count)
+                status_ids: list[int] = rng.choices(statuses, STATUS_WEIGHTS, k=count)
+
+                for member_id, status_id in zip(sorted(chosen), status_ids):
+                    yield (member_id, service_id, status_id, created)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate referentially consistent synthetic data")
+    parser.add_argument("--db-url", default=os.getenv("DB_URL", "sqlite:///scale.db"))
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--attendance", type=int, default=None, help="target rows, derived from the habits when omitted")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--admin-email", default="admin@makarios.org")
+    parser.add_argument("--admin-password", default="admin-password")
+    args = parser.parse_args()
+
+    os.environ["DB_URL"] = args.db_url
+
+    from db import engine
+
+    config: GeneratorConfig = GeneratorConfig(
+        members=args.members, years=args.years, attendance=args.attendance, users=args.users, seed=args.seed,
+        batch_size=args.batch_size, admin_email=args.admin_email, admin_password=args.admin_password
+    )
+
+    started: float = clock.perf_counter()
+    counts: dict[str, int] = DataGenerator(engine, config).generate()
+    elapsed: float = clock.perf_counter() - started
+
+    total: int = sum(counts.values())
+    print({**counts, "seconds": round(elapsed, 1), "rows_per_second": round(total / elapsed) if elapsed else total})
+
+
+if __name__ == "__main__":
+    main()
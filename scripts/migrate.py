@@ -0,0 +1,51 @@
+"""Apply the schema migrations ahead of a deploy.
+
+    DB_URL=postgresql://... python -m scripts.migrate status
+    DB_URL=postgresql://... python -m scripts.migrate upgrade
+    DB_URL=postgresql://... python -m scripts.migrate upgrade --target 2
+
+The workers only check that nothing is pending when they start, they
+never run DDL themselves.
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from migrations.runner import MigrationRunner
+
+import argparse
+import logging
+import os
+import sys
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply the schema migrations")
+    parser.add_argument("command", choices=("upgrade", "status"))
+    parser.add_argument("--db-url", default=os.getenv("DB_URL"))
+    parser.add_argument("--target", type=int, help="last version to apply, all by default")
+    args = parser.parse_args()
+
+    if not args.db_url:
+        parser.error("pass --db-url or set DB_URL")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    # a plain engine, importing db would start the writer thread and the replica pools
+    engine: Engine = create_engine(args.db_url)
+    runner: MigrationRunner = MigrationRunner(engine)
+
+    if args.command == "status":
+        applied = runner.applied()
+
+        for migration in runner.migrations:
+            state: str = f"applied {applied[migration.version]:%Y-%m-%d %H:%M}" if migration.version in applied else "pending"
+            print(f"{migration.version:04d} {migration.name:<30} {state}  {migration.description}")
+
+        # non zero while something is pending, so a deploy script can check it
+        sys.exit(1 if any(migration.version not in applied for migration in runner.migrations) else 0)
+
+    done = runner.upgrade(args.target)
+    print(f"applied {len(done)} migration(s)" if done else "the schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
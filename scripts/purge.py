@@ -0,0 +1,59 @@
+"""Remove the expired soft deleted rows, e.g. from cron during off-hours.
+
+    DB_URL=postgresql://... python -m scripts.purge
+    DB_URL=postgresql://... python -m scripts.purge --retention-days 90
+
+Runs batch after batch until nothing expired is left, whatever the hour.
+The app purges by itself instead when PURGE_HOURS is set.
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel
+from utils.soft_delete import PURGE_BATCH_SIZE, PURGE_RETENTION_DAYS, Purger
+
+import argparse
+import logging
+import os
+
+# the tables and their foreign keys
+from entities.user_entity import User
+from entities.service_entity import Service
+from entities.members_entity import Member
+from entities.title_entity import Title
+from entities.service_type_enity import ServiceType
+from entities.attendance_type_entity import AttendanceType
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Remove the expired soft deleted rows")
+    parser.add_argument("--db-url", default=os.getenv("DB_URL"))
+    parser.add_argument("--retention-days", type=float, default=PURGE_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not args.db_url:
+        parser.error("pass --db-url or set DB_URL")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    # a plain engine, importing db would start the writer thread and the replica pools
+    engine: Engine = create_engine(args.db_url)
+    purger: Purger = Purger(
+        [SQLModel.metadata.tables[entity.__tablename__] for entity in (Service, Member, Title, ServiceType, AttendanceType, User)],
+        retention_days=args.retention_days, batch_size=args.batch_size
+    )
+
+    while True:
+        # one transaction per batch keeps the locks short
+        with Session(engine) as session:
+            removed: int = purger.purge_batch(session)
+            session.commit()
+
+        if not removed:
+            break
+
+    print(f"purged {purger.purged} row(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Production entry point.
+
+Runs the app under gunicorn with uvicorn workers, one per core by default.
+The app is imported once in the master (preload) and forked into the
+workers. Each worker drops the inherited connections and warms its pool
+in the lifespan, /readyz answers 503 until it is done. The bcrypt backend
+and, with OPENAPI_CACHE_PATH set, the OpenAPI schema are loaded once in
+the master.
+
+A SQLite database gets one worker, its writes go through the single writer
+thread of the process. With several workers the table versions and the
+read-your-writes window go to SHARED_STATE_URL, see utils/workers.py, and
+every worker writes its metrics to METRICS_DIR (a temporary directory by
+default), /metrics on any of them adds all of them up.
+
+Workers recycle after MAX_REQUESTS requests (with jitter, so they do not
+all restart at once) or when their resident memory goes over
+WORKER_MAX_MEMORY_MB. The master starts a replacement first.
+
+    python serve.py
+
+Rolling restarts:
+
+- kill -HUP <master>: replaces the workers one generation at a time.
+  With preload the code stays the one the master imported.
+- kill -USR2 <master>, then kill -TERM <old master>: starts a new master
+  on the new code alongside the old one.
+"""
+from typing import Any, Optional
+from gunicorn.app.base import BaseApplication
+from dotenv import load_dotenv
+
+import logging
+import os
+import signal
+import tempfile
+import threading
+import time
+
+
+load_dotenv(".env")
+
+logger: logging.Logger = logging.getLogger("makarios.server")
+
+WORKERS: int = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+BIND: str = os.getenv("BIND", "0.0.0.0:8000")
+MAX_REQUESTS: int = int(os.getenv("MAX_REQUESTS", "10000"))
+MAX_REQUESTS_JITTER: int = int(os.getenv("MAX_REQUESTS_JITTER", str(MAX_REQUESTS // 10)))
+WORKER_MAX_MEMORY_MB: int = int(os.getenv("WORKER_MAX_MEMORY_MB", "0"))
+MEMORY_CHECK_SECONDS: float = float(os.getenv("MEMORY_CHECK_SECONDS", "10"))
+GRACEFUL_TIMEOUT: int = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+def resident_memory_mb() -> Optional[float]:
+    """current resident memory of this process
+
+    Returns:
+        Optional[float]: megabytes, None where /proc is not available
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def watch_memory(limit_mb: int, interval: float) -> None:
+    """stop this worker gracefully once it uses more than limit_mb, the master forks a fresh one
+
+    Args:
+        limit_mb (int): memory limit in megabytes
+        interval (float): seconds between checks
+    """
+    def watch() -> None:
+        while True:
+            time.sleep(interval)
+            used: Optional[float] = resident_memory_mb()
+
+            if used is not None and used > limit_mb:
+                logger.warning("worker %s uses %.0fMB, above %dMB, recycling it", os.getpid(), used, limit_mb)
+                # same path as a max requests restart, in flight requests finish first
+                os.kill(os.getpid(), signal.SIGTERM)
+                return
+
+    threading.Thread(target=watch, name="memory-watchdog", daemon=True).start()
+
+
+def warm_password_hashing() -> None:
+    # passlib loads and self tests the backend on first use, do it once before forking
+    from utils.user_utils import pwd_context
+
+    pwd_context.hash("warm-up")
+
+
+def post_fork(server: Any, worker: Any) -> None:
+    from db import after_fork
+
+    after_fork()
+
+
+def worker_count(requested: int, database_url: str) -> int:
+    """the number of workers to fork, one for SQLite
+
+    Args:
+        requested (int): WEB_CONCURRENCY
+        database_url (str): DB_URL
+
+    Returns:
+        int: workers
+    """
+    if database_url.startswith("sqlite") and requested > 1:
+        logger.warning("SQLite is served by one worker, not %d, each would run its own writer", requested)
+        return 1
+
+    return max(requested, 1)
+
+
+def post_worker_init(worker: Any) -> None:
+    from utils.metrics import registry
+
+    registry.start_dumping()
+
+    if WORKER_MAX_MEMORY_MB > 0:
+        watch_memory(WORKER_MAX_MEMORY_MB, MEMORY_CHECK_SECONDS)
+
+
+class ProductionServer(BaseApplication):
+    """gunicorn configured from the environment, serving the preloaded app"""
+    def __init__(self, options: dict[str, Any]) -> None:
+        self.options: dict[str, Any] = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Any:
+        from main import app
+        from utils.openapi_cache import OPENAPI_CACHE_PATH
+
+        warm_password_hashing()
+
+        # load or build the cached schema once, every worker inherits it
+        if OPENAPI_CACHE_PATH:
+            app.openapi()
+
+        return app
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    workers: int = worker_count(WORKERS, os.getenv("DB_URL", ""))
+
+    # read by the app when the master preloads it, before the workers exist
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    if workers > 1 and not os.getenv("METRICS_DIR"):
+        os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="makarios-metrics-")
+
+    options: dict[str, Any] = {
+        "bind": BIND,
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS_JITTER,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "timeout": int(os.getenv("WORKER_TIMEOUT", "60")),
+        "keepalive": int(os.getenv("KEEPALIVE", "5")),
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+    }
+
+    if (pid_file := os.getenv("PID_FILE")):
+        options["pidfile"] = pid_file
+
+    ProductionServer(options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""The recovery of the archive batches a run left outside of the manifest.
+
+    python -m unittest tests.test_archive
+"""
+from datetime import date, datetime, time
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from migrations.runner import MigrationRunner
+from entities.attendance_entity import Attendance
+from entities.attendance_type_entity import AttendanceType
+from entities.members_entity import Member
+from entities.service_entity import Service
+from entities.service_type_enity import ServiceType
+from entities.title_entity import Title
+from entities.user_entity import User
+from utils.archive import ArchiveBatch, AttendanceArchive, pa
+
+import os
+import tempfile
+import unittest
+
+
+ROWS: int = 3
+
+
+@unittest.skipIf(pa is None, "the archive needs pyarrow")
+class ArchiveRecoveryTest(unittest.TestCase):
+    engine: Engine
+
+    def setUp(self) -> None:
+        self.directory: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.directory.name}/archive.db")
+        MigrationRunner(self.engine).upgrade()
+        self.archive: AttendanceArchive = AttendanceArchive(self.directory.name, after_days=365, batch_size=100,
+                                                            compression="snappy")
+        old: datetime = datetime(datetime.utcnow().year - 2, 3, 1)
+
+        with Session(self.engine) as session:
+            user: User = User(firstname="Jane", middlename="A", lastname="Doe", gender="F", phoneNumber="0200000000",
+                              emailaddress="jane@example.org", password="hash")
+            title: Title = Title(title_name="Elder")
+            session.add_all([user, title])
+            session.flush()
+
+            servicetype: ServiceType = ServiceType(name="Sunday", createdby=user.id)
+            attendancetype: AttendanceType = AttendanceType(name="Present", createdby=user.id)
+            session.add_all([servicetype, attendancetype])
+            session.flush()
+
+            service: Service = Service(servicetypeId=servicetype.id, date_event=old.date(), createdby=user.id,
+                                       time_start=time(9), location="Main hall")
+            members: list[Member] = [
+                Member(firstname="John", lastname="Mensah", middlename="K", gender="M",
+                       emailaddress=f"member{number}@example.org", phonenumber="0240000000", dob=date(1990, 1, 1),
+                       house_address="Accra", title_id=title.id, createdby=user.id)
+                for number in range(ROWS)
+            ]
+            session.add(service)
+            session.add_all(members)
+            session.flush()
+
+            session.add_all([Attendance(memberid=member.id, serviceid=service.id, attendancestatusid=attendancetype.id,
+                                        createdon=old) for member in members])
+            session.commit()
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def in_table(self) -> int:
+        with Session(self.engine) as session:
+            return session.execute(select(func.count()).select_from(Attendance.__table__)).scalar()  # type: ignore
+
+    def archived(self) -> int:
+        return sum(self.archive.counts().values())
+
+    def run_archive(self) -> None:
+        # the job: recover under the lock, then one committed and recorded batch
+        with self.archive.lock():
+            with Session(self.engine) as session:
+                self.archive.recover(session)
+
+            with Session(self.engine) as session:
+                batch: ArchiveBatch = self.archive.archive_batch(session)  # type: ignore
+                session.commit()
+
+            self.archive.record(batch)
+
+    def files(self) -> list[str]:
+        return [name for _, _, names in os.walk(self.archive.root) for name in names if name.endswith(".parquet")]
+
+    def test_rerun_after_an_uncommitted_batch_counts_once(self) -> None:
+        with Session(self.engine) as session:
+            self.assertIsNotNone(self.archive.archive_batch(session))
+            session.rollback()
+
+        # the files of the rolled back batch are on disk and not counted
+        self.assertEqual(len(self.files()), 1)
+        self.assertEqual((self.in_table(), self.archived()), (ROWS, 0))
+
+        self.run_archive()
+
+        self.assertEqual(len(self.files()), 1)
+        self.assertEqual((self.in_table(), self.archived()), (0, ROWS))
+
+    def test_committed_batch_missing_from_the_manifest_is_recorded(self) -> None:
+        with Session(self.engine) as session:
+            self.assertIsNotNone(self.archive.archive_batch(session))
+            session.commit()
+
+        self.assertEqual((self.in_table(), self.archived()), (0, 0))
+
+        with self.archive.lock(), Session(self.engine) as session:
+            self.assertEqual(self.archive.recover(session), 1)
+
+        self.assertEqual(len(self.files()), 1)
+        self.assertEqual(self.archived(), ROWS)
+
+        with Session(self.engine) as session:
+            self.assertIsNone(self.archive.archive_batch(session))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""The audit rows collected from the attribute history of a write.
+
+    python -m unittest tests.test_audit
+"""
+from datetime import datetime
+from typing import Any
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from migrations.runner import MigrationRunner
+from entities.title_entity import Title
+from entities.user_entity import User
+from utils.audit import collect
+
+import tempfile
+import unittest
+
+# the relationships of the user are resolved against these
+import entities.members_entity
+import entities.service_entity
+import entities.service_type_enity
+import entities.attendance_type_entity
+
+
+def new_user(**values: Any) -> User:
+    return User(**{"firstname": "Jane", "middlename": "A", "lastname": "Doe", "gender": "F", "phoneNumber": "0200000000",
+                   "emailaddress": "jane@example.org", "password": "hash-1", **values})
+
+
+class CollectTest(unittest.TestCase):
+    engine: Engine
+
+    def setUp(self) -> None:
+        self.directory: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.directory.name}/audit.db")
+        MigrationRunner(self.engine).upgrade()
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def add(self, entity: Any) -> int:
+        with Session(self.engine) as session:
+            session.add(entity)
+            session.commit()
+            return entity.id
+
+    def test_insert_has_the_whole_row_with_the_password_redacted(self) -> None:
+        with Session(self.engine) as session:
+            user: User = new_user()
+            session.add(user)
+            rows: list[dict[str, Any]] = collect(session, actor_id=7)
+            session.commit()
+
+            self.assertEqual(len(rows), 1)
+            self.assertEqual((rows[0]["action"], rows[0]["table_name"], rows[0]["row_id"], rows[0]["actor_id"]),
+                             ("insert", "user", user.id, 7))
+            self.assertIsNone(rows[0]["before"])
+            self.assertEqual(rows[0]["after"]["firstname"], "Jane")
+            self.assertEqual(rows[0]["after"]["password"], "<redacted>")
+
+    def test_update_has_each_changed_field_and_only_those(self) -> None:
+        user_id: int = self.add(new_user())
+
+        with Session(self.engine) as session:
+            user: User = session.get(User, user_id)  # type: ignore
+            user.firstname = "Janet"
+            user.phoneNumber = "0241111111"
+            user.password = "hash-2"
+            # set to the value it has, not a change
+            user.lastname = "Doe"
+            rows: list[dict[str, Any]] = collect(session, actor_id=7)
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]["action"], rows[0]["row_id"]), ("update", user_id))
+        self.assertEqual(rows[0]["before"], {"firstname": "Jane", "phoneNumber": "0200000000", "password": "<redacted>"})
+        self.assertEqual(rows[0]["after"], {"firstname": "Janet", "phoneNumber": "0241111111", "password": "<redacted>"})
+
+    def test_setting_deletedon_is_a_delete(self) -> None:
+        title_id: int = self.add(Title(title_name="Pastor"))
+
+        with Session(self.engine) as session:
+            title: Title = session.get(Title, title_id)  # type: ignore
+            title.deletedon = datetime.utcnow()
+            rows: list[dict[str, Any]] = collect(session, actor_id=None)
+
+        self.assertEqual([(row["action"], row["row_id"]) for row in rows], [("delete", title_id)])
+        self.assertEqual(set(rows[0]["after"]), {"deletedon"})
+
+    def test_delete_keeps_the_row_before(self) -> None:
+        title_id: int = self.add(Title(title_name="Deacon"))
+
+        with Session(self.engine) as session:
+            session.delete(session.get(Title, title_id))
+            rows: list[dict[str, Any]] = collect(session, actor_id=3)
+
+        self.assertEqual([(row["action"], row["table_name"], row["row_id"]) for row in rows], [("delete", "title", title_id)])
+        self.assertEqual(rows[0]["before"]["title_name"], "Deacon")
+        self.assertIsNone(rows[0]["after"])
+
+
+if __name__ == "__main__":
+    unittest.main()
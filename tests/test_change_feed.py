@@ -0,0 +1,93 @@
+"""The pages and the watermarks of a change feed.
+
+    python -m unittest tests.test_change_feed
+"""
+from datetime import datetime, timedelta
+from typing import Any
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from migrations.runner import MigrationRunner
+from entities.deletion_entity import DeletionLog
+from entities.title_entity import Title
+from utils.change_feed import DELETE, START, UPSERT, ChangeFeed, Watermark
+from validators.lookup_validator import title_projection
+
+import tempfile
+import unittest
+
+
+class WatermarkTest(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        for watermark in (START, Watermark(datetime(2024, 5, 1, 8, 30, 15, 250), UPSERT, 42),
+                          Watermark(datetime(2024, 5, 1, 8, 30), DELETE, 7)):
+            with self.subTest(watermark=watermark):
+                self.assertEqual(Watermark.decode(watermark.encode()), watermark)
+
+    def test_since_reads_the_token_or_starts(self) -> None:
+        feed: ChangeFeed = ChangeFeed(Title, title_projection)
+        watermark: Watermark = Watermark(datetime(2024, 5, 1), UPSERT, 3)
+
+        self.assertEqual(feed.since(None), START)
+        self.assertEqual(feed.since(watermark.encode()), watermark)
+
+        for token in ("not-a-watermark", "bm90fGF8d2F0ZXJtYXJr"):
+            with self.subTest(token=token), self.assertRaises(HTTPException) as raised:
+                feed.since(token)
+
+            self.assertEqual(raised.exception.status_code, 400)
+
+
+class ChangeFeedTest(unittest.TestCase):
+    engine: Engine
+
+    def setUp(self) -> None:
+        self.directory: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.directory.name}/changes.db")
+        MigrationRunner(self.engine).upgrade()
+        self.feed: ChangeFeed = ChangeFeed(Title, title_projection)
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def read(self, since: Watermark, limit: int) -> dict[str, Any]:
+        with Session(self.engine) as session:
+            return self.feed.read(session, since, title_projection.default, limit)
+
+    def test_pages_end_with_the_tombstone(self) -> None:
+        past: datetime = datetime.utcnow() - timedelta(minutes=10)
+
+        with Session(self.engine) as session:
+            session.add_all([
+                Title(title_name="Elder", createdon=past),
+                Title(title_name="Deacon", createdon=past + timedelta(seconds=1)),
+                Title(title_name="Pastor", createdon=past, modifiedon=past + timedelta(seconds=2)),
+                # still within the settle window
+                Title(title_name="Usher", createdon=datetime.utcnow()),
+                DeletionLog(table_name="title", row_id=99, deletedon=past + timedelta(seconds=3)),
+                DeletionLog(table_name="member", row_id=5, deletedon=past + timedelta(seconds=3)),
+            ])
+            session.commit()
+
+        first: dict[str, Any] = self.read(START, limit=2)
+        self.assertEqual([(change["op"], change["data"]["title_name"]) for change in first["data"]],
+                         [("upsert", "Elder"), ("upsert", "Deacon")])
+        self.assertTrue(first["has_more"])
+
+        second: dict[str, Any] = self.read(self.feed.since(first["watermark"]), limit=2)
+        self.assertEqual([(change["op"], change["data"] and change["data"]["title_name"]) for change in second["data"]],
+                         [("upsert", "Pastor"), ("delete", None)])
+        self.assertEqual(second["data"][1]["id"], 99)
+        self.assertFalse(second["has_more"])
+
+        # caught up, the consumer keeps its watermark
+        last: dict[str, Any] = self.read(self.feed.since(second["watermark"]), limit=2)
+        self.assertEqual(last["data"], [])
+        self.assertEqual(last["watermark"], second["watermark"])
+        self.assertFalse(last["has_more"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Every field a FilterSet declares indexed or sortable is served by an index of the migrations.
+
+    python -m unittest tests.test_filter_indexes
+"""
+from datetime import date, datetime
+from typing import Any
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from migrations.runner import MigrationRunner
+from entities.attendance_type_entity import AttendanceType
+from entities.members_entity import Member
+from entities.service_entity import Service
+from entities.service_type_enity import ServiceType
+from entities.title_entity import Title
+from entities.user_entity import User
+from utils.soft_delete import exclude_deleted
+from validators.audit_validator import audit_filters
+from validators.filters.filter import FilterField, FilterSet, Operator
+from validators.lookup_validator import attendancetype_filters, servicetype_filters, title_filters
+from validators.member_validator import member_filters
+from validators.service_validator import service_filters
+from validators.user_validator import user_filters
+
+import re
+import tempfile
+import unittest
+
+
+FILTER_SETS: tuple[FilterSet, ...] = (
+    member_filters, user_filters, service_filters, title_filters, servicetype_filters, attendancetype_filters,
+    audit_filters,
+)
+
+# a query string value of each column type
+SAMPLES: dict[type, str] = {int: "1", date: "2024-01-01", datetime: "2024-01-01T00:00:00"}
+
+
+def sample(declared: FilterField) -> str:
+    try:
+        return SAMPLES.get(declared.column.expression.type.python_type, "Ab")
+    except NotImplementedError:
+        return "Ab"
+
+
+def operator_params(name: str, declared: FilterField, operator: Operator) -> dict[str, str]:
+    value: str = sample(declared)
+
+    if operator == Operator.RANGE:
+        # a window, like the reports and the audit pages ask for
+        return {f"{name}__gte": value, f"{name}__lte": value}
+
+    if operator == Operator.IN:
+        return {f"{name}__in": f"{value},{value}"}
+
+    return {f"{name}__{operator.value}": value}
+
+
+class FilterIndexTest(unittest.TestCase):
+    engine: Engine
+    directory: tempfile.TemporaryDirectory
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.engine = create_engine(f"sqlite:///{cls.directory.name}/filters.db")
+        MigrationRunner(cls.engine).upgrade()
+
+        # the partial indexes of the live rows are only used with the criteria of the soft delete
+        exclude_deleted(Member, Service, ServiceType, AttendanceType, Title, User)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.engine.dispose()
+        cls.directory.cleanup()
+
+    def plan(self, filters: FilterSet, params: dict[str, str]) -> str:
+        query = filters.parse(params)
+        statements: list[tuple[str, Any]] = []
+
+        def capture(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+            statements.append((statement, parameters))
+
+        # the statement as the app sends it, with the criteria of the soft delete and the expanded IN
+        event.listen(self.engine, "before_cursor_execute", capture)
+
+        try:
+            with Session(self.engine) as session:
+                session.execute(filters.statement(query), {**query.params, "current_user_id": 0}).all()
+        finally:
+            event.remove(self.engine, "before_cursor_execute", capture)
+
+        statement, parameters = statements[-1]
+
+        with self.engine.connect() as connection:
+            rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+
+        return "\n".join(row[-1] for row in rows)
+
+    def test_indexed_fields_search_an_index(self) -> None:
+        for filters in FILTER_SETS:
+            for name, declared in filters.fields.items():
+                if not declared.indexed:
+                    continue
+
+                table: str = declared.column.expression.table.name
+
+                for operator in declared.operators:
+                    with self.subTest(filters=filters.name, field=name, operator=operator.value):
+                        plan: str = self.plan(filters, operator_params(name, declared, operator))
+                        self.assertRegex(plan, rf"SEARCH {re.escape(table)}\b.* USING (COVERING )?INDEX")
+
+    def test_sortable_fields_read_an_index_in_order(self) -> None:
+        for filters in FILTER_SETS:
+            for name, declared in filters.fields.items():
+                if not declared.sortable:
+                    continue
+
+                for sort in (name, f"-{name}"):
+                    with self.subTest(filters=filters.name, sort=sort):
+                        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", self.plan(filters, {"sort": sort}))
+
+
+if __name__ == "__main__":
+    unittest.main()
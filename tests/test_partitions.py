@@ -0,0 +1,104 @@
+"""The month helpers and the maintenance of the attendance partitions.
+
+There is no Postgres in the test run, the maintenance is checked on the
+statements it sends to a session answering the catalog queries.
+
+    python -m unittest tests.test_partitions
+"""
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Optional
+from sqlalchemy import create_engine
+from sqlmodel import Session
+from entities.attendance_entity import Attendance
+from utils.partitions import PartitionManager, add_months, created_between, month_start
+
+import unittest
+
+
+class MonthTest(unittest.TestCase):
+    def test_add_months_crosses_the_years(self) -> None:
+        self.assertEqual(add_months(datetime(2024, 11, 1), 2), datetime(2025, 1, 1))
+        self.assertEqual(add_months(datetime(2024, 1, 1), -1), datetime(2023, 12, 1))
+        self.assertEqual(add_months(datetime(2024, 5, 1), 0), datetime(2024, 5, 1))
+
+    def test_created_between_bounds_only_what_is_given(self) -> None:
+        self.assertEqual(created_between(Attendance.createdon, None, None), [])
+
+        start, end = datetime(2024, 1, 1), datetime(2024, 2, 1)
+        conditions: list[Any] = created_between(Attendance.createdon, start, end)
+
+        self.assertEqual([str(condition) for condition in conditions],
+                         ["attendance.createdon >= :createdon_1", "attendance.createdon < :createdon_1"])
+        self.assertEqual([condition.right.value for condition in conditions], [start, end])
+
+
+class Catalog:
+    """A Postgres session answering the queries of the maintenance and recording its statements"""
+    def __init__(self, months: list[str], in_default: bool) -> None:
+        self.months: list[str] = months
+        self.in_default: bool = in_default
+        self.statements: list[str] = []
+
+    def get_bind(self) -> Any:
+        return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+
+    def execute(self, statement: Any, parameters: Optional[dict[str, Any]] = None) -> Any:
+        sql: str = str(statement)
+        self.statements.append(sql)
+        answer: Any = None
+
+        if "pg_try_advisory_xact_lock" in sql or "to_regclass" in sql:
+            answer = True
+        elif "pg_partitioned_table" in sql:
+            answer = (1,)
+        elif "pg_inherits" in sql:
+            return SimpleNamespace(scalars=lambda: iter(["attendance_legacy", "attendance_default", *self.months]))
+        elif sql.startswith("SELECT EXISTS (SELECT 1 FROM attendance_default"):
+            answer = self.in_default
+        elif sql.startswith("SELECT count(*) FROM attendance_default"):
+            answer = 0
+
+        return SimpleNamespace(scalar=lambda: answer, first=lambda: answer, rowcount=4)
+
+    def ddl(self) -> list[str]:
+        return [sql for sql in self.statements if sql.startswith(("ALTER", "CREATE", "WITH", "DROP"))]
+
+
+class PartitionManagerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.month: datetime = month_start(datetime.utcnow())
+        self.name: str = f"attendance_p{self.month:%Y%m}"
+        self.previous: str = f"attendance_p{add_months(self.month, -1):%Y%m}"
+
+    def test_sqlite_has_nothing_to_maintain(self) -> None:
+        with Session(create_engine("sqlite://")) as session:
+            self.assertEqual(PartitionManager().maintain(session), 0)
+
+    def test_creates_the_missing_months(self) -> None:
+        catalog: Catalog = Catalog([self.previous], in_default=False)
+
+        self.assertEqual(PartitionManager(ahead=1).maintain(catalog), 2)  # type: ignore
+        self.assertEqual([sql.split(" PARTITION OF")[0] for sql in catalog.ddl()], [
+            f"CREATE TABLE IF NOT EXISTS {self.name}",
+            f"CREATE TABLE IF NOT EXISTS attendance_p{add_months(self.month, 1):%Y%m}",
+        ])
+
+    def test_moves_the_rows_of_the_month_out_of_the_default(self) -> None:
+        catalog: Catalog = Catalog([self.previous], in_default=True)
+
+        self.assertEqual(PartitionManager(ahead=0).maintain(catalog), 1)  # type: ignore
+
+        ddl: list[str] = catalog.ddl()
+        self.assertEqual(ddl[0], "ALTER TABLE attendance DETACH PARTITION attendance_default")
+        self.assertTrue(ddl[1].startswith(f"CREATE TABLE IF NOT EXISTS {self.name} PARTITION OF attendance "
+                                          f"FOR VALUES FROM ('{self.month:%Y-%m-%d}')"))
+        self.assertTrue(ddl[2].startswith("WITH moved AS (DELETE FROM attendance_default "
+                                          f"WHERE createdon >= '{self.month:%Y-%m-%d}'"))
+        self.assertTrue(ddl[2].endswith(f"INSERT INTO {self.name} SELECT * FROM moved"))
+        self.assertEqual(ddl[3], "ALTER TABLE attendance ATTACH PARTITION attendance_default DEFAULT")
+        self.assertEqual(len(ddl), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
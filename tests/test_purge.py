@@ -0,0 +1,117 @@
+"""The purge of the expired soft deleted rows.
+
+    python -m unittest tests.test_purge
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from migrations.runner import MigrationRunner
+from entities.attendance_entity import Attendance
+from entities.attendance_type_entity import AttendanceType
+from entities.members_entity import Member
+from entities.service_entity import Service
+from entities.service_type_enity import ServiceType
+from entities.title_entity import Title
+from entities.user_entity import User
+from utils.soft_delete import Purger
+
+import tempfile
+import unittest
+
+
+class PurgeTest(unittest.TestCase):
+    engine: Engine
+
+    def setUp(self) -> None:
+        self.directory: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.directory.name}/purge.db")
+        MigrationRunner(self.engine).upgrade()
+
+        # the order of db.purger, the referencing tables first
+        self.purger: Purger = Purger(
+            [entity.__table__ for entity in (Service, Member, Title, ServiceType, AttendanceType, User)],  # type: ignore
+            retention_days=30
+        )
+        self.expired: datetime = datetime.utcnow() - timedelta(days=45)
+
+        with Session(self.engine) as session:
+            user: User = User(firstname="Jane", middlename="A", lastname="Doe", gender="F", phoneNumber="0200000000",
+                              emailaddress="jane@example.org", password="hash")
+            title: Title = Title(title_name="Elder")
+            session.add_all([user, title])
+            session.flush()
+
+            servicetype: ServiceType = ServiceType(name="Sunday", createdby=user.id)
+            attendancetype: AttendanceType = AttendanceType(name="Present", createdby=user.id)
+            session.add_all([servicetype, attendancetype])
+            session.flush()
+
+            service: Service = Service(servicetypeId=servicetype.id, date_event=date(2024, 1, 7), createdby=user.id,
+                                       time_start=time(9), location="Main hall")
+            self.attended: Member = self.member(user, title, "attended@example.org", deletedon=self.expired)
+            self.absent: Member = self.member(user, title, "absent@example.org", deletedon=self.expired)
+            self.recent: Member = self.member(user, title, "recent@example.org",
+                                              deletedon=datetime.utcnow() - timedelta(days=2))
+            session.add_all([service, self.attended, self.absent, self.recent])
+            session.flush()
+
+            session.add(Attendance(memberid=self.attended.id, serviceid=service.id, attendancestatusid=attendancetype.id))
+            session.commit()
+
+            self.ids: dict[str, int] = {
+                "attended": self.attended.id, "absent": self.absent.id, "recent": self.recent.id  # type: ignore
+            }
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def member(self, user: User, title: Title, emailaddress: str, deletedon: datetime) -> Member:
+        return Member(firstname="John", lastname="Mensah", middlename="K", gender="M", emailaddress=emailaddress,
+                      phonenumber="0240000000", dob=date(1990, 1, 1), house_address="Accra", title_id=title.id,
+                      createdby=user.id, deletedon=deletedon)
+
+    def member_ids(self) -> set[int]:
+        with Session(self.engine) as session:
+            return set(session.execute(select(Member.__table__.c.id)).scalars())  # type: ignore
+
+    def purge(self) -> int:
+        with Session(self.engine) as session:
+            removed: int = self.purger.purge_batch(session)
+            session.commit()
+
+        return removed
+
+    def test_expired_unreferenced_rows_are_removed(self) -> None:
+        self.assertEqual(self.purge(), 1)
+        self.assertEqual(self.member_ids(), {self.ids["attended"], self.ids["recent"]})
+
+    def test_referenced_member_is_kept(self) -> None:
+        # SQLite does not enforce the foreign keys here, the purge has to check them itself
+        self.purge()
+        self.purge()
+
+        with Session(self.engine) as session:
+            attendance: Any = session.execute(select(func.count()).select_from(Attendance.__table__)).scalar()  # type: ignore
+
+        self.assertIn(self.ids["attended"], self.member_ids())
+        self.assertEqual(attendance, 1)
+
+    def test_batch_size_bounds_a_round(self) -> None:
+        with Session(self.engine) as session:
+            session.execute(Member.__table__.update().values(deletedon=self.expired))  # type: ignore
+            session.execute(Attendance.__table__.delete())  # type: ignore
+            session.commit()
+
+        self.purger.batch_size = 2
+
+        self.assertEqual(self.purge(), 2)
+        self.assertEqual(len(self.member_ids()), 1)
+        self.assertEqual(self.purge(), 1)
+        self.assertEqual(self.member_ids(), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
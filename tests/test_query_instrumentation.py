@@ -0,0 +1,56 @@
+"""The EXPLAIN of a slow query leaves the transaction of the request as it was.
+
+There is no Postgres in the test run, the savepoint of the Postgres path
+runs on a SQLite connection, which has the same SAVEPOINT statements.
+
+    python -m unittest tests.test_query_instrumentation
+"""
+from types import SimpleNamespace
+from typing import Any
+from utils.query_instrumentation import _explain
+
+import sqlite3
+import unittest
+
+
+class ExplainTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.connection: sqlite3.Connection = sqlite3.connect(":memory:")
+        self.connection.execute("CREATE TABLE member (id INTEGER PRIMARY KEY, firstname TEXT)")
+        self.connection.commit()
+        # a write of the request, not committed yet
+        self.connection.execute("INSERT INTO member (firstname) VALUES ('Jane')")
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def conn(self, dialect: str) -> Any:
+        return SimpleNamespace(dialect=SimpleNamespace(name=dialect), connection=self.connection)
+
+    def assert_transaction_kept(self) -> None:
+        self.assertTrue(self.connection.in_transaction)
+        self.assertEqual(self.connection.execute("SELECT firstname FROM member").fetchall(), [("Jane",)])
+
+        # the savepoint was released
+        with self.assertRaises(sqlite3.OperationalError):
+            self.connection.execute("RELEASE SAVEPOINT makarios_explain")
+
+    def test_plan_in_a_savepoint(self) -> None:
+        plan: Any = _explain(self.conn("postgresql"), "SELECT id FROM member WHERE id = ?", (1,))
+
+        self.assertIsNotNone(plan)
+        self.assert_transaction_kept()
+
+    def test_failed_explain_is_rolled_back_to_the_savepoint(self) -> None:
+        self.assertIsNone(_explain(self.conn("postgresql"), "SELECT id FROM missing", ()))
+        self.assert_transaction_kept()
+
+    def test_sqlite_query_plan(self) -> None:
+        plan: Any = _explain(self.conn("sqlite"), "SELECT id FROM member WHERE id = ?", (1,))
+
+        self.assertIn("SEARCH member USING INTEGER PRIMARY KEY", plan)
+        self.assert_transaction_kept()
+
+
+if __name__ == "__main__":
+    unittest.main()
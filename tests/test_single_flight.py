@@ -0,0 +1,84 @@
+"""Concurrent identical GETs share one query.
+
+    python -m unittest tests.test_single_flight
+"""
+from typing import Any
+from dto.response import SingleResponse
+from entities.auth_entity.token_Entity import TokenData
+from utils.replicas import write_window
+from utils.single_flight import coalesced, single_flight
+
+import asyncio
+import threading
+import time
+import unittest
+
+
+class CoalescedTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_identical_calls_run_one_query(self) -> None:
+        queries: list[int] = []
+        lock: threading.Lock = threading.Lock()
+
+        def query(limit: int) -> list[int]:
+            # a blocking database call, long enough for the second request to arrive
+            with lock:
+                queries.append(limit)
+
+            time.sleep(0.1)
+            return list(range(limit))
+
+        class Router:
+            @coalesced()
+            async def get_items(self, limit: int) -> Any:
+                return await asyncio.to_thread(query, limit)
+
+        router: Router = Router()
+        coalesced_before: int = single_flight.coalesced
+
+        first, second = await asyncio.gather(router.get_items(limit=3), router.get_items(limit=3))
+
+        self.assertEqual(first, [0, 1, 2])
+        self.assertEqual(second, [0, 1, 2])
+        self.assertEqual(queries, [3])
+        self.assertEqual(single_flight.coalesced, coalesced_before + 1)
+
+    async def test_different_calls_are_not_coalesced(self) -> None:
+        class Router:
+            @coalesced()
+            async def get_items(self, limit: int) -> Any:
+                return await asyncio.to_thread(lambda: list(range(limit)))
+
+        router: Router = Router()
+        first, second = await asyncio.gather(router.get_items(limit=1), router.get_items(limit=2))
+
+        self.assertEqual((first, second), ([0], [0, 1]))
+
+    async def test_user_reading_their_write_is_not_coalesced(self) -> None:
+        queries: list[int] = []
+
+        def query(user_id: int) -> list[int]:
+            queries.append(user_id)
+            time.sleep(0.1)
+            return [user_id]
+
+        class Router:
+            @coalesced()
+            async def get_items(self, current_user: SingleResponse[TokenData], limit: int) -> Any:
+                return await asyncio.to_thread(query, current_user.data.id)  # type: ignore
+
+        def user(user_id: int) -> SingleResponse[TokenData]:
+            return SingleResponse(success=True, message="", data=TokenData(id=user_id, emailAddress=None))
+
+        # user 2 just wrote, their read is on the primary and after their commit
+        write_window.record(2)
+        router: Router = Router()
+
+        first, second = await asyncio.gather(router.get_items(current_user=user(1), limit=3),
+                                             router.get_items(current_user=user(2), limit=3))
+
+        self.assertEqual((first, second), ([1], [2]))
+        self.assertEqual(sorted(queries), [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
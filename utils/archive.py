@@ -0,0 +1,367 @@
+"""Cold archive of the old attendance in Parquet files.
+
+The archive job moves the attendance created more than ARCHIVE_AFTER_DAYS
+ago out of the table, ARCHIVE_BATCH_SIZE rows per transaction. The rows of
+a batch are written under ARCHIVE_DIR, one compressed file per year and
+service type:
+
+    attendance/year=2021/servicetypeid=3/part-<batch>.parquet
+
+and deleted from the table in the same transaction, once the files are on
+disk. After the commit the batch is recorded in the manifest,
+attendance/_batches/<batch>.json, and only the files it lists are read.
+The files of a batch that did not commit are never counted next to the
+rows still in the table. The next run, holding the archive lock, checks
+the files missing from the manifest against the table: rows still there
+mean the batch did not commit and its files are deleted, rows gone mean
+it committed before the manifest was written and it is recorded then.
+The service type and date are copied into the files, the archived rows
+keep their meaning when the service is purged later.
+
+The reports add the counts of the table and of the archive up. The year
+and service type filters only open the matching directories. Between a
+commit and its manifest a report misses the rows of that batch.
+
+pyarrow is optional, without it nothing is archived and the reports read
+the table alone.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Iterator, Optional, Sequence
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from entities.attendance_entity import Attendance
+from entities.service_entity import Service
+
+import fcntl
+import json
+import logging
+import os
+import re
+import uuid
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.dataset as ds  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:  # pyarrow is optional, the attendance then stays in the table
+    pa = ds = pq = None
+
+
+logger: logging.Logger = logging.getLogger("makarios.archive")
+
+ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS: float = float(os.getenv("ARCHIVE_AFTER_DAYS", "730"))
+ARCHIVE_BATCH_SIZE: int = int(os.getenv("ARCHIVE_BATCH_SIZE", "10000"))
+ARCHIVE_COMPRESSION: str = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+
+# (year, servicetypeid, attendancestatusid)
+CountKey = tuple[int, int, int]
+
+_FILE_NAME: re.Pattern[str] = re.compile(r"^part-(.+)\.parquet$")
+
+# ids per IN (...) when the recovery looks for rows still in the table, under the SQLite variable limit
+_RECOVER_CHUNK: int = 900
+
+
+@dataclass(frozen=True)
+class ArchiveBatch:
+    """The files of one batch, recorded in the manifest once its transaction committed"""
+    name: str
+    rows: int
+    first_id: int
+    last_id: int
+    # relative to the archive root
+    files: tuple[str, ...]
+
+
+def _schemas() -> tuple[Any, Any]:
+    columns = pa.schema([
+        ("id", pa.int64()),
+        ("memberid", pa.int64()),
+        ("serviceid", pa.int64()),
+        ("attendancestatusid", pa.int64()),
+        ("createdon", pa.timestamp("us")),
+        ("modifiedon", pa.timestamp("us")),
+        ("servicedate", pa.date32()),
+    ])
+    # the directories, they are not repeated in the files
+    partitions = pa.schema([("year", pa.int32()), ("servicetypeid", pa.int64())])
+
+    return columns, partitions
+
+
+class AttendanceArchive:
+    """The archived attendance, written by the archive job and read by the reports"""
+    def __init__(self, directory: str = ARCHIVE_DIR, after_days: float = ARCHIVE_AFTER_DAYS,
+                 batch_size: int = ARCHIVE_BATCH_SIZE, compression: str = ARCHIVE_COMPRESSION) -> None:
+        self.root: str = os.path.join(directory, "attendance")
+        self.after: timedelta = timedelta(days=after_days)
+        self.batch_size: int = batch_size
+        self.compression: str = compression
+        self.archived: int = 0
+        self.__manifest: str = os.path.join(self.root, "_batches")
+        # (mtime of the manifest directory, files it lists), reread when a batch is recorded
+        self.__files: tuple[int, list[str]] = (-1, [])
+
+    @property
+    def available(self) -> bool:
+        return pa is not None
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """one archive run at a time, the recovery would take the files of a running batch for orphans
+
+        Raises:
+            RuntimeError: raise if another run holds the lock
+        """
+        os.makedirs(self.root, exist_ok=True)
+
+        with open(os.path.join(self.root, ".lock"), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RuntimeError(f"another archive run holds {self.root}") from None
+
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def recover(self, session: Session) -> int:
+        """settle the files of the batches a previous run left outside of the manifest, under lock()
+
+        Args:
+            session (Session): session to look for the rows of the batches
+
+        Returns:
+            int: batches recorded or deleted
+        """
+        if not self.available or not os.path.isdir(self.root):
+            return 0
+
+        recorded: set[str] = {path for _, path in self.__recorded()}
+        orphans: defaultdict[str, list[str]] = defaultdict(list)
+
+        for directory, directories, names in os.walk(self.root):
+            # the manifest and the lock
+            directories[:] = [name for name in directories if not name.startswith(("_", "."))]
+
+            for name in names:
+                path: str = os.path.join(directory, name)
+
+                if name.startswith(".part-") and name.endswith(".partial"):
+                    os.remove(path)
+                elif (match := _FILE_NAME.match(name)) and os.path.relpath(path, self.root) not in recorded:
+                    orphans[match.group(1)].append(os.path.relpath(path, self.root))
+
+        for name, files in orphans.items():
+            ids: list[int] = []
+
+            for file in files:
+                ids += pq.read_table(os.path.join(self.root, file), columns=["id"]).column("id").to_pylist()
+
+            if self.__in_table(session, ids):
+                # the batch did not commit, its rows are archived again by this run
+                for file in files:
+                    os.remove(os.path.join(self.root, file))
+
+                logger.warning("deleted the %d file(s) of the uncommitted batch %s", len(files), name)
+            else:
+                self.__record(ArchiveBatch(name, len(ids), min(ids, default=0), max(ids, default=0), tuple(sorted(files))))
+                logger.warning("recorded the committed batch %s missing from the manifest", name)
+
+        return len(orphans)
+
+    def record(self, batch: ArchiveBatch) -> None:
+        """add a batch to the manifest once its transaction committed, the reports count it from then on
+
+        Args:
+            batch (ArchiveBatch): the batch of archive_batch
+        """
+        self.__record(batch)
+        self.archived += batch.rows
+
+    def archive_batch(self, session: Session) -> Optional[ArchiveBatch]:
+        """move the oldest batch of expired attendance to the archive, the caller commits and then records it
+
+        A batch that does not commit is settled by the recovery of the next run.
+
+        Args:
+            session (Session): session of the write
+
+        Raises:
+            RuntimeError: raise if pyarrow is not installed
+
+        Returns:
+            Optional[ArchiveBatch]: the files written, None when nothing is left to archive
+        """
+        if not self.available:
+            raise RuntimeError("archiving needs pyarrow, pip install pyarrow")
+
+        rows: Sequence[Any] = session.execute(
+            select(Attendance.id, Attendance.memberid, Attendance.serviceid, Attendance.attendancestatusid,
+                   Attendance.createdon, Attendance.modifiedon, Service.date_event, Service.servicetypeId)
+            .join(Service, Service.id == Attendance.serviceid)  # type: ignore
+            .where(Attendance.createdon < datetime.utcnow() - self.after)  # type: ignore
+            .order_by(Attendance.id)
+            .limit(self.batch_size)
+            # a batch is not changed between its files and its delete, the soft deleted services are history too
+            .with_for_update(of=Attendance)
+            .execution_options(include_deleted=True)
+        ).all()
+
+        if not rows:
+            return None
+
+        # unique, the rows of a batch that did not commit go to another batch
+        name: str = f"{rows[0].id}-{rows[-1].id}-{uuid.uuid4().hex[:8]}"
+        groups: defaultdict[tuple[int, int], list[Any]] = defaultdict(list)
+
+        for row in rows:
+            groups[(row.createdon.year, row.servicetypeId)].append(row)
+
+        files: tuple[str, ...] = tuple(self.__write(name, year, servicetypeid, group)
+                                       for (year, servicetypeid), group in groups.items())
+
+        session.execute(delete(Attendance).where(Attendance.id.in_([row.id for row in rows])))  # type: ignore
+
+        return ArchiveBatch(name, len(rows), rows[0].id, rows[-1].id, files)
+
+    def counts(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               servicetypeid: Optional[int] = None) -> dict[CountKey, int]:
+        """count the archived attendance per year, service type and attendance status
+
+        Args:
+            start (Optional[datetime], optional): created on or after. Defaults to None.
+            end (Optional[datetime], optional): created before. Defaults to None.
+            servicetypeid (Optional[int], optional): only this service type. Defaults to None.
+
+        Returns:
+            dict[CountKey, int]: count per (year, servicetypeid, attendancestatusid), empty without an archive
+        """
+        if not self.available or not os.path.isdir(self.root):
+            return {}
+
+        files: list[str] = self.__committed_files()
+
+        if not files:
+            return {}
+
+        _, partitions = _schemas()
+        dataset = ds.dataset(files, format="parquet", partitioning=ds.partitioning(partitions, flavor="hive"),
+                             partition_base_dir=self.root)
+
+        # the partition fields skip whole directories, createdon is checked in the remaining files
+        conditions: list[Any] = []
+
+        if start is not None:
+            conditions += [ds.field("year") >= start.year, ds.field("createdon") >= start]
+
+        if end is not None:
+            conditions += [ds.field("year") <= end.year, ds.field("createdon") < end]
+
+        if servicetypeid is not None:
+            conditions.append(ds.field("servicetypeid") == servicetypeid)
+
+        condition: Any = None
+
+        for part in conditions:
+            condition = part if condition is None else condition & part
+
+        keys: list[str] = ["year", "servicetypeid", "attendancestatusid"]
+        table = dataset.to_table(columns=[*keys, "id"], filter=condition)
+
+        if not table.num_rows:
+            return {}
+
+        grouped = table.group_by(keys).aggregate([("id", "count")])
+        columns: list[list[Any]] = [grouped.column(name).to_pylist() for name in (*keys, "id_count")]
+
+        return {(year, service_type, status): count for year, service_type, status, count in zip(*columns)}
+
+    def __committed_files(self) -> list[str]:
+        try:
+            modified: int = os.stat(self.__manifest).st_mtime_ns
+        except FileNotFoundError:
+            return []
+
+        if modified != self.__files[0]:
+            self.__files = (modified, [os.path.join(self.root, path) for _, path in self.__recorded()])
+
+        return self.__files[1]
+
+    def __recorded(self) -> list[tuple[str, str]]:
+        # (batch, file) of every batch in the manifest
+        if not os.path.isdir(self.__manifest):
+            return []
+
+        recorded: list[tuple[str, str]] = []
+
+        for entry in sorted(os.listdir(self.__manifest)):
+            if entry.startswith(".") or not entry.endswith(".json"):
+                continue
+
+            with open(os.path.join(self.__manifest, entry)) as manifest:
+                batch: dict[str, Any] = json.load(manifest)
+
+            recorded += [(batch["name"], path) for path in batch["files"]]
+
+        return recorded
+
+    def __record(self, batch: ArchiveBatch) -> None:
+        os.makedirs(self.__manifest, exist_ok=True)
+        path: str = os.path.join(self.__manifest, f"{batch.name}.json")
+        partial: str = os.path.join(self.__manifest, f".{batch.name}.json.partial")
+
+        with open(partial, "w") as output:
+            json.dump({"name": batch.name, "rows": batch.rows, "first_id": batch.first_id, "last_id": batch.last_id,
+                       "files": list(batch.files)}, output)
+            output.flush()
+            os.fsync(output.fileno())
+
+        os.replace(partial, path)
+
+    @staticmethod
+    def __in_table(session: Session, ids: list[int]) -> bool:
+        for offset in range(0, len(ids), _RECOVER_CHUNK):
+            chunk: list[int] = ids[offset:offset + _RECOVER_CHUNK]
+
+            if session.execute(select(Attendance.id).where(Attendance.id.in_(chunk)).limit(1)).first():  # type: ignore
+                return True
+
+        return False
+
+    def __write(self, batch: str, year: int, servicetypeid: int, rows: list[Any]) -> str:
+        columns, _ = _schemas()
+        directory: str = os.path.join(self.root, f"year={year}", f"servicetypeid={servicetypeid}")
+        name: str = f"part-{batch}.parquet"
+        # the dot keeps a partial file out of the reads, they skip hidden files
+        partial: str = os.path.join(directory, f".{name}.partial")
+
+        os.makedirs(directory, exist_ok=True)
+
+        table = pa.table({
+            "id": [row.id for row in rows],
+            "memberid": [row.memberid for row in rows],
+            "serviceid": [row.serviceid for row in rows],
+            "attendancestatusid": [row.attendancestatusid for row in rows],
+            "createdon": [row.createdon for row in rows],
+            "modifiedon": [row.modifiedon for row in rows],
+            "servicedate": [row.date_event for row in rows],
+        }, schema=columns)
+
+        with open(partial, "wb") as output:
+            pq.write_table(table, output, compression=self.compression)
+            output.flush()
+            # on disk before the rows leave the table
+            os.fsync(output.fileno())
+
+        os.replace(partial, os.path.join(directory, name))
+
+        return os.path.relpath(os.path.join(directory, name), self.root)
+
+
+attendance_archive: AttendanceArchive = AttendanceArchive()
@@ -0,0 +1,265 @@
+"""Audit log of every insert, update and delete made through db.run_write.
+
+The changes are described inside the write transaction, from the
+attribute history of the session, but only handed to the AuditBuffer once
+the write committed. The buffer keeps them in memory and a background task
+inserts them in batches, so a request never waits on the audit insert.
+
+Loss is bounded: a crash loses at most what arrived since the last flush
+(AUDIT_FLUSH_SECONDS, or AUDIT_BATCH_SIZE entries, whichever comes first).
+A failed flush keeps its batch for the next one. When the database stays
+away long enough for AUDIT_BUFFER_SIZE entries to pile up, the oldest are
+dropped and counted on /metrics rather than growing without bound. The
+app drains the buffer when it shuts down.
+"""
+from collections import deque
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from utils.metrics import Counter, Gauge, registry
+
+import asyncio
+import logging
+import os
+import threading
+
+
+logger: logging.Logger = logging.getLogger("makarios.audit")
+
+AUDIT_ENABLED: bool = os.getenv("AUDIT_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_SECONDS: float = float(os.getenv("AUDIT_FLUSH_SECONDS", "1"))
+AUDIT_BUFFER_SIZE: int = int(os.getenv("AUDIT_BUFFER_SIZE", "50000"))
+
+# written as a marker only, the value itself never reaches the audit table
+REDACTED_FIELDS: frozenset[str] = frozenset({"password"})
+
+# the audit table does not audit itself, the tombstones repeat the deletes it has
+SKIPPED_TABLES: frozenset[str] = frozenset({"audit_log", "deletion_log"})
+
+AuditRow = dict[str, Any]
+
+audit_written: Counter = registry.register(Counter(
+    "audit_entries_written_total", "Audit entries inserted into audit_log"))
+audit_dropped: Counter = registry.register(Counter(
+    "audit_entries_dropped_total", "Audit entries lost because the buffer was full"))
+
+
+def _plain(value: Any) -> Any:
+    """a json friendly copy of a column value, binary data is only described"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(bytes(value))} bytes>"
+
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+
+    if isinstance(value, Decimal):
+        return str(value)
+
+    return value
+
+
+def _field(key: str, value: Any) -> Any:
+    return "<redacted>" if key in REDACTED_FIELDS else _plain(value)
+
+
+def _row_id(instance: Any) -> Optional[int]:
+    identity: Optional[tuple[Any, ...]] = inspect(instance).identity
+    return identity[0] if identity and len(identity) == 1 and isinstance(identity[0], int) else None
+
+
+def _values(instance: Any) -> dict[str, Any]:
+    return {attribute.key: _field(attribute.key, getattr(instance, attribute.key))
+            for attribute in inspect(instance).mapper.column_attrs}
+
+
+def _changes(instance: Any) -> tuple[dict[str, Any], dict[str, Any]]:
+    before: dict[str, Any] = {}
+    after: dict[str, Any] = {}
+    state = inspect(instance)
+
+    for attribute in state.mapper.column_attrs:
+        history = state.attrs[attribute.key].history
+
+        if history.has_changes():
+            before[attribute.key] = _field(attribute.key, history.deleted[0] if history.deleted else None)
+            after[attribute.key] = _field(attribute.key, history.added[0] if history.added else None)
+
+    return before, after
+
+
+def collect(session: Session, actor_id: Optional[int]) -> list[AuditRow]:
+    """flush the pending changes of a session and describe them
+
+    Called by the write work before it returns, while the old values are
+    still in the attribute history.
+
+    Args:
+        session (Session): session holding the changes
+        actor_id (Optional[int]): user who made them
+
+    Returns:
+        list[AuditRow]: rows of the audit table, in the order of the changes
+    """
+    inserted: list[Any] = [instance for instance in session.new if instance.__table__.name not in SKIPPED_TABLES]
+    updated: list[tuple[Any, dict[str, Any], dict[str, Any]]] = []
+    deleted: list[tuple[str, Optional[int], dict[str, Any]]] = []
+
+    for instance in session.dirty:
+        if instance.__table__.name in SKIPPED_TABLES or not session.is_modified(instance):
+            continue
+
+        before, after = _changes(instance)
+
+        if after:
+            updated.append((instance, before, after))
+
+    for instance in session.deleted:
+        if instance.__table__.name not in SKIPPED_TABLES:
+            deleted.append((instance.__table__.name, _row_id(instance), _values(instance)))
+
+    # the ids of the inserts and the defaults are known after the flush
+    session.flush()
+
+    occurredon: datetime = datetime.utcnow()
+    rows: list[AuditRow] = []
+
+    def row(action: str, table: str, row_id: Optional[int], before: Optional[dict[str, Any]],
+            after: Optional[dict[str, Any]]) -> AuditRow:
+        return {"occurredon": occurredon, "actor_id": actor_id, "action": action, "table_name": table,
+                "row_id": row_id, "before": before, "after": after}
+
+    rows.extend(row("insert", instance.__table__.name, _row_id(instance), None, _values(instance)) for instance in inserted)
+    # setting deletedon is the delete of a soft deleted entity
+    rows.extend(row("delete" if before.get("deletedon", 0) is None and after.get("deletedon") else "update",
+                    instance.__table__.name, _row_id(instance), before, after) for instance, before, after in updated)
+    rows.extend(row("delete", table, row_id, values, None) for table, row_id, values in deleted)
+
+    return rows
+
+
+class AuditBuffer:
+    """Audit rows waiting to be inserted, flushed in batches by a background task"""
+    def __init__(self, batch_size: int = 500, flush_seconds: float = 1.0, max_size: int = 50000) -> None:
+        self.batch_size: int = batch_size
+        self.flush_seconds: float = flush_seconds
+        self.max_size: int = max_size
+        self.dropped: int = 0
+        self.__rows: deque[AuditRow] = deque()
+        self.__lock: threading.Lock = threading.Lock()
+        self.__wake: Optional[asyncio.Event] = None
+        self.__task: Optional[asyncio.Task] = None
+        self.__write: Optional[Callable[[list[AuditRow]], Awaitable[Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self.__rows)
+
+    def record(self, rows: Iterable[AuditRow]) -> None:
+        """queue committed changes
+
+        Args:
+            rows (Iterable[AuditRow]): rows built by collect
+        """
+        with self.__lock:
+            self.__rows.extend(rows)
+            overflow: int = len(self.__rows) - self.max_size
+
+            for _ in range(max(overflow, 0)):
+                self.__rows.popleft()
+
+            full: bool = len(self.__rows) >= self.batch_size
+
+        if overflow > 0:
+            self.dropped += overflow
+            audit_dropped.inc(amount=overflow)
+            logger.error("audit buffer full, dropped the %d oldest entries", overflow)
+
+        if full and self.__wake is not None:
+            self.__wake.set()
+
+    def start(self, write: Callable[[list[AuditRow]], Awaitable[Any]]) -> None:
+        """start the background flush, called from the lifespan
+
+        Args:
+            write (Callable[[list[AuditRow]], Awaitable[Any]]): inserts a batch and commits it
+        """
+        self.__write = write
+        self.__wake = asyncio.Event()
+        self.__task = asyncio.get_running_loop().create_task(self.__run(), name="audit-flush")
+
+    async def stop(self) -> None:
+        """stop the background flush and write what is left"""
+        if self.__task is not None:
+            self.__task.cancel()
+
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+            self.__task = None
+
+        while len(self.__rows) and await self.flush():
+            pass
+
+        if len(self.__rows):
+            logger.error("%d audit entries could not be written before shutting down", len(self.__rows))
+
+    async def flush(self) -> bool:
+        """insert one batch
+
+        Returns:
+            bool: False if the batch could not be written, it is then kept for the next flush
+        """
+        if self.__write is None:
+            return False
+
+        with self.__lock:
+            batch: list[AuditRow] = [self.__rows.popleft() for _ in range(min(self.batch_size, len(self.__rows)))]
+
+        if not batch:
+            return True
+
+        try:
+            await self.__write(batch)
+        except Exception:
+            logger.exception("could not write %d audit entries, retrying on the next flush", len(batch))
+
+            with self.__lock:
+                # back in front, in their order, the oldest go if newer entries filled the buffer meanwhile
+                lost: int = max(len(batch) - (self.max_size - len(self.__rows)), 0)
+                self.__rows.extendleft(reversed(batch[lost:]))
+
+            if lost:
+                self.dropped += lost
+                audit_dropped.inc(amount=lost)
+
+            return False
+
+        audit_written.inc(amount=len(batch))
+
+        return True
+
+    async def __run(self) -> None:
+        assert self.__wake is not None
+
+        while True:
+            try:
+                await asyncio.wait_for(self.__wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+            self.__wake.clear()
+
+            # drain whole batches, stop early when the database refuses them
+            while len(self.__rows) and await self.flush():
+                if len(self.__rows) < self.batch_size:
+                    break
+
+
+audit_buffer: AuditBuffer = AuditBuffer(AUDIT_BATCH_SIZE, AUDIT_FLUSH_SECONDS, AUDIT_BUFFER_SIZE)
+
+audit_pending: Gauge = registry.register(Gauge(
+    "audit_entries_pending", "Audit entries waiting in the buffer", collect=lambda: len(audit_buffer)))
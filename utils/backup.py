@@ -0,0 +1,202 @@
+"""Online backups of the database while the API keeps serving.
+
+SQLite: the backup API copies BACKUP_PAGES_PER_STEP pages at a time and
+sleeps BACKUP_STEP_SLEEP_MS between the steps, a check-in only ever waits
+on one short step. In WAL mode the copy reads inside one read transaction,
+the writes carry on meanwhile and do not restart it, the backup is the
+database as of its start. The WAL cannot be checkpointed past that
+snapshot until the copy is done. With a rollback journal a read
+transaction would hold its shared lock and block every writer for the
+whole copy, so each step reads on its own and a write in between restarts
+the copy instead. The copy goes to a temporary file and is then streamed
+gzip compressed.
+
+Postgres: pg_dump in its custom format, already compressed, reads one MVCC
+snapshot and only takes ACCESS SHARE locks, it never blocks a writer. Its
+output is read BACKUP_CHUNK_SIZE bytes at a time with the same sleep in
+between, pg_dump waits while the pipe is full.
+"""
+from datetime import datetime
+from typing import IO, Iterator, Optional
+from sqlalchemy.engine import URL, make_url
+
+import logging
+import os
+import sqlite3
+import subprocess
+import tempfile
+import time
+import zlib
+
+
+logger: logging.Logger = logging.getLogger("makarios.backup")
+
+BACKUP_PAGES_PER_STEP: int = int(os.getenv("BACKUP_PAGES_PER_STEP", "1024"))
+BACKUP_STEP_SLEEP_MS: float = float(os.getenv("BACKUP_STEP_SLEEP_MS", "20"))
+BACKUP_CHUNK_SIZE: int = int(os.getenv("BACKUP_CHUNK_SIZE", str(1024 * 1024)))
+BACKUP_COMPRESSION_LEVEL: int = int(os.getenv("BACKUP_COMPRESSION_LEVEL", "6"))
+# where the SQLite copy is made before it is compressed, the system temp directory by default
+BACKUP_TMP_DIR: Optional[str] = os.getenv("BACKUP_TMP_DIR") or None
+PG_DUMP_PATH: str = os.getenv("PG_DUMP_PATH", "pg_dump")
+# give up rather than queue behind a migration, a waiting lock would block the writers behind it
+BACKUP_LOCK_WAIT_SECONDS: int = int(os.getenv("BACKUP_LOCK_WAIT_SECONDS", "10"))
+
+
+class Backup:
+    """A compressed snapshot of one database"""
+    def __init__(self, url: str, pages_per_step: int = BACKUP_PAGES_PER_STEP,
+                 step_sleep_ms: float = BACKUP_STEP_SLEEP_MS, chunk_size: int = BACKUP_CHUNK_SIZE) -> None:
+        self.url: URL = make_url(url)
+        self.dialect: str = self.url.get_backend_name()
+        self.pages_per_step: int = pages_per_step
+        self.step_sleep: float = step_sleep_ms / 1000
+        self.chunk_size: int = chunk_size
+
+        if self.dialect == "sqlite" and self.url.database in (None, "", ":memory:"):
+            raise ValueError("an in memory SQLite database cannot be backed up")
+
+        if self.dialect not in ("sqlite", "postgresql"):
+            raise ValueError(f"backups of {self.dialect} are not supported")
+
+    @property
+    def file_name(self) -> str:
+        suffix: str = ".sqlite3.gz" if self.dialect == "sqlite" else ".dump"
+        return f"makarios-{datetime.utcnow():%Y%m%dT%H%M%SZ}{suffix}"
+
+    @property
+    def media_type(self) -> str:
+        return "application/gzip" if self.dialect == "sqlite" else "application/octet-stream"
+
+    def open(self) -> Iterator[bytes]:
+        """take the snapshot, blocking, call it from a thread
+
+        The SQLite copy is complete when this returns, pg_dump is started and
+        a failure to connect shows here rather than halfway through a response.
+
+        Returns:
+            Iterator[bytes]: the compressed snapshot
+        """
+        if self.dialect == "sqlite":
+            return self.__sqlite()
+
+        return self.__pg_dump()
+
+    def write(self, path: str) -> int:
+        """write the snapshot to a file, the file only appears once complete
+
+        Args:
+            path (str): file to write
+
+        Returns:
+            int: bytes written
+        """
+        written: int = 0
+        partial: str = f"{path}.partial"
+
+        try:
+            with open(partial, "wb") as output:
+                for chunk in self.open():
+                    output.write(chunk)
+                    written += len(chunk)
+
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+        return written
+
+    def __sqlite(self) -> Iterator[bytes]:
+        started: float = time.perf_counter()
+        descriptor, copy_path = tempfile.mkstemp(suffix=".sqlite3", dir=BACKUP_TMP_DIR)
+        os.close(descriptor)
+
+        try:
+            source: sqlite3.Connection = sqlite3.connect(f"file:{self.url.database}?mode=ro", uri=True,
+                                                         isolation_level=None)
+            target: sqlite3.Connection = sqlite3.connect(copy_path)
+
+            try:
+                # the snapshot only leaves the writers alone in WAL mode
+                snapshot_held: bool = source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+
+                if snapshot_held:
+                    # every step reads the snapshot instead of the newest commit
+                    source.execute("BEGIN")
+                    source.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+
+                source.backup(target, pages=self.pages_per_step, progress=self.__pause)
+
+                if snapshot_held:
+                    source.execute("COMMIT")
+            finally:
+                target.close()
+                source.close()
+
+            snapshot: IO[bytes] = open(copy_path, "rb")
+        finally:
+            # the open file stays readable, nothing is left behind if the stream is abandoned
+            os.remove(copy_path)
+
+        logger.info("sqlite snapshot copied in %.1fs", time.perf_counter() - started)
+
+        return self.__gzip(snapshot)
+
+    def __pause(self, status: int, remaining: int, total: int) -> None:
+        if remaining and self.step_sleep:
+            time.sleep(self.step_sleep)
+
+    def __gzip(self, snapshot: IO[bytes]) -> Iterator[bytes]:
+        compressor = zlib.compressobj(BACKUP_COMPRESSION_LEVEL, zlib.DEFLATED, 31)  # 31 writes the gzip format
+
+        with snapshot:
+            while chunk := snapshot.read(self.chunk_size):
+                if compressed := compressor.compress(chunk):
+                    yield compressed
+
+        yield compressor.flush()
+
+    def __pg_dump(self) -> Iterator[bytes]:
+        environment: dict[str, str] = dict(os.environ)
+
+        # the password goes through the environment, not the process list
+        if self.url.password is not None:
+            environment["PGPASSWORD"] = str(self.url.password)
+
+        dsn: str = self.url.set(drivername="postgresql", password=None).render_as_string(hide_password=False)
+
+        process: subprocess.Popen = subprocess.Popen(
+            [PG_DUMP_PATH, "--format=custom", "--no-password", f"--lock-wait-timeout={BACKUP_LOCK_WAIT_SECONDS}s",
+             f"--dbname={dsn}"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=environment
+        )
+
+        assert process.stdout is not None
+        first: bytes = process.stdout.read(self.chunk_size)
+
+        if not first and process.wait() != 0:
+            raise RuntimeError(f"pg_dump failed: {process.stderr.read().decode(errors='replace').strip()}")  # type: ignore
+
+        return self.__pg_chunks(process, first)
+
+    def __pg_chunks(self, process: subprocess.Popen, first: bytes) -> Iterator[bytes]:
+        assert process.stdout is not None and process.stderr is not None
+
+        try:
+            chunk: bytes = first
+
+            while chunk:
+                yield chunk
+
+                if self.step_sleep:
+                    time.sleep(self.step_sleep)
+
+                chunk = process.stdout.read(self.chunk_size)
+
+            if process.wait() != 0:
+                raise RuntimeError(f"pg_dump failed: {process.stderr.read().decode(errors='replace').strip()}")
+        finally:
+            # an abandoned stream stops the dump
+            if process.poll() is None:
+                process.kill()
+                process.wait()
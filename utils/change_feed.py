@@ -0,0 +1,169 @@
+"""Change feeds for the consumers mirroring a table.
+
+A feed returns the rows inserted or updated after a watermark, in the
+order of COALESCE(modifiedon, createdon) then id, followed in time by the
+tombstones of the deleted rows. The watermark of the last change of a page
+is handed back; passing it as ?since= continues right after it, so a
+consumer syncs in the number of changes and never rereads the table.
+
+The timestamps are set by the workers before the commit, so a row can
+commit a moment after a later timestamp was already served. A feed only
+returns changes older than CHANGES_SETTLE_SECONDS, which must be longer
+than the slowest write takes to commit.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Sequence
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.sql import Select
+from sqlmodel import Session
+from entities.deletion_entity import DeletionLog
+from enums.enums import SuccessMessage
+from validators.filters.projection import Projection
+
+import base64
+import os
+
+
+CHANGES_SETTLE_SECONDS: float = float(os.getenv("CHANGES_SETTLE_SECONDS", "5"))
+
+# largest page a consumer can ask for
+CHANGES_PAGE_MAX: int = int(os.getenv("CHANGES_PAGE_MAX", "1000"))
+
+# at the same instant the upserts come before the tombstones
+UPSERT: int = 0
+DELETE: int = 1
+
+
+@dataclass(frozen=True, order=True)
+class Watermark:
+    """Position in a feed, the last change a consumer has seen"""
+    changedon: datetime
+    kind: int
+    id: int
+
+    def encode(self) -> str:
+        raw: str = f"{self.changedon.isoformat()}|{self.kind}|{self.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "Watermark":
+        """read a watermark handed out by a feed
+
+        Args:
+            token (str): the encoded watermark
+
+        Raises:
+            ValueError: raise if the token was not made by encode
+
+        Returns:
+            Watermark: the position
+        """
+        try:
+            changedon, kind, row_id = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode().split("|")
+            return cls(datetime.fromisoformat(changedon), int(kind), int(row_id))
+        except (ValueError, UnicodeDecodeError) as error:
+            raise ValueError(f"{token} is not a watermark") from error
+
+
+# the start of every feed
+START: Watermark = Watermark(datetime.min, UPSERT, 0)
+
+
+class ChangeFeed:
+    """The changes of one table, read through a projection"""
+    def __init__(self, entity: Any, projection: Projection, from_clause: Optional[Callable[[], Any]] = None,
+                 settle_seconds: float = CHANGES_SETTLE_SECONDS) -> None:
+        self.entity: Any = entity
+        self.table: str = entity.__table__.name
+        self.projection: Projection = projection
+        self.settle_seconds: float = settle_seconds
+        self.__from_clause: Optional[Callable[[], Any]] = from_clause
+        # the expression of the index ix_<table>_changedon
+        self.__changedon: Any = func.coalesce(entity.modifiedon, entity.createdon)
+
+    def since(self, since: Optional[str] = None) -> Watermark:
+        """FastAPI dependency reading ?since=
+
+        Args:
+            since (Optional[str], optional): watermark of the previous page. Defaults to None, the start.
+
+        Raises:
+            HTTPException: raise a 400 when the watermark cannot be read
+
+        Returns:
+            Watermark: the position to continue from
+        """
+        if not since:
+            return START
+
+        try:
+            return Watermark.decode(since)
+        except ValueError as error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+
+    def read(self, session: Session, since: Watermark, fields: Sequence[str], limit: int) -> dict[str, Any]:
+        """one page of changes after a watermark
+
+        Args:
+            session (Session): session
+            since (Watermark): last change the consumer has seen
+            fields (Sequence[str]): projected fields of the upserts
+            limit (int): changes per page
+
+        Returns:
+            dict[str, Any]: the Changes envelope, with the watermark of the next page
+        """
+        settled: datetime = datetime.utcnow() - timedelta(seconds=self.settle_seconds)
+        id_index: int = list(fields).index("id")
+
+        changes: list[tuple[Watermark, dict[str, Any]]] = []
+
+        for *values, changedon in session.exec(self.__upserts(since, fields, settled, limit + 1)).all():  # type: ignore
+            changes.append((Watermark(changedon, UPSERT, values[id_index]), {
+                "op": "upsert", "id": values[id_index], "changedon": changedon, "data": dict(zip(fields, values))
+            }))
+
+        for log_id, row_id, deletedon in session.exec(self.__tombstones(since, settled, limit + 1)).all():  # type: ignore
+            changes.append((Watermark(deletedon, DELETE, log_id), {
+                "op": "delete", "id": row_id, "changedon": deletedon, "data": None
+            }))
+
+        # both lists are cut at limit + 1, the first limit + 1 of the union are in them
+        changes.sort(key=lambda change: change[0])
+        page: list[tuple[Watermark, dict[str, Any]]] = changes[:limit]
+
+        return {
+            "success": True,
+            "message": SuccessMessage.OperationSuccessful.value,
+            "data": [change for _, change in page],
+            "watermark": (page[-1][0] if page else since).encode(),
+            "has_more": len(changes) > limit
+        }
+
+    def __upserts(self, since: Watermark, fields: Sequence[str], settled: datetime, limit: int) -> Select:
+        statement: Select = self.projection.select(fields).add_columns(self.__changedon)
+
+        if self.__from_clause is not None:
+            statement = statement.select_from(self.__from_clause())
+
+        after: Any = (
+            tuple_(self.__changedon, self.entity.id) > tuple_(since.changedon, since.id)
+            if since.kind == UPSERT else self.__changedon > since.changedon
+        )
+
+        return statement.where(after, self.__changedon <= settled).order_by(self.__changedon, self.entity.id).limit(limit)
+
+    def __tombstones(self, since: Watermark, settled: datetime, limit: int) -> Select:
+        after: Any = (
+            tuple_(DeletionLog.deletedon, DeletionLog.id) > tuple_(since.changedon, since.id)
+            if since.kind == DELETE else DeletionLog.deletedon >= since.changedon
+        )
+
+        return (
+            select(DeletionLog.id, DeletionLog.row_id, DeletionLog.deletedon)
+            .where(DeletionLog.table_name == self.table, after, DeletionLog.deletedon <= settled)
+            .order_by(DeletionLog.deletedon, DeletionLog.id)  # type: ignore
+            .limit(limit)
+        )
@@ -0,0 +1,333 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Iterable, Optional, TypeVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import json
+import logging
+import os
+import threading
+import time
+
+
+# recording is a dict lookup and a few additions without any lock. Handlers
+# run on the event loop, so lost updates from the thread pool are rare and
+# acceptable for monitoring
+LabelValues = tuple[str, ...]
+M = TypeVar("M", bound="Metric")
+
+logger: logging.Logger = logging.getLogger("makarios.metrics")
+
+# with several workers each one writes its metrics here and a scrape adds up all of them, serve.py sets it
+METRICS_DIR: str = os.getenv("METRICS_DIR", "")
+METRICS_DUMP_SECONDS: float = float(os.getenv("METRICS_DUMP_SECONDS", "5"))
+
+DEFAULT_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS: tuple[float, ...] = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs: list[str] = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(ABC):
+    kind: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: tuple[str, ...] = tuple(labelnames)
+
+        self.values: dict[LabelValues, Any] = {}
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def sample(self) -> dict[LabelValues, Any]:
+        """a copy of the values, safe to read off the event loop"""
+        return dict(self.values)
+
+    def merge(self, total: dict[LabelValues, Any], values: dict[LabelValues, Any]) -> None:
+        """add the values of another worker to a total"""
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0.0) + value
+
+    @abstractmethod
+    def render(self, values: Optional[dict[LabelValues, Any]] = None) -> list[str]:
+        ...
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self, values: Optional[dict[LabelValues, Any]] = None) -> list[str]:
+        values = self.values if values is None else values
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 collect: Optional[Callable[[], float]] = None, aggregate: str = "sum") -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {}
+        self.collect: Optional[Callable[[], float]] = collect
+        # how the workers add up, "sum" or "max" for the ones they all share, e.g. a time measured in the master
+        self.aggregate: str = aggregate
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) - amount
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+    def sample(self) -> dict[LabelValues, Any]:
+        # gauges read at scrape time, e.g. the state of the pool
+        if self.collect is not None:
+            self.values[()] = float(self.collect())
+
+        return dict(self.values)
+
+    def merge(self, total: dict[LabelValues, Any], values: dict[LabelValues, Any]) -> None:
+        if self.aggregate != "max":
+            super().merge(total, values)
+            return
+
+        for labels, value in values.items():
+            total[labels] = max(total.get(labels, value), value)
+
+    def render(self, values: Optional[dict[LabelValues, Any]] = None) -> list[str]:
+        values = self.sample() if values is None else values
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets: tuple[float, ...] = buckets
+        # per labels: a count per bucket plus +Inf, then the sum
+        self.values: dict[LabelValues, list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series: Optional[list[float]] = self.values.get(labels)
+
+        if series is None:
+            series = self.values[labels] = [0.0] * (len(self.buckets) + 2)
+
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def sample(self) -> dict[LabelValues, Any]:
+        return {labels: list(series) for labels, series in dict(self.values).items()}
+
+    def merge(self, total: dict[LabelValues, Any], values: dict[LabelValues, Any]) -> None:
+        for labels, series in values.items():
+            current: Optional[list[float]] = total.get(labels)
+            total[labels] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, values: Optional[dict[LabelValues, Any]] = None) -> list[str]:
+        lines: list[str] = self.header()
+
+        for key, series in (self.values if values is None else values).items():
+            cumulative: float = 0.0
+
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                le: str = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_label: str = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, bucket_label)} {cumulative}")
+
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+
+        return lines
+
+
+class Registry:
+    """The metrics of this process. With a directory set every worker writes
+    its values there and a scrape, served by any of them, renders the sum.
+    """
+    def __init__(self, directory: str = "") -> None:
+        self.metrics: list[Metric] = []
+        self.directory: str = directory
+        self.__thread: Optional[threading.Thread] = None
+
+    def register(self, metric: M) -> M:
+        self.metrics.append(metric)
+        return metric
+
+    def reset(self) -> None:
+        """forget the counts, a new worker starts from zero instead of the copy of the master"""
+        for metric in self.metrics:
+            # the gauges keep what the master measured, e.g. the startup
+            if not isinstance(metric, Gauge):
+                metric.values.clear()
+
+    def render(self) -> str:
+        """render all metrics in the Prometheus text format
+
+        Returns:
+            str: the exposition text
+        """
+        lines: list[str] = []
+
+        if not self.directory:
+            for metric in self.metrics:
+                lines.extend(metric.render())
+
+            return "\n".join(lines) + "\n"
+
+        totals: dict[str, dict[LabelValues, Any]] = {metric.name: metric.sample() for metric in self.metrics}
+
+        for values in self.__other_workers():
+            for metric in self.metrics:
+                metric.merge(totals[metric.name], values.get(metric.name, {}))
+
+        for metric in self.metrics:
+            lines.extend(metric.render(totals[metric.name]))
+
+        return "\n".join(lines) + "\n"
+
+    def start_dumping(self, interval: float = METRICS_DUMP_SECONDS) -> None:
+        """write the values of this worker to the directory every interval seconds, called in every worker
+
+        Args:
+            interval (float, optional): seconds between writes. Defaults to METRICS_DUMP_SECONDS.
+        """
+        if not self.directory or self.__thread is not None:
+            return
+
+        def dump_forever() -> None:
+            while True:
+                try:
+                    self.dump()
+                except OSError:
+                    logger.exception("could not write the metrics of worker %s", os.getpid())
+
+                time.sleep(interval)
+
+        self.__thread = threading.Thread(target=dump_forever, name="metrics-dump", daemon=True)
+        self.__thread.start()
+
+    def dump(self) -> None:
+        """write the values of this worker, the file is replaced in one step"""
+        values: dict[str, list[Any]] = {
+            metric.name: [[list(labels), value] for labels, value in metric.sample().items()] for metric in self.metrics
+        }
+        path: str = os.path.join(self.directory, f"{os.getpid()}.json")
+        os.makedirs(self.directory, exist_ok=True)
+
+        with open(f"{path}.partial", "w") as output:
+            json.dump(values, output)
+
+        os.replace(f"{path}.partial", path)
+
+    def __other_workers(self) -> list[dict[str, dict[LabelValues, Any]]]:
+        workers: list[dict[str, dict[LabelValues, Any]]] = []
+
+        for name in os.listdir(self.directory):
+            pid, _, extension = name.partition(".")
+
+            if extension != "json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+
+            path: str = os.path.join(self.directory, name)
+
+            # a worker that exited, its counters restart with its replacement
+            if not _alive(int(pid)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:  # removed by another scrape
+                    pass
+
+                continue
+
+            try:
+                with open(path) as worker_file:
+                    values: dict[str, list[Any]] = json.load(worker_file)
+            except (OSError, ValueError):
+                continue
+
+            workers.append({metric: {tuple(labels): value for labels, value in series} for metric, series in values.items()})
+
+        return workers
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+registry: Registry = Registry(METRICS_DIR)
+
+request_duration: Histogram = registry.register(Histogram(
+    "http_request_duration_seconds", "Latency of the requests per route", ("method", "route", "status")))
+requests_in_flight: Gauge = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being served"))
+response_size: Histogram = registry.register(Histogram(
+    "http_response_size_bytes", "Size of the response bodies per route", ("method", "route"), buckets=SIZE_BUCKETS))
+pool_checkouts: Counter = registry.register(Counter(
+    "db_pool_checkouts_total", "Connections checked out of the pool"))
+password_hash_duration: Histogram = registry.register(Histogram(
+    "auth_password_hash_seconds", "Time spent hashing and verifying passwords", ("operation",)))
+jwt_decode_failures: Counter = registry.register(Counter(
+    "auth_jwt_decode_failures_total", "Tokens that could not be decoded in get_current_user"))
+
+
+def instrument_pool(engine: Engine) -> None:
+    """count the checkouts of the pool and expose its state at scrape time
+
+    Args:
+        engine (Engine): the engine whose pool is watched
+    """
+    if event.contains(engine, "checkout", _on_checkout):
+        return
+
+    event.listen(engine, "checkout", _on_checkout)
+
+    pool = engine.pool
+
+    # not every pool class keeps these numbers (e.g. the sqlite memory pools)
+    for name, documentation, attribute in (
+        ("db_pool_checked_out", "Connections currently checked out", "checkedout"),
+        ("db_pool_overflow", "Connections opened above the pool size", "overflow"),
+        ("db_pool_size", "Configured size of the pool", "size"),
+    ):
+        reader: Optional[Callable[[], float]] = getattr(pool, attribute, None)
+
+        if reader is not None:
+            registry.register(Gauge(name, documentation, collect=reader))
+
+
+def _on_checkout(dbapi_connection: object, connection_record: object, connection_proxy: object) -> None:
+    pool_checkouts.inc()
@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import Any, Callable
+from fastapi import FastAPI
+
+import fastapi
+import hashlib
+import logging
+import orjson
+import os
+
+
+logger: logging.Logger = logging.getLogger("makarios.startup")
+
+OPENAPI_CACHE_PATH: str = os.getenv("OPENAPI_CACHE_PATH", "")
+
+ROOT: Path = Path(__file__).resolve().parent.parent
+
+# the schema is generated from the routes and the models of these packages
+SOURCE_DIRS: tuple[str, ...] = ("routers", "entities", "dto", "enums")
+
+
+def schema_fingerprint(app: FastAPI) -> str:
+    """fingerprint of everything the OpenAPI schema is built from
+
+    Args:
+        app (FastAPI): the app
+
+    Returns:
+        str: changes whenever a route, a model or the FastAPI version changes
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{fastapi.__version__} {app.title} {app.version}".encode())
+
+    for route in app.routes:
+        methods: list[str] = sorted(getattr(route, "methods", None) or ())
+        digest.update(f"{methods} {getattr(route, 'path', '')} {getattr(route, 'name', '')}".encode())
+
+    for directory in SOURCE_DIRS:
+        for path in sorted((ROOT / directory).rglob("*.py")):
+            digest.update(str(path.relative_to(ROOT)).encode())
+            digest.update(path.read_bytes())
+
+    return digest.hexdigest()
+
+
+def install_openapi_cache(app: FastAPI, path: str) -> None:
+    """serve the OpenAPI schema from a file, rebuilding it when the code changed
+
+    Args:
+        app (FastAPI): the app
+        path (str): file holding the schema and its fingerprint
+    """
+    build: Callable[[], dict[str, Any]] = app.openapi
+    cache_file: Path = Path(path)
+
+    def openapi() -> dict[str, Any]:
+        if app.openapi_schema:
+            return app.openapi_schema
+
+        fingerprint: str = schema_fingerprint(app)
+
+        try:
+            cached: dict[str, Any] = orjson.loads(cache_file.read_bytes())
+
+            if cached.get("fingerprint") == fingerprint:
+                app.openapi_schema = cached["schema"]
+                return app.openapi_schema
+        except (OSError, ValueError, KeyError):
+            pass
+
+        schema: dict[str, Any] = build()
+
+        try:
+            # write then rename, a worker reading at the same time never sees half a file
+            partial: Path = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            partial.write_bytes(orjson.dumps({"fingerprint": fingerprint, "schema": schema}))
+            os.replace(partial, cache_file)
+        except OSError:
+            logger.warning("could not write the OpenAPI cache to %s", cache_file, exc_info=True)
+
+        return schema
+
+    app.openapi = openapi  # type: ignore
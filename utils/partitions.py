@@ -0,0 +1,235 @@
+"""Monthly partitions of attendance on Postgres.
+
+Migration 0007 partitions attendance by createdon month. The
+PartitionManager creates the partitions of the next
+ATTENDANCE_PARTITIONS_AHEAD months before a check-in needs them, rows of
+a month without a partition would go to attendance_default. Should that
+happen anyway, the month is created from the default partition: it is
+detached, the month created, its rows moved over and the default attached
+again, all in the maintenance transaction, with a warning. It drops the
+months that ended before ATTENDANCE_PARTITION_RETENTION_MONTHS, when set,
+and the months left empty by the archive job. A dropped month is gone at
+once, no DELETE and no vacuum.
+
+Postgres only reads the partitions a query can match when the query
+bounds createdon itself, see created_between. SQLite has the single table
+and no manager.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import asyncio
+import logging
+import os
+import re
+
+
+logger: logging.Logger = logging.getLogger("makarios.partitions")
+
+ATTENDANCE_PARTITIONS_AHEAD: int = int(os.getenv("ATTENDANCE_PARTITIONS_AHEAD", "3"))
+# 0 keeps every month that still has rows
+ATTENDANCE_PARTITION_RETENTION_MONTHS: int = int(os.getenv("ATTENDANCE_PARTITION_RETENTION_MONTHS", "0"))
+ATTENDANCE_PARTITION_INTERVAL_SECONDS: float = float(os.getenv("ATTENDANCE_PARTITION_INTERVAL_SECONDS", "3600"))
+
+# a partition is created or dropped under a lock on attendance, give up rather than stall the check-ins
+PARTITION_LOCK_TIMEOUT: str = os.getenv("PARTITION_LOCK_TIMEOUT", "2s")
+
+# any constant works, one worker maintains the partitions at a time
+_PARTITION_LOCK_ID: int = 7_210_393
+
+_MONTH_NAME: re.Pattern[str] = re.compile(r"^attendance_p(\d{4})(\d{2})$")
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index: int = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def created_between(column: Any, start: Optional[datetime], end: Optional[datetime]) -> list[Any]:
+    """the createdon bounds of a query, Postgres prunes the months outside of them
+
+    Args:
+        column (Any): the createdon column
+        start (Optional[datetime]): created on or after, None for no bound
+        end (Optional[datetime]): created before, None for no bound
+
+    Returns:
+        list[Any]: conditions for where()
+    """
+    conditions: list[Any] = []
+
+    if start is not None:
+        conditions.append(column >= start)
+
+    if end is not None:
+        conditions.append(column < end)
+
+    return conditions
+
+
+class PartitionManager:
+    """Creates the coming months of attendance and drops the expired ones"""
+    def __init__(self, ahead: int = 3, retention_months: int = 0, archive_after: Optional[timedelta] = None,
+                 interval_seconds: float = 3600) -> None:
+        self.ahead: int = ahead
+        self.retention_months: int = retention_months
+        self.archive_after: Optional[timedelta] = archive_after
+        self.interval_seconds: float = interval_seconds
+        self.created: int = 0
+        self.dropped: int = 0
+        self.__task: Optional[asyncio.Task] = None
+
+    def maintain(self, session: Session) -> int:
+        """create the missing months and drop the expired ones, the caller commits
+
+        Args:
+            session (Session): session of the write
+
+        Returns:
+            int: partitions created and dropped
+        """
+        if session.get_bind().dialect.name != "postgresql":
+            return 0
+
+        if not session.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": _PARTITION_LOCK_ID}).scalar():
+            return 0
+
+        months: Optional[dict[str, datetime]] = self.__months(session)
+
+        # before migration 0007 attendance is a plain table
+        if months is None:
+            return 0
+
+        existing: dict[str, datetime] = months
+
+        session.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+
+        now: datetime = datetime.utcnow()
+        changes: int = 0
+
+        for offset in range(self.ahead + 1):
+            month: datetime = add_months(month_start(now), offset)
+            name: str = f"attendance_p{month:%Y%m}"
+
+            # the legacy partition holds everything before the first month
+            if name in existing or month < min(existing.values(), default=month):
+                continue
+
+            if self.__in_default(session, month):
+                self.__create_from_default(session, name, month)
+            else:
+                session.execute(text(self.__create(name, month)))
+                logger.info("created partition %s", name)
+
+            self.created += 1
+            changes += 1
+
+        for name, month in sorted(existing.items(), key=lambda item: item[1]):
+            if self.__expired(session, name, add_months(month, 1), now):
+                session.execute(text(f"DROP TABLE {name}"))
+                logger.info("dropped partition %s", name)
+                self.dropped += 1
+                changes += 1
+
+        left: int = session.execute(text("SELECT count(*) FROM attendance_default")).scalar() \
+            if self.__has_default(session) else 0
+
+        if left:
+            # months further ahead than ATTENDANCE_PARTITIONS_AHEAD or already dropped, nothing moves them
+            logger.warning("attendance_default holds %d row(s) no month partition takes", left)
+
+        return changes
+
+    def start(self, run: Callable[[Callable[[Session], int]], Awaitable[int]]) -> None:
+        """start the maintenance loop, called from the lifespan
+
+        Args:
+            run (Callable[[Callable[[Session], int]], Awaitable[int]]): runs write work and commits it
+        """
+        self.__task = asyncio.get_running_loop().create_task(self.__run(run), name="partitions")
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+            self.__task = None
+
+    async def __run(self, run: Callable[[Callable[[Session], int]], Awaitable[int]]) -> None:
+        while True:
+            try:
+                await run(self.maintain)
+            except Exception:
+                logger.exception("partition maintenance failed, retrying in %ss", self.interval_seconds)
+
+            await asyncio.sleep(self.interval_seconds)
+
+    def __expired(self, session: Session, name: str, end: datetime, now: datetime) -> bool:
+        if self.retention_months and end <= add_months(month_start(now), -self.retention_months):
+            return True
+
+        if self.archive_after is not None and end <= now - self.archive_after:
+            # the archive job moved its rows out
+            return not session.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})")).scalar()
+
+        return False
+
+    @staticmethod
+    def __create(name: str, month: datetime) -> str:
+        return (f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF attendance "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')")
+
+    @staticmethod
+    def __has_default(session: Session) -> bool:
+        return session.execute(text("SELECT to_regclass('attendance_default') IS NOT NULL")).scalar()
+
+    def __in_default(self, session: Session, month: datetime) -> bool:
+        if not self.__has_default(session):
+            return False
+
+        return session.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM attendance_default "
+            f"WHERE createdon >= '{month:%Y-%m-%d}' AND createdon < '{add_months(month, 1):%Y-%m-%d}')"
+        )).scalar()
+
+    def __create_from_default(self, session: Session, name: str, month: datetime) -> None:
+        # Postgres refuses a month whose rows sit in the default partition, the check-ins wait on the lock meanwhile
+        session.execute(text("ALTER TABLE attendance DETACH PARTITION attendance_default"))
+        session.execute(text(self.__create(name, month)))
+
+        moved: int = session.execute(text(
+            f"WITH moved AS (DELETE FROM attendance_default "
+            f"WHERE createdon >= '{month:%Y-%m-%d}' AND createdon < '{add_months(month, 1):%Y-%m-%d}' RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        )).rowcount
+
+        session.execute(text("ALTER TABLE attendance ATTACH PARTITION attendance_default DEFAULT"))
+        logger.warning("created partition %s from attendance_default, %d row(s) moved", name, moved)
+
+    @staticmethod
+    def __months(session: Session) -> Optional[dict[str, datetime]]:
+        partitioned = session.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'attendance'"
+        )).first()
+
+        if not partitioned:
+            return None
+
+        names = session.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'attendance'::regclass"
+        )).scalars()
+
+        # only the months, the legacy and default partitions are never touched
+        return {name: datetime(int(match.group(1)), int(match.group(2)), 1)
+                for name in names if (match := _MONTH_NAME.match(name))}
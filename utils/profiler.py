@@ -0,0 +1,62 @@
+from collections import Counter
+from types import FrameType
+from typing import Optional
+
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval and keeps the
+    counts in the folded format read by flamegraph.pl and speedscope.
+    Frames of other requests running on the same event loop are sampled
+    too, the profile is meant for one slow call at a time.
+    """
+    def __init__(self, interval: float = 0.001, thread_id: Optional[int] = None) -> None:
+        self.interval: float = interval
+        self.thread_id: int = thread_id if thread_id is not None else threading.get_ident()
+        self.samples: Counter[str] = Counter()
+        self.__stop: threading.Event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.started: float = 0.0
+        self.elapsed: float = 0.0
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self.__thread = threading.Thread(target=self.__run, name="request-profiler", daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+
+        if self.__thread is not None:
+            self.__thread.join()
+
+        self.elapsed = time.perf_counter() - self.started
+
+    def __run(self) -> None:
+        while not self.__stop.wait(self.interval):
+            frame: Optional[FrameType] = sys._current_frames().get(self.thread_id)
+
+            if frame is not None:
+                self.samples[self.__fold(frame)] += 1
+
+    @staticmethod
+    def __fold(frame: Optional[FrameType]) -> str:
+        stack: list[str] = []
+
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+            frame = frame.f_back
+
+        return ";".join(reversed(stack))
+
+    def folded(self) -> str:
+        """the profile in the folded stack format, one stack and count per line
+
+        Returns:
+            str: the profile
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
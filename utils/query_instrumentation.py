@@ -0,0 +1,121 @@
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import logging
+import os
+import time
+
+
+logger: logging.Logger = logging.getLogger("makarios.db")
+
+SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+_EXPLAIN_SAVEPOINT: str = "makarios_explain"
+
+
+@dataclass
+class QueryStats:
+    """Database work done while serving one request"""
+    count: int = 0
+    total_ms: float = 0.0
+    slowest_ms: float = 0.0
+    slowest_sql: Optional[str] = None
+    slow_queries: list[dict[str, Any]] = field(default_factory=list)
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_sql = statement
+
+
+# the stats of the request being served, None outside of a request
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def _plan(cursor: Any, statement: str, parameters: Any) -> str:
+    cursor.execute(statement, parameters)
+    return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def _explain(conn: Any, statement: str, parameters: Any) -> Optional[str]:
+    """run EXPLAIN for a statement on the raw connection so no event fires again
+
+    It runs in the transaction of the request. On Postgres a failed statement
+    aborts the transaction, the EXPLAIN is wrapped in a savepoint and a
+    failure only rolls the savepoint back.
+
+    Args:
+        conn (Any): sqlalchemy connection the statement ran on
+        statement (str): compiled statement
+        parameters (Any): parameters of the statement
+
+    Returns:
+        Optional[str]: the plan, None if it could not be explained
+    """
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+
+    sqlite: bool = conn.dialect.name == "sqlite"
+    prefix: str = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN "
+
+    try:
+        cursor = conn.connection.cursor()
+        try:
+            if sqlite:
+                return _plan(cursor, prefix + statement, parameters)
+
+            cursor.execute(f"SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+
+            try:
+                return _plan(cursor, prefix + statement, parameters)
+            except Exception:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+                raise
+            finally:
+                cursor.execute(f"RELEASE SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+        finally:
+            cursor.close()
+    except Exception:  # the plan is only diagnostics, never fail the query for it
+        logger.debug("Could not explain statement", exc_info=True)
+        return None
+
+
+def _before_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any,
+                           context: Any, executemany: bool) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any,
+                          context: Any, executemany: bool) -> None:
+    elapsed_ms: float = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+
+    stats: Optional[QueryStats] = current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        plan: Optional[str] = None if executemany else _explain(conn, statement, parameters)
+
+        if stats is not None:
+            stats.slow_queries.append({"sql": statement, "ms": round(elapsed_ms, 2), "plan": plan})
+
+        logger.warning("slow query", extra={"db_ms": round(elapsed_ms, 2), "sql": statement, "plan": plan})
+
+
+def instrument_engine(engine: Engine) -> None:
+    """register the timing events on an engine
+
+    Args:
+        engine (Engine): the engine to instrument
+    """
+    if event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
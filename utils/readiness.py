@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+import threading
+
+
+# why this process should not get traffic yet, e.g. "migrations" or "warmup"
+_reasons: set[str] = set()
+_lock: threading.Lock = threading.Lock()
+
+
+def mark_not_ready(reason: str) -> None:
+    with _lock:
+        _reasons.add(reason)
+
+
+def mark_ready(reason: str) -> None:
+    with _lock:
+        _reasons.discard(reason)
+
+
+def reasons() -> list[str]:
+    """reasons this process is not ready
+
+    Returns:
+        list[str]: sorted reasons, empty when ready
+    """
+    with _lock:
+        return sorted(_reasons)
+
+
+@contextmanager
+def not_ready(reason: str) -> Iterator[None]:
+    """report not ready for as long as the block runs
+
+    Args:
+        reason (str): reason reported by /readyz
+    """
+    mark_not_ready(reason)
+
+    try:
+        yield
+    finally:
+        mark_ready(reason)
@@ -0,0 +1,129 @@
+from contextvars import ContextVar
+from typing import Any, Optional, Sequence
+from sqlalchemy.engine import Engine
+
+import itertools
+import os
+import threading
+import time
+
+
+# id of the logged in user of the request being served, set by the auth dependency
+request_user_id: ContextVar[Optional[int]] = ContextVar("request_user_id", default=None)
+
+
+class ReplicaSet:
+    """Read replicas picked round-robin. A replica that fails to connect is
+    left out until retry_after seconds have passed.
+    """
+    def __init__(self, engines: Sequence[Engine], retry_after: float = 30.0) -> None:
+        self.engines: tuple[Engine, ...] = tuple(engines)
+        self.retry_after: float = retry_after
+        self.__down_until: dict[int, float] = {}
+        self.__counter: itertools.count = itertools.count()
+        self.__lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def candidates(self) -> list[Engine]:
+        """healthy replicas in the order to try them, rotated on every call
+
+        Returns:
+            list[Engine]: replicas to try, empty when all are down
+        """
+        if not self.engines:
+            return []
+
+        start: int = next(self.__counter) % len(self.engines)
+        now: float = time.monotonic()
+        ordered: tuple[Engine, ...] = self.engines[start:] + self.engines[:start]
+
+        return [engine for engine in ordered if self.__down_until.get(id(engine), 0.0) <= now]
+
+    def mark_down(self, engine: Engine) -> None:
+        with self.__lock:
+            self.__down_until[id(engine)] = time.monotonic() + self.retry_after
+
+    def healthy(self) -> int:
+        now: float = time.monotonic()
+        return sum(1 for engine in self.engines if self.__down_until.get(id(engine), 0.0) <= now)
+
+
+class WriteWindow:
+    """Remembers recent writes so reads right after them skip the replicas,
+    which may not have replayed them yet. With several workers the writes
+    are kept in Redis, see share.
+    """
+    def __init__(self, seconds: float) -> None:
+        self.seconds: float = seconds
+        self.__last_write: float = float("-inf")
+        self.__users: dict[int, float] = {}
+        self.__lock: threading.Lock = threading.Lock()
+        self.__shared: Optional[Any] = None
+        self.__prefix: str = "makarios:writes:"
+
+    def share(self, client: Any) -> None:
+        """keep the writes in Redis, a read on another worker than the write then sees the window too
+
+        Args:
+            client (Any): Redis client
+        """
+        self.__shared = client
+
+    def record(self, user_id: Optional[int]) -> None:
+        """note a write
+
+        Args:
+            user_id (Optional[int]): user who wrote, None for writes outside of a request
+        """
+        if self.__shared is not None:
+            # the keys expire with the window
+            pipe = self.__shared.pipeline()
+            pipe.set(self.__prefix + "any", 1, px=int(self.seconds * 1000))
+
+            if user_id is not None:
+                pipe.set(f"{self.__prefix}user:{user_id}", 1, px=int(self.seconds * 1000))
+
+            pipe.execute()
+            return
+
+        now: float = time.monotonic()
+
+        with self.__lock:
+            self.__last_write = now
+
+            if user_id is not None:
+                self.__users[user_id] = now
+
+            # forget the users whose window is over, so the dict stays small
+            if len(self.__users) > 1024:
+                self.__users = {user: at for user, at in self.__users.items() if now - at < self.seconds}
+
+    def active(self, user_id: Optional[int]) -> bool:
+        """check if a user wrote within the window
+
+        Args:
+            user_id (Optional[int]): user reading
+
+        Returns:
+            bool: True if the user must read from the primary
+        """
+        if user_id is None:
+            return False
+
+        if self.__shared is not None:
+            return bool(self.__shared.exists(f"{self.__prefix}user:{user_id}"))
+
+        return time.monotonic() - self.__users.get(user_id, float("-inf")) < self.seconds
+
+    def any_active(self) -> bool:
+        """check if anyone wrote within the window, a replica may still serve older rows"""
+        if self.__shared is not None:
+            return bool(self.__shared.exists(self.__prefix + "any"))
+
+        return time.monotonic() - self.__last_write < self.seconds
+
+
+# reads of a user who just wrote go to the primary, the replicas may lag behind
+write_window: WriteWindow = WriteWindow(float(os.getenv("READ_YOUR_WRITES_SECONDS", "5")))
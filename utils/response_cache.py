@@ -0,0 +1,357 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Awaitable, Iterable, Optional, TypeVar
+from fastapi.responses import Response as HTTPResponse
+from pydantic import BaseModel
+from dto.response import SingleResponse
+from dto.fast_response import FastResponse, dumps
+from utils.table_versions import on_bump, versions_key
+from utils.replicas import write_window
+from utils.workers import WORKERS
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+try:
+    import redis  # type: ignore
+except ImportError:  # the redis backend is optional
+    redis = None
+
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+logger: logging.Logger = logging.getLogger("makarios.cache")
+
+
+class CacheStats:
+    """Hit and miss counters of the response cache"""
+    def __init__(self) -> None:
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stores: int = 0
+        self.invalidations: int = 0
+
+    def as_dict(self) -> dict[str, int | float]:
+        lookups: int = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+class CacheBackend(ABC):
+    """Interface of a response cache backend. Entries are tagged with the
+    tables they read so a write to one of them drops the entries.
+    """
+    name: str = "none"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, tables: Iterable[str], ttl: int) -> None:
+        ...
+
+    @abstractmethod
+    def invalidate(self, tables: Iterable[str]) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class MemoryBackend(CacheBackend):
+    """In process LRU backend with a time to live per entry"""
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries: int = max_entries
+        # key: (expires, body, tables), the tables find the tag sets of an entry when it goes
+        self.__entries: OrderedDict[str, tuple[float, bytes, tuple[str, ...]]] = OrderedDict()
+        self.__tags: dict[str, set[str]] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.__lock:
+            entry: Optional[tuple[float, bytes, tuple[str, ...]]] = self.__entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] < time.monotonic():
+                self.__remove(key)
+                return None
+
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, tables: Iterable[str], ttl: int) -> None:
+        with self.__lock:
+            # a replaced entry may have been tagged with other tables
+            self.__remove(key)
+
+            table_names: tuple[str, ...] = tuple(tables)
+            self.__entries[key] = (time.monotonic() + ttl, value, table_names)
+
+            for table in table_names:
+                self.__tags.setdefault(table, set()).add(key)
+
+            while len(self.__entries) > self.max_entries:
+                self.__remove(next(iter(self.__entries)))
+
+    def invalidate(self, tables: Iterable[str]) -> int:
+        removed: int = 0
+
+        with self.__lock:
+            for table in tables:
+                for key in self.__tags.get(table, set()).copy():
+                    if self.__remove(key):
+                        removed += 1
+
+        return removed
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__tags.clear()
+
+    def __remove(self, key: str) -> bool:
+        entry: Optional[tuple[float, bytes, tuple[str, ...]]] = self.__entries.pop(key, None)
+
+        if entry is None:
+            return False
+
+        for table in entry[2]:
+            keys: Optional[set[str]] = self.__tags.get(table)
+
+            if keys is not None:
+                keys.discard(key)
+
+                if not keys:
+                    del self.__tags[table]
+
+        return True
+
+
+class RedisBackend(CacheBackend):
+    """Backend speaking the Redis protocol, so it is shared between workers.
+    Any compatible server works, a client object (e.g. a local stand-in) can
+    be passed instead of a url.
+    """
+    name = "redis"
+
+    def __init__(self, url: Optional[str] = None, client: Any = None, prefix: str = "makarios:cache:") -> None:
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for the redis cache backend")
+
+            client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+
+        self.client = client
+        self.prefix: str = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, tables: Iterable[str], ttl: int) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, value, ex=ttl)
+
+        for table in tables:
+            pipe.sadd(f"{self.prefix}tag:{table}", self.prefix + key)
+
+        pipe.execute()
+
+    def invalidate(self, tables: Iterable[str]) -> int:
+        removed: int = 0
+
+        for table in tables:
+            tag: str = f"{self.prefix}tag:{table}"
+            keys = self.client.smembers(tag)
+
+            if keys:
+                removed += self.client.delete(*keys)
+
+            self.client.delete(tag)
+
+        return removed
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_backend() -> Optional[CacheBackend]:
+    """create the backend configured by CACHE_BACKEND (memory, redis or none)
+
+    Returns:
+        Optional[CacheBackend]: the backend or None if caching is off
+    """
+    backend: str = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+
+    if backend == "memory":
+        # a write only drops the entries of the worker that committed it
+        if WORKERS > 1:
+            logger.warning("the memory cache is off with %d workers, use CACHE_BACKEND=redis", WORKERS)
+            return None
+
+        return MemoryBackend(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")))
+
+    if backend == "redis":
+        return RedisBackend(url=os.getenv("CACHE_URL"))
+
+    return None
+
+
+class ResponseCache:
+    """Response cache used by the cached decorator"""
+    def __init__(self, backend: Optional[CacheBackend], default_ttl: int = 60) -> None:
+        self.backend: Optional[CacheBackend] = backend
+        self.default_ttl: int = default_ttl
+        self.stats: CacheStats = CacheStats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, key: str) -> Optional[bytes]:
+        if self.backend is None:
+            return None
+
+        value: Optional[bytes] = self.backend.get(key)
+
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+
+        return value
+
+    def set(self, key: str, value: bytes, tables: Iterable[str], ttl: Optional[int] = None) -> None:
+        if self.backend is None:
+            return
+
+        self.backend.set(key, value, tables, ttl or self.default_ttl)
+        self.stats.stores += 1
+
+    def invalidate(self, tables: Iterable[str]) -> None:
+        if self.backend is None:
+            return
+
+        self.stats.invalidations += self.backend.invalidate(tables)
+
+
+response_cache: ResponseCache = ResponseCache(create_backend(), default_ttl=int(os.getenv("CACHE_TTL", "60")))
+
+# drop the entries of a table as soon as a commit changes it
+on_bump(response_cache.invalidate)
+
+
+def _normalize(value: Any) -> str:
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+
+    if isinstance(value, (list, tuple, set)):
+        return ",".join(sorted(_normalize(item) for item in value))
+
+    return str(value).strip()
+
+
+def cache_key(route: str, params: dict[str, Any], per_user: bool = False) -> str:
+    """build a cache key from the route and its normalized query parameters
+
+    Args:
+        route (str): name of the route
+        params (dict[str, Any]): keyword arguments of the handler
+        per_user (bool, optional): part the key by the logged in user. Defaults to False.
+
+    Returns:
+        str: the cache key
+    """
+    parts: list[str] = [route]
+
+    for name in sorted(params):
+        value: Any = params[name]
+
+        if isinstance(value, SingleResponse):
+            if per_user and value.data is not None:
+                parts.append(f"user={getattr(value.data, 'id', None)}")
+            continue
+
+        # parsed request objects (e.g. the filters) give their own stable text
+        if hasattr(value, "cache_key"):
+            parts.append(f"{name}={value.cache_key()}")
+            continue
+
+        # sessions and other dependencies are not part of the request
+        if value is None or value == "" or not isinstance(value, (str, int, float, bool, datetime.date, datetime.time, list, tuple, set)):
+            continue
+
+        parts.append(f"{name}={_normalize(value)}")
+
+    return "|".join(parts)
+
+
+def _to_body(result: Any) -> bytes:
+    if isinstance(result, HTTPResponse):
+        return bytes(result.body)
+
+    if isinstance(result, BaseModel):
+        return dumps(result.model_dump())
+
+    return dumps(result)
+
+
+def cached(tables: Iterable[str], ttl: Optional[int] = None, per_user: bool = False) -> Callable[[F], F]:
+    """opt a route handler into the response cache
+
+    Args:
+        tables (Iterable[str]): tables the handler reads, a write to any drops the entry
+        ttl (Optional[int], optional): seconds to keep the entry. Defaults to CACHE_TTL.
+        per_user (bool, optional): keep one entry per logged in user. Defaults to False.
+
+    Returns:
+        Callable[[F], F]: the decorator
+    """
+    table_names: tuple[str, ...] = tuple(tables)
+
+    def decorator(func: F) -> F:
+        route: str = func.__qualname__
+
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not response_cache.enabled:
+                return await func(*args, **kwargs)
+
+            key: str = cache_key(route, kwargs, per_user)
+            body: Optional[bytes] = response_cache.get(key)
+
+            if body is not None:
+                return HTTPResponse(content=body, media_type=FastResponse.media_type)
+
+            # a write during the query would leave a stale entry behind
+            versions: str = versions_key(table_names)
+            result: Any = await func(*args, **kwargs)
+
+            # nor would rows from a replica that did not replay the last write yet
+            if versions == versions_key(table_names) and not write_window.any_active() \
+                    and getattr(result, "status_code", 200) == 200:
+                response_cache.set(key, _to_body(result), table_names, ttl)
+
+            return result
+
+        return wrapper  # type: ignore
+
+    return decorator
@@ -0,0 +1,105 @@
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from fastapi.responses import Response as HTTPResponse
+from dto.response import SingleResponse
+from utils.replicas import write_window
+from utils.response_cache import cache_key
+
+import asyncio
+import os
+
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT", "true").strip().lower() in ("1", "true", "yes")
+
+
+class SingleFlight:
+    """Runs one call per key at a time, concurrent callers with the same key
+    await the result of the call already in flight.
+    """
+    def __init__(self) -> None:
+        self.__in_flight: dict[str, asyncio.Task] = {}
+        self.calls: int = 0
+        self.coalesced: int = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.__in_flight)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """run func once for all concurrent callers of key
+
+        Args:
+            key (str): key of the call
+            func (Callable[[], Awaitable[Any]]): the call to make
+
+        Returns:
+            tuple[Any, bool]: the result and whether it came from another caller
+        """
+        task: asyncio.Task | None = self.__in_flight.get(key)
+        shared: bool = task is not None
+
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func())
+            self.__in_flight[key] = task
+            task.add_done_callback(lambda _: self.__in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        # a cancelled caller must not cancel the call the others are waiting on
+        return await asyncio.shield(task), shared
+
+
+single_flight: SingleFlight = SingleFlight()
+
+
+def _copy(result: Any) -> Any:
+    # a response object is sent once per request, the waiters get their own
+    if isinstance(result, HTTPResponse):
+        response = HTTPResponse(content=result.body, status_code=result.status_code, media_type=result.media_type)
+        response.raw_headers = list(result.raw_headers)
+        return response
+
+    return result
+
+
+def _user_id(kwargs: dict[str, Any]) -> Optional[int]:
+    for value in kwargs.values():
+        if isinstance(value, SingleResponse) and value.data is not None:
+            return getattr(value.data, "id", None)
+
+    return None
+
+
+def coalesced(per_user: bool = False) -> Callable[[F], F]:
+    """coalesce identical concurrent calls of a route handler, keyed like the response cache
+
+    The handler must await its query, e.g. with asyncio.to_thread. A handler
+    that never yields finishes before the next request can join its flight.
+    A user who wrote within READ_YOUR_WRITES_SECONDS reads on their own: their
+    session is on the primary, and a flight started before their commit would
+    miss the write.
+
+    Args:
+        per_user (bool, optional): part the key by the logged in user. Defaults to False.
+
+    Returns:
+        Callable[[F], F]: the decorator
+    """
+    def decorator(func: F) -> F:
+        route: str = func.__qualname__
+
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not SINGLE_FLIGHT_ENABLED or write_window.active(_user_id(kwargs)):
+                return await func(*args, **kwargs)
+
+            result, shared = await single_flight.do(cache_key(route, kwargs, per_user), lambda: func(*args, **kwargs))
+
+            return _copy(result) if shared else result
+
+        return wrapper  # type: ignore
+
+    return decorator
@@ -0,0 +1,202 @@
+"""Soft delete and the purge of the deleted rows.
+
+db.delete only sets deletedon on the entities that have the column. Every
+ORM select listing these entities, session.get included, gets
+deletedon IS NULL added by a session event, so the handlers never see
+deleted rows. The entities only joined in, such as the creator of a
+service type, are not filtered, their deletion does not hide the rows
+that point to them. The partial indexes of migration 0006 hold the live rows
+only. Pass execution_options(include_deleted=True) to read deleted rows.
+
+The Purger removes the rows deleted more than PURGE_RETENTION_DAYS ago,
+PURGE_BATCH_SIZE at a time and only within PURGE_HOURS (e.g. "1-5", UTC,
+the end hour excluded). A row that other rows still reference, such as a
+member with attendance history, is left soft deleted instead of breaking
+its foreign keys. Tombstones in deletion_log are kept for the change feeds.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional, Sequence
+from sqlalchemy import Table, delete, event, exists, select, text
+from sqlalchemy.orm import ORMExecuteState, Session, with_loader_criteria
+
+import asyncio
+import logging
+import os
+
+
+logger: logging.Logger = logging.getLogger("makarios.purge")
+
+PURGE_RETENTION_DAYS: float = float(os.getenv("PURGE_RETENTION_DAYS", "30"))
+PURGE_BATCH_SIZE: int = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+# empty disables the purge inside the app, scripts/purge.py can then run from cron
+PURGE_HOURS: str = os.getenv("PURGE_HOURS", "")
+PURGE_INTERVAL_SECONDS: float = float(os.getenv("PURGE_INTERVAL_SECONDS", "300"))
+
+# any constant works, one worker purges at a time on Postgres
+_PURGE_LOCK_ID: int = 7_210_392
+
+_soft_deleted: list[Any] = []
+
+
+def _primary_entity(statement: Any) -> Any:
+    # the entity of the first column, the projections always start with the id of the entity they list
+    for description in statement.column_descriptions:
+        if description.get("entity") is not None:
+            return description["entity"]
+
+    return None
+
+
+def _exclude_deleted(state: ORMExecuteState) -> None:
+    if not state.is_select or state.is_column_load or state.is_relationship_load \
+            or state.execution_options.get("include_deleted", False):
+        return
+
+    primary: Any = _primary_entity(state.statement)
+
+    # only the rows listed are hidden, a deleted creator or service type still names the rows joined to it
+    entities: list[Any] = _soft_deleted if primary is None else [primary] if primary in _soft_deleted else []
+
+    if entities:
+        state.statement = state.statement.options(*[
+            with_loader_criteria(entity, lambda cls: cls.deletedon.is_(None), include_aliases=True)
+            for entity in entities
+        ])
+
+
+def exclude_deleted(*entities: Any) -> None:
+    """hide the soft deleted rows of entities from every ORM select
+
+    Args:
+        entities (Any): entities with a deletedon column
+    """
+    for entity in entities:
+        if entity not in _soft_deleted:
+            _soft_deleted.append(entity)
+
+    if not event.contains(Session, "do_orm_execute", _exclude_deleted):
+        event.listen(Session, "do_orm_execute", _exclude_deleted)
+
+
+def is_soft_deleted(entity: Any) -> bool:
+    return type(entity) in _soft_deleted
+
+
+def parse_hours(hours: str) -> Optional[tuple[int, int]]:
+    """read an hour window
+
+    Args:
+        hours (str): "start-end" in UTC hours, the end excluded, it may wrap past midnight
+
+    Raises:
+        ValueError: raise if the window cannot be read
+
+    Returns:
+        Optional[tuple[int, int]]: start and end, None when empty
+    """
+    if not hours.strip():
+        return None
+
+    start, _, end = hours.partition("-")
+    window: tuple[int, int] = (int(start), int(end))
+
+    if not all(0 <= hour <= 24 for hour in window) or window[0] == window[1]:
+        raise ValueError(f"PURGE_HOURS must look like 1-5, not {hours}")
+
+    return window
+
+
+class Purger:
+    """Removes the expired soft deleted rows in batches"""
+    def __init__(self, tables: Sequence[Table], retention_days: float = 30, batch_size: int = 500,
+                 hours: Optional[tuple[int, int]] = None, interval_seconds: float = 300) -> None:
+        # referencing tables first, their rows free the ones they point to
+        self.tables: list[Table] = list(tables)
+        self.retention: timedelta = timedelta(days=retention_days)
+        self.batch_size: int = batch_size
+        self.hours: Optional[tuple[int, int]] = hours
+        self.interval_seconds: float = interval_seconds
+        self.purged: int = 0
+        self.__task: Optional[asyncio.Task] = None
+
+    def in_window(self, now: Optional[datetime] = None) -> bool:
+        if self.hours is None:
+            return False
+
+        hour: int = (now or datetime.utcnow()).hour
+        start, end = self.hours
+
+        return start <= hour < end if start < end else hour >= start or hour < end
+
+    def purge_batch(self, session: Session) -> int:
+        """remove at most one batch of expired rows per table, the caller commits
+
+        Args:
+            session (Session): session of the write
+
+        Returns:
+            int: rows removed
+        """
+        if session.get_bind().dialect.name == "postgresql":
+            # the workers all run the purge, the ones that do not get the lock skip this round
+            if not session.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": _PURGE_LOCK_ID}).scalar():
+                return 0
+
+        cutoff: datetime = datetime.utcnow() - self.retention
+        removed: int = 0
+
+        for table in self.tables:
+            expired = (
+                select(table.c.id)
+                .where(table.c.deletedon.is_not(None), table.c.deletedon < cutoff, *self.__unreferenced(table))
+                .order_by(table.c.deletedon)
+                .limit(self.batch_size)
+            )
+            # Core statements on the tables, the soft delete filter only applies to the entities
+            removed += session.execute(delete(table).where(table.c.id.in_(expired))).rowcount or 0
+
+        self.purged += removed
+
+        return removed
+
+    def start(self, run: Callable[[Callable[[Session], int]], Awaitable[int]]) -> None:
+        """start the purge loop, called from the lifespan when PURGE_HOURS is set
+
+        Args:
+            run (Callable[[Callable[[Session], int]], Awaitable[int]]): runs write work and commits it
+        """
+        if self.hours is not None:
+            self.__task = asyncio.get_running_loop().create_task(self.__run(run), name="purge")
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+            self.__task = None
+
+    async def __run(self, run: Callable[[Callable[[Session], int]], Awaitable[int]]) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+
+            try:
+                # one batch per write, the writer and the requests take turns
+                while self.in_window() and await run(self.purge_batch) > 0:
+                    await asyncio.sleep(0)
+            except Exception:
+                logger.exception("purge failed, retrying in %ss", self.interval_seconds)
+
+    @staticmethod
+    def __unreferenced(table: Table) -> list[Any]:
+        conditions: list[Any] = []
+
+        for other in table.metadata.tables.values():
+            for foreign_key in other.foreign_keys:
+                if foreign_key.column.table is table and foreign_key.column.name == "id":
+                    conditions.append(~exists().where(foreign_key.parent == table.c.id))
+
+        return conditions
@@ -0,0 +1,121 @@
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+import logging
+import queue
+import threading
+import time
+
+
+logger: logging.Logger = logging.getLogger("makarios.db")
+
+WriteWork = Callable[[Session], Any]
+
+
+class SQLiteWriter:
+    """The only writer of a SQLite database. Work submitted by the request
+    handlers is queued to one thread, which runs everything queued together
+    in a single transaction (group commit), each piece in its own SAVEPOINT
+    so a failing one does not roll back the others.
+    """
+    def __init__(self, engine: Engine, max_batch: int = 64, max_wait_ms: float = 0.0) -> None:
+        self.engine: Engine = engine
+        self.max_batch: int = max_batch
+        self.max_wait: float = max_wait_ms / 1000
+        self.__queue: queue.Queue[Optional[tuple[WriteWork, Future]]] = queue.Queue()
+        self.__thread: threading.Thread = threading.Thread(target=self.__run, name="sqlite-writer", daemon=True)
+        self.__started: bool = False
+        self.commits: int = 0
+        self.writes: int = 0
+
+    def start(self) -> None:
+        if not self.__thread.is_alive():
+            self.__thread.start()
+            self.__started = True
+
+    def after_fork(self) -> None:
+        """replace the thread and queue copied from the parent, threads do not survive a fork"""
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(target=self.__run, name="sqlite-writer", daemon=True)
+
+        if self.__started:
+            self.__thread.start()
+
+    def stop(self) -> None:
+        """finish the queued work and stop the thread"""
+        if self.__thread.is_alive():
+            self.__queue.put(None)
+            self.__thread.join()
+
+    def submit(self, work: WriteWork) -> Future:
+        """queue work for the writer
+
+        Args:
+            work (WriteWork): function receiving the writer session, it must not commit
+
+        Returns:
+            Future: resolved with the return value of work once committed
+        """
+        future: Future = Future()
+        self.__queue.put((work, future))
+        return future
+
+    def __next_batch(self, first: tuple[WriteWork, Future]) -> tuple[list[tuple[WriteWork, Future]], bool]:
+        batch: list[tuple[WriteWork, Future]] = [first]
+        deadline: float = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            try:
+                remaining: float = deadline - time.monotonic()
+                item = self.__queue.get(timeout=remaining) if remaining > 0 else self.__queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                return batch, True
+
+            batch.append(item)
+
+        return batch, False
+
+    def __run(self) -> None:
+        stopping: bool = False
+
+        while not stopping:
+            first = self.__queue.get()
+
+            if first is None:
+                break
+
+            batch, stopping = self.__next_batch(first)
+            self.__commit(batch)
+
+    def __commit(self, batch: list[tuple[WriteWork, Future]]) -> None:
+        results: list[tuple[Future, Any, Optional[BaseException]]] = []
+
+        with Session(self.engine, expire_on_commit=False) as session:
+            for work, future in batch:
+                try:
+                    with session.begin_nested():
+                        results.append((future, work(session), None))
+                except Exception as error:
+                    results.append((future, None, error))
+
+            try:
+                session.commit()
+            except Exception as error:
+                logger.exception("group commit failed")
+                for future, _, _ in results:
+                    future.set_exception(error)
+                return
+
+        self.commits += 1
+        self.writes += len(batch)
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
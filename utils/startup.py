@@ -0,0 +1,69 @@
+from contextlib import contextmanager
+from typing import Any, Iterator
+from utils.metrics import Gauge, registry
+
+import importlib
+import logging
+import os
+import sys
+import time
+
+
+logger: logging.Logger = logging.getLogger("makarios.startup")
+
+# log the breakdown when the app starts, it is always on /metrics
+STARTUP_TIMING: bool = os.getenv("STARTUP_TIMING", "false").strip().lower() in ("1", "true", "yes")
+
+startup_seconds: Gauge = registry.register(Gauge(
+    "app_startup_seconds", "Time spent importing and initializing each module at startup", ("phase", "module"),
+    aggregate="max"
+))
+
+
+class StartupTimer:
+    """Import and initialization time of the modules loaded at startup"""
+    def __init__(self) -> None:
+        self.timings: list[tuple[str, str, float]] = []
+
+    @contextmanager
+    def phase(self, phase: str, module: str) -> Iterator[None]:
+        started: float = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.record(phase, module, time.perf_counter() - started)
+
+    def record(self, phase: str, module: str, seconds: float) -> None:
+        self.timings.append((phase, module, seconds))
+        startup_seconds.set(seconds, phase, module)
+
+    def load(self, module_name: str, attribute: str) -> Any:
+        """import a module and instantiate one of its classes, timing both
+
+        Args:
+            module_name (str): dotted module name
+            attribute (str): class to instantiate
+
+        Returns:
+            Any: the instance
+        """
+        # a module already imported by an earlier one costs nothing here, its time went to that one
+        with self.phase("import", module_name):
+            module = sys.modules.get(module_name) or importlib.import_module(module_name)
+
+        with self.phase("init", module_name):
+            return getattr(module, attribute)()
+
+    def report(self) -> None:
+        """log the timings, slowest first"""
+        if not STARTUP_TIMING:
+            return
+
+        for phase, module, seconds in sorted(self.timings, key=lambda timing: timing[2], reverse=True):
+            logger.info("%-6s %-40s %8.1fms", phase, module, seconds * 1000)
+
+        logger.info("total  %-40s %8.1fms", "", sum(timing[2] for timing in self.timings) * 1000)
+
+
+startup_timer: StartupTimer = StartupTimer()
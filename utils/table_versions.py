@@ -0,0 +1,173 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, ORMExecuteState
+from typing import Any, Callable, Iterable, Optional
+
+import hashlib
+import threading
+import uuid
+
+
+# a restart resets the counters, the epoch keeps old ETags from matching again
+_epoch: str = uuid.uuid4().hex[:8]
+_versions: dict[str, int] = {}
+_lock: threading.Lock = threading.Lock()
+_listeners: list[Callable[[tuple[str, ...]], None]] = []
+# Redis client holding the versions of every worker, see share_versions
+_shared: Optional[Any] = None
+
+_PENDING_KEY: str = "changed_tables"
+_SHARED_PREFIX: str = "makarios:versions:"
+
+
+def share_versions(client: Any) -> None:
+    """keep the versions in Redis, so a commit in one worker changes the ETags of all of them
+
+    Args:
+        client (Any): Redis client
+    """
+    global _shared
+    _shared = client
+
+
+def after_fork() -> None:
+    """a new epoch for the worker, its own versions then never give the tags of another one"""
+    global _epoch
+    _epoch = uuid.uuid4().hex[:8]
+    _versions.clear()
+
+
+def _shared_key(table: str) -> str:
+    return _SHARED_PREFIX + table
+
+
+def _shared_epoch() -> str:
+    # picked by the first worker, and again after Redis lost its keys and the counters started over
+    _shared.set(_shared_key("_epoch"), uuid.uuid4().hex[:8], nx=True)  # type: ignore
+    return _shared.get(_shared_key("_epoch")).decode()  # type: ignore
+
+
+def get_version(table: str) -> int:
+    """get the current version of a table
+
+    Args:
+        table (str): name of the table
+
+    Returns:
+        int: version counter, 0 if the table never changed
+    """
+    if _shared is not None:
+        return int(_shared.get(_shared_key(table)) or 0)
+
+    return _versions.get(table, 0)
+
+
+def bump(*tables: str) -> None:
+    """increase the version of tables, used by Core statements that bypass the ORM
+
+    Args:
+        tables (str): names of the tables that changed
+    """
+    if _shared is not None:
+        pipe = _shared.pipeline()
+
+        for table in tables:
+            pipe.incr(_shared_key(table))
+
+        pipe.execute()
+    else:
+        with _lock:
+            for table in tables:
+                _versions[table] = _versions.get(table, 0) + 1
+
+    for listener in _listeners:
+        listener(tables)
+
+
+def on_bump(listener: Callable[[tuple[str, ...]], None]) -> None:
+    """call a listener with the changed tables after every bump
+
+    Args:
+        listener (Callable[[tuple[str, ...]], None]): function receiving the table names
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def versions_key(tables: Iterable[str]) -> str:
+    """build a stable string out of the versions of tables
+
+    Args:
+        tables (Iterable[str]): names of the tables
+
+    Returns:
+        str: the versions key
+    """
+    names: list[str] = sorted(tables)
+
+    if _shared is not None:
+        # one round trip for the epoch and all the tables
+        epoch, *values = _shared.mget([_shared_key("_epoch"), *(_shared_key(table) for table in names)])
+        epoch = _shared_epoch() if epoch is None else epoch.decode()
+
+        return epoch + ";" + ";".join(f"{table}={int(value or 0)}" for table, value in zip(names, values))
+
+    return _epoch + ";" + ";".join(f"{table}={get_version(table)}" for table in names)
+
+
+def make_etag(tables: Iterable[str], *parts: Any) -> str:
+    """derive a weak ETag from table versions and any request parts
+
+    Args:
+        tables (Iterable[str]): names of the tables the response reads
+
+    Returns:
+        str: a weak ETag
+    """
+    digest = hashlib.blake2b(versions_key(tables).encode(), digest_size=12)
+
+    for part in parts:
+        digest.update(b"\x00" + str(part).encode())
+
+    return f'W/"{digest.hexdigest()}"'
+
+
+def _table_name(instance: Any) -> str:
+    return instance.__table__.name
+
+
+def _after_flush(session: Session, flush_context: Any) -> None:
+    changed: set[str] = session.info.setdefault(_PENDING_KEY, set())
+
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        changed.add(_table_name(instance))
+
+
+def _on_orm_execute(state: ORMExecuteState) -> None:
+    # bulk update()/delete() statements do not go through the flush
+    if (state.is_update or state.is_delete) and state.bind_mapper is not None:
+        state.session.info.setdefault(_PENDING_KEY, set()).add(state.bind_mapper.local_table.name)
+
+
+def _after_commit(session: Session) -> None:
+    changed: set[str] = session.info.pop(_PENDING_KEY, set())
+
+    if changed:
+        bump(*changed)
+
+
+def _after_soft_rollback(session: Session, previous_transaction: Any) -> None:
+    # a savepoint, e.g. one failed write of a group commit, leaves the tables of the other writes pending,
+    # its own stay too and are bumped for nothing, which only costs a cache miss
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING_KEY, None)
+
+
+def track_table_versions() -> None:
+    """register the session events that bump the versions after every commit"""
+    if event.contains(Session, "after_commit", _after_commit):
+        return
+
+    event.listen(Session, "after_flush", _after_flush)
+    event.listen(Session, "do_orm_execute", _on_orm_execute)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_soft_rollback", _after_soft_rollback)
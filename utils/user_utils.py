@@ -1,13 +1,44 @@
 from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta, timezone
-from typing import Union, Optional
+from typing import Union, Optional, Any
 from exceptions.env_exceptions import EnvironmentNotFound
+from utils.metrics import password_hash_duration
 
 import re
 import os
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"])
+
+
+def build_password_context() -> CryptContext:
+    """build the hashing policy from the environment
+
+    PASSWORD_SCHEMES lists the schemes, the first one hashes new passwords and
+    the others are only kept to verify (and then upgrade) older hashes. The
+    cost factors are minimums too, a hash made with a lower cost is upgraded.
+
+    Returns:
+        CryptContext: the password context
+    """
+    schemes: list[str] = [scheme.strip() for scheme in os.getenv("PASSWORD_SCHEMES", "bcrypt").split(",") if scheme.strip()]
+    bcrypt_rounds: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+    settings: dict[str, Any] = {"bcrypt__rounds": bcrypt_rounds, "bcrypt__min_rounds": bcrypt_rounds}
+
+    if "argon2" in schemes:
+        time_cost: int = int(os.getenv("ARGON2_TIME_COST", "3"))
+        settings.update({
+            "argon2__rounds": time_cost,
+            "argon2__min_rounds": time_cost,
+            "argon2__memory_cost": int(os.getenv("ARGON2_MEMORY_COST", "65536")),
+            "argon2__parallelism": int(os.getenv("ARGON2_PARALLELISM", "2"))
+        })
+
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+
+pwd_context = build_password_context()
 
 
 class Utils:
@@ -28,7 +59,10 @@ class Utils:
         assert isinstance(password, str), "Password should be a string"
 
         combine_pass = email.strip() + password.strip()
+
+        start: float = time.perf_counter()
         password_hash = pwd_context.hash(combine_pass)
+        password_hash_duration.observe(time.perf_counter() - start, "hash")
 
         return password_hash
 
@@ -47,7 +81,34 @@ class Utils:
         assert isinstance(password, str), "Password should be a string"
 
         combine_pass = email.strip() + password.strip()
-        return pwd_context.verify(combine_pass, hash_pass)
+
+        start: float = time.perf_counter()
+        verified: bool = pwd_context.verify(combine_pass, hash_pass)
+        password_hash_duration.observe(time.perf_counter() - start, "verify")
+
+        return verified
+
+    def verify_and_update_password(self, email: str, password: str, hash_pass: str) -> tuple[bool, Optional[str]]:
+        """verify the password and rehash it when the stored hash is outdated
+
+        Args:
+            email (str): email of the user
+            password (str): password of the user
+            hash_pass (str): stored hash
+
+        Returns:
+            tuple[bool, Optional[str]]: whether it matched, and the new hash if the policy changed
+        """
+        assert isinstance(email, str), "Email should be a string"
+        assert isinstance(password, str), "Password should be a string"
+
+        combine_pass = email.strip() + password.strip()
+
+        start: float = time.perf_counter()
+        verified, new_hash = pwd_context.verify_and_update(combine_pass, hash_pass)
+        password_hash_duration.observe(time.perf_counter() - start, "verify")
+
+        return verified, new_hash
     
     @classmethod
     def verify_email(cls, email: str) -> bool:
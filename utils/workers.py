@@ -0,0 +1,55 @@
+"""The worker processes of serve.py and the state they share.
+
+serve.py forks WEB_CONCURRENCY workers and exports the number it settled
+on, a plain uvicorn run is one worker. The table versions behind the ETags
+and the cache tags, and the read-your-writes window of the replicas, live
+in each process. With more than one worker a write is only seen by its own
+worker, so they go to Redis, SHARED_STATE_URL or else the CACHE_URL of the
+redis cache. Without a shared store the ETags, the memory cache and the
+replicas are off, see shared_state.
+"""
+from typing import Any, Optional
+
+import logging
+import os
+
+try:
+    import redis  # type: ignore
+except ImportError:  # only needed to share the state between workers
+    redis = None
+
+
+logger: logging.Logger = logging.getLogger("makarios.workers")
+
+WORKERS: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+SHARED_STATE_URL: str = os.getenv("SHARED_STATE_URL") or os.getenv("CACHE_URL", "")
+
+
+def create_shared_client() -> Optional[Any]:
+    """connect to the store shared by the workers, only when there are several
+
+    Returns:
+        Optional[Any]: the Redis client, None for a single worker or when no store is configured
+    """
+    if WORKERS <= 1:
+        return None
+
+    if not SHARED_STATE_URL or redis is None:
+        logger.warning("%d workers without SHARED_STATE_URL (and the redis package), "
+                       "the ETags, the memory cache and the replicas are off", WORKERS)
+        return None
+
+    return redis.Redis.from_url(SHARED_STATE_URL)
+
+
+# None when every worker may keep its own state
+shared_state: Optional[Any] = create_shared_client()
+
+
+def consistent() -> bool:
+    """check if the state of this process is the state of every worker
+
+    Returns:
+        bool: True for a single worker or with the shared store
+    """
+    return WORKERS <= 1 or shared_state is not None
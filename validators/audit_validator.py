@@ -0,0 +1,24 @@
+from datetime import datetime
+from sqlmodel import select
+from entities.audit_entity import AuditLog, AuditLogOutput
+from validators.filters.filter import FilterSet, Operator, field
+from validators.filters.projection import Projection
+
+
+audit_projection: Projection = Projection(
+    "audit", AuditLogOutput, {name: getattr(AuditLog, name) for name in AuditLogOutput.model_fields}
+)
+
+# newest first and no sort, the pages are cut on the id
+audit_filters: FilterSet = FilterSet(
+    "audit",
+    base=lambda: select(AuditLog).order_by(AuditLog.id.desc()),  # type: ignore
+    fields={
+        "table_name": field(AuditLog.table_name, Operator.EQ, Operator.IN, indexed=True),
+        "row_id": field(AuditLog.row_id, Operator.EQ, parse=int),
+        "actor_id": field(AuditLog.actor_id, Operator.EQ, indexed=True, parse=int),
+        "action": field(AuditLog.action, Operator.EQ, Operator.IN),
+        "occurredon": field(AuditLog.occurredon, Operator.RANGE, indexed=True, parse=datetime.fromisoformat),
+    },
+    projection=audit_projection
+)
@@ -0,0 +1,335 @@
+"""Declarative filters and sorting for the list endpoints.
+
+Every entity declares in a FilterSet which of its fields can be filtered,
+with which operators, and which can be sorted. Requests use the query
+string:
+
+    ?lastname=Men                  the first operator of the field, here prefix
+    ?lastname__eq=Mensah
+    ?title_id__in=1,2,3
+    ?createdon__gte=2024-01-01&createdon__lte=2024-12-31
+    ?sort=-createdon,lastname
+    ?fields=id,firstname,lastname  see validators/filters/projection.py
+
+Operators compile to bound parameters only, never to SQL text, and the
+compiled statement is kept per filter shape (fields, operators and range
+bounds used) so a repeated shape skips building the statement.
+
+prefix compiles to LIKE 'value%', which uses an index when the column has
+a pattern index (COLLATE NOCASE on SQLite, text_pattern_ops on Postgres,
+see migration 0003). Those only serve the prefix, = and the sort of a text
+column need an index in its own collation (migration 0008), and
+tests/test_filter_indexes.py checks the plan of every field declared
+indexed or sortable. Declaring prefix, range or sorting on a field that is
+not indexed fails when the FilterSet is created. Operators a field does
+not declare (e.g. contains, which no index can serve) are rejected with
+a 400.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field as dataclass_field
+from enum import Enum
+from typing import Any, Callable, Mapping, Optional, TYPE_CHECKING
+from fastapi import HTTPException, Request, status
+from sqlalchemy import and_, bindparam
+from sqlalchemy.sql import Select
+
+import threading
+
+if TYPE_CHECKING:
+    from validators.filters.projection import Projection
+
+
+class Operator(str, Enum):
+    EQ = "eq"
+    PREFIX = "prefix"
+    RANGE = "range"
+    IN = "in"
+
+
+# operators that are only fast on an ordered index
+INDEXED_OPERATORS: frozenset[Operator] = frozenset({Operator.PREFIX, Operator.RANGE})
+
+# query string suffixes of the range operator
+RANGE_BOUNDS: tuple[str, ...] = ("gte", "lte")
+
+OPERATOR_NAMES: frozenset[str] = frozenset(operator.value for operator in Operator)
+
+
+class FilterError(ValueError):
+    """A filter request that the declared fields cannot serve"""
+
+
+@dataclass(frozen=True)
+class FilterField:
+    """A filterable and/or sortable field of an entity"""
+    column: Any
+    operators: tuple[Operator, ...] = ()
+    indexed: bool = False
+    sortable: bool = False
+    parse: Callable[[str], Any] = str
+
+
+def field(column: Any, *operators: Operator, indexed: bool = False, sortable: bool = False,
+          parse: Callable[[str], Any] = str) -> FilterField:
+    """declare a field, the first operator is used when none is given in the request
+
+    Args:
+        column (Any): mapped attribute of the entity
+        operators (Operator): allowed operators
+        indexed (bool, optional): an index serves prefix, range and sort on it. Defaults to False.
+        sortable (bool, optional): the field can be used in sort. Defaults to False.
+        parse (Callable[[str], Any], optional): converts a query string value. Defaults to str.
+
+    Returns:
+        FilterField: the field
+    """
+    return FilterField(column=column, operators=operators, indexed=indexed, sortable=sortable, parse=parse)
+
+
+@dataclass(frozen=True)
+class Condition:
+    name: str
+    operator: Operator
+    # eq and prefix: one value, in: the values, range: the bounds given as (bound, value)
+    values: tuple[Any, ...]
+
+    def shape(self) -> tuple[Any, ...]:
+        bounds: tuple[str, ...] = tuple(bound for bound, _ in self.values) if self.operator == Operator.RANGE else ()
+        return (self.name, self.operator.value, bounds)
+
+
+@dataclass(frozen=True)
+class FilterQuery:
+    """The parsed filters and sort of one request"""
+    conditions: tuple[Condition, ...] = ()
+    sort: tuple[tuple[str, bool], ...] = ()
+    # the projected fields, empty when the FilterSet has no projection
+    fields: tuple[str, ...] = ()
+    params: dict[str, Any] = dataclass_field(default_factory=dict, compare=False, hash=False)
+
+    def shape(self) -> tuple[Any, ...]:
+        return (tuple(condition.shape() for condition in self.conditions), self.sort, self.fields)
+
+    def cache_key(self) -> str:
+        """stable text of the filters, used by the response cache and the request coalescing"""
+        return repr((self.shape(), sorted((name, repr(value)) for name, value in self.params.items())))
+
+
+class FilterSet:
+    """The filterable and sortable fields of one entity and the statements compiled from them"""
+    def __init__(self, name: str, base: Callable[[], Select], fields: Mapping[str, FilterField],
+                 projection: Optional["Projection"] = None, max_in: int = 100, max_statements: int = 256) -> None:
+        for field_name, declared in fields.items():
+            if not declared.indexed and (INDEXED_OPERATORS.intersection(declared.operators) or declared.sortable):
+                raise ValueError(f"{name}.{field_name} uses prefix, range or sort without an index")
+
+        self.name: str = name
+        self.fields: dict[str, FilterField] = dict(fields)
+        self.projection: Optional["Projection"] = projection
+        self.max_in: int = max_in
+        self.max_statements: int = max_statements
+        self.__base: Callable[[], Select] = base
+        self.__statements: OrderedDict[tuple[Any, ...], Select] = OrderedDict()
+        self.__lock: threading.Lock = threading.Lock()
+
+    def parse(self, params: Mapping[str, str]) -> FilterQuery:
+        """parse the filters and sort of a query string
+
+        Args:
+            params (Mapping[str, str]): query parameters, the ones that are not fields are ignored
+
+        Raises:
+            FilterError: raise if an operator is not declared for a field, a value does not parse
+                or a field cannot be projected
+
+        Returns:
+            FilterQuery: the parsed request
+        """
+        conditions: list[Condition] = []
+        ranges: dict[str, list[tuple[str, Any]]] = {}
+        values: dict[str, Any] = {}
+
+        for key in sorted(params):
+            raw: str = params[key]
+
+            if key in ("sort", "fields") or raw == "":
+                continue
+
+            field_name, _, suffix = key.partition("__")
+
+            if field_name not in self.fields:
+                # other parameters of the route are not filters
+                if field_name and (suffix in RANGE_BOUNDS or suffix in OPERATOR_NAMES):
+                    raise FilterError(f"{field_name} cannot be filtered")
+                continue
+
+            declared: FilterField = self.fields[field_name]
+
+            if suffix in RANGE_BOUNDS:
+                operator: Operator = Operator.RANGE
+            elif suffix:
+                try:
+                    operator = Operator(suffix)
+                except ValueError:
+                    raise FilterError(f"{suffix} is not an operator, use {self.__allowed(declared)}") from None
+            elif declared.operators:
+                operator = declared.operators[0]
+            else:
+                raise FilterError(f"{field_name} cannot be filtered")
+
+            if operator not in declared.operators:
+                raise FilterError(f"{field_name} only supports {self.__allowed(declared)}")
+
+            parameter: str = f"{field_name}_{suffix if operator == Operator.RANGE else operator.value}"
+
+            if parameter in values:
+                raise FilterError(f"{key} is given twice")
+
+            if operator == Operator.RANGE:
+                if not suffix:
+                    raise FilterError(f"use {field_name}__gte and {field_name}__lte")
+
+                values[parameter] = self.__parse(field_name, declared, raw)
+                ranges.setdefault(field_name, []).append((suffix, values[parameter]))
+            elif operator == Operator.IN:
+                items: list[Any] = [self.__parse(field_name, declared, item.strip()) for item in raw.split(",") if item.strip()]
+
+                if not items or len(items) > self.max_in:
+                    raise FilterError(f"{field_name}__in takes 1 to {self.max_in} values")
+
+                conditions.append(Condition(field_name, operator, tuple(items)))
+                values[parameter] = items
+            else:
+                value: Any = self.__parse(field_name, declared, raw)
+
+                if operator == Operator.PREFIX:
+                    # the value is data, not a pattern
+                    value = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+                conditions.append(Condition(field_name, operator, (value,)))
+                values[parameter] = value
+
+        for field_name, bounds in ranges.items():
+            conditions.append(Condition(field_name, Operator.RANGE, tuple(sorted(bounds, key=lambda bound: bound[0]))))
+
+        return FilterQuery(
+            conditions=tuple(sorted(conditions, key=lambda condition: condition.shape())),
+            sort=self.__parse_sort(params.get("sort", "")),
+            fields=self.projection.parse(params.get("fields")) if self.projection else (),
+            params=values
+        )
+
+    def statement(self, query: FilterQuery) -> Select:
+        """the statement of a filter shape, execute it with query.params
+
+        Args:
+            query (FilterQuery): parsed request
+
+        Returns:
+            Select: statement with bound parameters
+        """
+        shape: tuple[Any, ...] = query.shape()
+
+        with self.__lock:
+            cached: Optional[Select] = self.__statements.get(shape)
+
+            if cached is not None:
+                self.__statements.move_to_end(shape)
+                return cached
+
+        statement: Select = self.__compile(query)
+
+        with self.__lock:
+            self.__statements[shape] = statement
+
+            if len(self.__statements) > self.max_statements:
+                self.__statements.popitem(last=False)
+
+        return statement
+
+    def dependency(self, request: Request) -> FilterQuery:
+        """FastAPI dependency parsing the query string of the request
+
+        Args:
+            request (Request): the request
+
+        Raises:
+            HTTPException: raise a 400 when the filters cannot be served
+
+        Returns:
+            FilterQuery: the parsed request
+        """
+        try:
+            return self.parse(request.query_params)
+        except FilterError as error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+
+    def __compile(self, query: FilterQuery) -> Select:
+        statement: Select = self.__base()
+        clauses: list[Any] = []
+
+        for condition in query.conditions:
+            column: Any = self.fields[condition.name].column
+
+            if condition.operator == Operator.EQ:
+                clauses.append(column == bindparam(f"{condition.name}_eq"))
+            elif condition.operator == Operator.PREFIX:
+                clauses.append(column.like(bindparam(f"{condition.name}_prefix"), escape="\\"))
+            elif condition.operator == Operator.IN:
+                clauses.append(column.in_(bindparam(f"{condition.name}_in", expanding=True)))
+            else:
+                for bound, _ in condition.values:
+                    parameter = bindparam(f"{condition.name}_{bound}")
+                    clauses.append(column >= parameter if bound == "gte" else column <= parameter)
+
+        if self.projection:
+            statement = self.projection.apply(statement, query.fields)
+
+        if clauses:
+            statement = statement.where(and_(*clauses))
+
+        if query.sort:
+            statement = statement.order_by(None).order_by(*[
+                self.fields[name].column.desc() if descending else self.fields[name].column.asc()
+                for name, descending in query.sort
+            ])
+
+        return statement
+
+    def __parse_sort(self, raw: str) -> tuple[tuple[str, bool], ...]:
+        sort: list[tuple[str, bool]] = []
+
+        for item in (part.strip() for part in raw.split(",")):
+            if not item:
+                continue
+
+            descending: bool = item.startswith("-")
+            name: str = item.lstrip("-+")
+            declared: Optional[FilterField] = self.fields.get(name)
+
+            if declared is None or not declared.sortable:
+                sortable: list[str] = [name for name, candidate in self.fields.items() if candidate.sortable]
+                raise FilterError(f"cannot sort by {name}, use one of {', '.join(sortable) or 'none'}")
+
+            sort.append((name, descending))
+
+        return tuple(sort)
+
+    @staticmethod
+    def __parse(name: str, declared: FilterField, raw: str) -> Any:
+        try:
+            return declared.parse(raw)
+        except ValueError:
+            raise FilterError(f"{raw} is not a valid value for {name}") from None
+
+    @staticmethod
+    def __allowed(declared: FilterField) -> str:
+        names: list[str] = []
+
+        for operator in declared.operators:
+            if operator == Operator.RANGE:
+                names.extend(f"__{bound}" for bound in RANGE_BOUNDS)
+            else:
+                names.append(f"__{operator.value}")
+
+        return ", ".join(names)
@@ -0,0 +1,129 @@
+"""Sparse field projection for the list and by-id endpoints.
+
+?fields=id,firstname,lastname returns only these fields. The projection is
+pushed down into the SELECT, the other columns (e.g. profile_picture) are
+neither read from the database nor encoded. The fields always come back in
+the declared order and the required ones (id) are always included, so a
+projection has one shape whatever the order the caller listed them in.
+"""
+from typing import Any, Mapping, Optional, Sequence, Type
+from fastapi import HTTPException, status
+from pydantic import BaseModel, create_model
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+from dto.response import Response
+from validators.filters.filter import FilterError
+
+import threading
+
+
+class Projection:
+    """The fields an endpoint can return, each read from its own column expression"""
+    def __init__(self, name: str, model: Type[BaseModel], columns: Mapping[str, Any],
+                 required: Sequence[str] = ("id",)) -> None:
+        unknown: set[str] = (set(columns) | set(required)) - set(model.model_fields)
+
+        if unknown:
+            raise ValueError(f"{name} projects {', '.join(sorted(unknown))} which {model.__name__} does not have")
+
+        self.name: str = name
+        self.model: Type[BaseModel] = model
+        self.default: tuple[str, ...] = tuple(columns)
+        self.required: frozenset[str] = frozenset(required)
+        self.__columns: dict[str, Any] = dict(columns)
+        self.__models: dict[tuple[str, ...], Type[BaseModel]] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+    def parse(self, raw: Optional[str]) -> tuple[str, ...]:
+        """parse the fields parameter
+
+        Args:
+            raw (Optional[str]): comma separated field names, all the fields when empty
+
+        Raises:
+            FilterError: raise if a field cannot be projected
+
+        Returns:
+            tuple[str, ...]: the fields in the declared order
+        """
+        if not raw or not raw.strip():
+            return self.default
+
+        names: set[str] = {name.strip() for name in raw.split(",") if name.strip()}
+        unknown: set[str] = names - set(self.__columns)
+
+        if unknown:
+            raise FilterError(f"{', '.join(sorted(unknown))} cannot be selected, use {', '.join(self.default)}")
+
+        names |= self.required
+
+        return tuple(name for name in self.default if name in names)
+
+    def columns(self, fields: Sequence[str]) -> list[Any]:
+        return [self.__columns[name].label(name) for name in fields]
+
+    def select(self, fields: Sequence[str]) -> Select:
+        """a statement reading only the given fields
+
+        Args:
+            fields (Sequence[str]): parsed fields
+
+        Returns:
+            Select: statement, add the from clause and the conditions
+        """
+        return select(*self.columns(fields))
+
+    def apply(self, statement: Select, fields: Sequence[str]) -> Select:
+        """replace the columns of a statement by the given fields, keeping its from clause, conditions and order
+
+        Args:
+            statement (Select): statement to project
+            fields (Sequence[str]): parsed fields
+
+        Returns:
+            Select: the projected statement
+        """
+        return statement.with_only_columns(*self.columns(fields))
+
+    def response_model(self, fields: Sequence[str]) -> Type[BaseModel]:
+        """the Response envelope of a partial model holding only the given fields
+
+        Args:
+            fields (Sequence[str]): parsed fields
+
+        Returns:
+            Type[BaseModel]: Response of the partial model
+        """
+        key: tuple[str, ...] = tuple(fields)
+
+        with self.__lock:
+            cached: Optional[Type[BaseModel]] = self.__models.get(key)
+
+            if cached is None:
+                partial: Type[BaseModel] = self.model if key == tuple(self.model.model_fields) else create_model(  # type: ignore
+                    f"{self.model.__name__}Fields",
+                    **{name: (self.model.model_fields[name].annotation, ...) for name in key}
+                )
+                cached = self.__models[key] = Response[partial]  # type: ignore
+
+        return cached
+
+    def requested(self, fields: Optional[str] = None) -> Optional[tuple[str, ...]]:
+        """FastAPI dependency of the by-id endpoints reading ?fields=
+
+        Args:
+            fields (Optional[str], optional): comma separated field names. Defaults to None.
+
+        Raises:
+            HTTPException: raise a 400 when a field cannot be projected
+
+        Returns:
+            Optional[tuple[str, ...]]: the fields, None when the whole entity is asked for
+        """
+        if not fields:
+            return None
+
+        try:
+            return self.parse(fields)
+        except FilterError as error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
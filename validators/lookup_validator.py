@@ -0,0 +1,98 @@
+from typing import Any
+from sqlmodel import select, join, cast, String
+from sqlalchemy import case
+from entities.title_entity import Title, TitleOutput
+from entities.service_type_enity import ServiceType, ServiceTypeUser
+from entities.attendance_type_entity import AttendanceType, AttendanceTypeUser
+from entities.user_entity import User
+from validators.filters.filter import FilterSet, Operator, field
+from validators.filters.projection import Projection
+from utils.change_feed import ChangeFeed
+
+
+title_projection: Projection = Projection(
+    "title", TitleOutput, {"id": Title.id, "title_name": Title.title_name}
+)
+
+title_detail_projection: Projection = Projection(
+    "title", Title,
+    {"id": Title.id, "title_name": Title.title_name, "createdon": Title.createdon, "modifiedon": Title.modifiedon}
+)
+
+# the types are listed with the email of the user who created them
+servicetype_projection: Projection = Projection(
+    "servicetype", ServiceTypeUser, {
+        "id": ServiceType.id,
+        "name": ServiceType.name,
+        "createdby": User.emailaddress,
+        "modifiedby": case((ServiceType.modifiedon.isnot(None), User.emailaddress), else_=None),  # type: ignore
+        "createdon": ServiceType.createdon,
+        "modifiedon": ServiceType.modifiedon,
+    }
+)
+
+attendancetype_projection: Projection = Projection(
+    "attendancetype", AttendanceTypeUser, {
+        "id": AttendanceType.id,
+        "name": AttendanceType.name,
+        "email_createdby": User.emailaddress,
+        "email_modifiedby": case((AttendanceType.modifiedby.isnot(None), User.emailaddress), else_=None),  # type: ignore
+        "createdon": AttendanceType.createdon,
+        "modifiedon": AttendanceType.modifiedon,
+    }
+)
+
+attendancetype_detail_projection: Projection = Projection(
+    "attendancetype", AttendanceType,
+    {name: getattr(AttendanceType, name) for name in ("id", "name", "createdby", "modifiedby", "createdon", "modifiedon")}
+)
+
+def servicetype_from() -> Any:
+    """the service type joined with its creator"""
+    return join(ServiceType, User, ServiceType.createdby == User.id)  # type: ignore
+
+
+def attendancetype_from() -> Any:
+    """the attendance type joined with its creator"""
+    return join(AttendanceType, User, AttendanceType.createdby == User.id)  # type: ignore
+
+
+title_feed: ChangeFeed = ChangeFeed(Title, title_projection)
+servicetype_feed: ChangeFeed = ChangeFeed(ServiceType, servicetype_projection, from_clause=servicetype_from)
+attendancetype_feed: ChangeFeed = ChangeFeed(AttendanceType, attendancetype_projection, from_clause=attendancetype_from)
+
+# the lookup tables are filtered by the start of their name
+title_filters: FilterSet = FilterSet(
+    "title",
+    base=lambda: select(Title),
+    fields={
+        "name": field(Title.title_name, Operator.PREFIX, Operator.EQ, indexed=True, sortable=True),
+    },
+    projection=title_projection
+)
+
+servicetype_filters: FilterSet = FilterSet(
+    "servicetype",
+    base=lambda: (
+        select(ServiceType)
+        .select_from(servicetype_from())
+        .order_by(cast(ServiceType.createdon, String))
+    ),
+    fields={
+        "name": field(ServiceType.name, Operator.PREFIX, Operator.EQ, indexed=True, sortable=True),
+    },
+    projection=servicetype_projection
+)
+
+attendancetype_filters: FilterSet = FilterSet(
+    "attendancetype",
+    base=lambda: (
+        select(AttendanceType)
+        .select_from(attendancetype_from())
+        .order_by(cast(AttendanceType.createdon, String))
+    ),
+    fields={
+        "name": field(AttendanceType.name, Operator.PREFIX, Operator.EQ, indexed=True, sortable=True),
+    },
+    projection=attendancetype_projection
+)
@@ -0,0 +1,41 @@
+from datetime import date, datetime
+from sqlmodel import select
+from entities.members_entity import Member, MemberOutput
+from validators.filters.filter import FilterSet, Operator, field
+from validators.filters.projection import Projection
+from utils.change_feed import ChangeFeed
+
+
+# the output columns only, so the rows can be encoded as they are
+MEMBER_COLUMNS: list[str] = list(MemberOutput.model_fields)
+
+# the list returns MemberOutput, ?fields= narrows it e.g. to id and the names without the picture
+member_projection: Projection = Projection(
+    "member", MemberOutput, {name: getattr(Member, name) for name in MEMBER_COLUMNS}
+)
+
+# the by-id endpoint also returns who created and modified the member
+member_detail_projection: Projection = Projection(
+    "member", Member,
+    {name: getattr(Member, name) for name in [*MEMBER_COLUMNS, "createdby", "modifiedby", "createdon", "modifiedon"]}
+)
+
+# the members changed after a watermark, for the mirrors
+member_feed: ChangeFeed = ChangeFeed(Member, member_projection)
+
+member_filters: FilterSet = FilterSet(
+    "member",
+    base=lambda: select(Member).order_by(Member.createdon),
+    fields={
+        "firstname": field(Member.firstname, Operator.PREFIX, Operator.EQ, indexed=True, sortable=True),
+        "lastname": field(Member.lastname, Operator.PREFIX, Operator.EQ, indexed=True, sortable=True),
+        "middlename": field(Member.middlename, Operator.PREFIX, Operator.EQ, indexed=True),
+        "gender": field(Member.gender, Operator.EQ, Operator.IN),
+        "emailaddress": field(Member.emailaddress, Operator.PREFIX, Operator.EQ, indexed=True),
+        "phonenumber": field(Member.phonenumber, Operator.PREFIX, Operator.EQ, indexed=True),
+        "title_id": field(Member.title_id, Operator.EQ, Operator.IN, indexed=True, parse=int),
+        "dob": field(Member.dob, Operator.RANGE, Operator.EQ, indexed=True, sortable=True, parse=date.fromisoformat),
+        "createdon": field(Member.createdon, Operator.RANGE, indexed=True, sortable=True, parse=datetime.fromisoformat),
+    },
+    projection=member_projection
+)
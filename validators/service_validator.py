@@ -0,0 +1,47 @@
+from datetime import date, datetime, time
+from typing import Any
+from sqlmodel import select, join
+from sqlalchemy import case
+from entities.service_entity import Service, ServiceAndServiceTypeAndUserOutput
+from entities.service_type_enity import ServiceType
+from entities.user_entity import User
+from validators.filters.filter import FilterSet, Operator, field
+from validators.filters.projection import Projection
+from utils.change_feed import ChangeFeed
+
+
+# plain columns of the service with its type and creator instead of the whole entities
+service_projection: Projection = Projection(
+    "service", ServiceAndServiceTypeAndUserOutput, {
+        "id": Service.id,
+        "servicename": ServiceType.name,
+        "date_event": Service.date_event,
+        "createdby": User.emailaddress,
+        "modifiedby": case((Service.modifiedon.isnot(None), User.emailaddress), else_=None),  # type: ignore
+        "time_start": Service.time_start,
+        "location": Service.location,
+        "modifiedon": Service.modifiedon,
+        "createdon": Service.createdon,
+    }
+)
+
+
+def service_from() -> Any:
+    """the service joined with its type and creator"""
+    return join(Service, ServiceType, Service.servicetypeId == ServiceType.id).join(User, User.id == Service.createdby)  # type: ignore
+
+
+service_feed: ChangeFeed = ChangeFeed(Service, service_projection, from_clause=service_from)
+
+service_filters: FilterSet = FilterSet(
+    "service",
+    base=lambda: select(Service).select_from(service_from()).order_by(Service.createdon),
+    fields={
+        "servicetypeid": field(Service.servicetypeId, Operator.EQ, Operator.IN, indexed=True, parse=int),
+        "location": field(Service.location, Operator.PREFIX, Operator.EQ, indexed=True),
+        "date_event": field(Service.date_event, Operator.EQ, Operator.RANGE, indexed=True, sortable=True, parse=date.fromisoformat),
+        "time_start": field(Service.time_start, Operator.EQ, parse=time.fromisoformat),
+        "createdon": field(Service.createdon, Operator.RANGE, indexed=True, sortable=True, parse=datetime.fromisoformat),
+    },
+    projection=service_projection
+)
@@ -0,0 +1,28 @@
+from sqlalchemy import bindparam
+from sqlmodel import select
+from entities.user_entity import User, UserOutput
+from validators.filters.filter import FilterSet, Operator, field
+from validators.filters.projection import Projection
+
+
+# the output columns only, so the rows can be encoded as they are
+USER_COLUMNS: list[str] = list(UserOutput.model_fields)
+
+user_projection: Projection = Projection(
+    "user", UserOutput, {name: getattr(User, name) for name in USER_COLUMNS}
+)
+
+# the list leaves out the logged in user, bound as current_user_id
+user_filters: FilterSet = FilterSet(
+    "user",
+    base=lambda: select(User).where(User.id != bindparam("current_user_id")).order_by(User.createdon),
+    fields={
+        "firstname": field(User.firstname, Operator.PREFIX, Operator.EQ, indexed=True, sortable=True),
+        "middlename": field(User.middlename, Operator.PREFIX, Operator.EQ, indexed=True),
+        "lastname": field(User.lastname, Operator.PREFIX, Operator.EQ, indexed=True, sortable=True),
+        "emailaddress": field(User.emailaddress, Operator.EQ, indexed=True),
+        "phoneNumber": field(User.phoneNumber, Operator.EQ),
+        "disabled": field(User.disabled, Operator.EQ, parse=lambda raw: raw.strip().lower() in ("1", "true", "yes")),
+    },
+    projection=user_projection
+)